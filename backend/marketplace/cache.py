@@ -0,0 +1,167 @@
+import functools
+import hashlib
+import math
+import random
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+KEY_PREFIX = 'response-cache'
+DEFAULT_TIMEOUT = 300
+# How long a recomputing request holds the lock, and how long others wait on it
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+# >1 recomputes earlier, <1 later (probabilistic early expiration)
+EARLY_RECOMPUTE_BETA = 1.0
+
+OUTCOMES = ('hit', 'miss', 'coalesced', 'early')
+
+# Namespaces registered by cached_response, for reporting
+namespaces = set()
+
+
+def cached_response(namespace, tags, timeout=DEFAULT_TIMEOUT):
+    """
+    Cache a DRF view method's 200 responses for anonymous GET requests
+
+    Args:
+        namespace: Name the hit/miss metrics are reported under
+        tags: Invalidation tags; entries may use the view's URL kwargs,
+            e.g. ['products', 'product:{pk}']
+        timeout: Seconds an entry may be served before it must be recomputed
+
+    Views can add tags that depend on the request, such as those of a list's
+    filters, by defining get_cache_tags(request).
+
+    Concurrent misses on the same key are coalesced: one request recomputes
+    while the others wait for its result. Hot entries are recomputed slightly
+    before they expire (with a probability that grows as expiry approaches),
+    so they rarely expire under load at all.
+    """
+    namespaces.add(namespace)
+
+    def decorator(view_method):
+        @functools.wraps(view_method)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method != 'GET' or request.user.is_authenticated:
+                return view_method(view, request, *args, **kwargs)
+
+            resolved_tags = [tag.format(**kwargs) for tag in tags]
+            if hasattr(view, 'get_cache_tags'):
+                resolved_tags += view.get_cache_tags(request)
+            key = _response_key(request, resolved_tags)
+            entry = cache.get(key)
+
+            if entry is not None and not _should_recompute_early(entry):
+                return _cached(namespace, 'hit', entry)
+
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                if entry is not None:
+                    # Someone is already refreshing it; the current copy is still valid
+                    return _cached(namespace, 'hit', entry)
+                entry = _wait_for(key)
+                if entry is not None:
+                    return _cached(namespace, 'coalesced', entry)
+
+            try:
+                started = time.monotonic()
+                response = view_method(view, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, {
+                        'data': response.data,
+                        'expires': time.time() + timeout,
+                        'cost': time.monotonic() - started,
+                    }, timeout)
+            finally:
+                cache.delete(lock_key)
+
+            record(namespace, 'early' if entry is not None else 'miss')
+            response['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Expire every cached response carrying any of the tags"""
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Unknown or evicted: any fresh value differs from the one in use
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def record(namespace, outcome):
+    key = f'{KEY_PREFIX}:metrics:{namespace}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def metrics(namespace):
+    """Counts per outcome (hit, miss, coalesced, early) for a namespace"""
+    keys = {f'{KEY_PREFIX}:metrics:{namespace}:{outcome}': outcome for outcome in OUTCOMES}
+    values = cache.get_many(list(keys))
+    return {outcome: values.get(key, 0) for key, outcome in keys.items()}
+
+
+def reset_metrics(namespace):
+    cache.delete_many([f'{KEY_PREFIX}:metrics:{namespace}:{outcome}' for outcome in OUTCOMES])
+
+
+def _cached(namespace, outcome, entry):
+    record(namespace, outcome)
+    response = Response(entry['data'])
+    response['X-Cache'] = 'HIT'
+    return response
+
+
+def _should_recompute_early(entry):
+    # XFetch: recompute when now - cost * beta * ln(rand) passes the expiry
+    return time.time() - entry['cost'] * EARLY_RECOMPUTE_BETA * math.log(1 - random.random()) >= entry['expires']
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+    return None
+
+
+def _tag_key(tag):
+    return f'{KEY_PREFIX}:tag:{tag}'
+
+
+def _tag_versions(tags):
+    keys = [_tag_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, 1, timeout=None)
+            versions[key] = cache.get(key, 1)
+    return [versions[key] for key in keys]
+
+
+def _response_key(request, tags):
+    # Normalize parameter order so equivalent URLs share an entry
+    query = sorted((name, value) for name, values in request.query_params.lists() for value in values)
+    parts = [
+        request.get_host(),
+        request.path,
+        repr(query),
+        request.META.get('HTTP_ACCEPT', ''),
+        repr(list(zip(tags, _tag_versions(tags)))),
+    ]
+    digest = hashlib.sha256('|'.join(parts).encode()).hexdigest()
+    return f'{KEY_PREFIX}:{digest}'
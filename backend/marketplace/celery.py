@@ -12,7 +12,31 @@ app.autodiscover_tasks()
 app.conf.beat_schedule = {
     'cleanup-expired-reservations': {
         'task': 'orders.tasks.cleanup_expired_reservations',
-        'schedule': 300.0,  # Run every 5 minutes
+        'schedule': 60.0,  # Run every minute; holds also schedule a sweep at their expiry
+    },
+    'reconcile-reserved-stock': {
+        'task': 'orders.tasks.reconcile_reserved_stock',
+        'schedule': 3600.0,  # Run hourly
+    },
+    'retry-pending-payment-intents': {
+        'task': 'orders.tasks.retry_pending_payment_intents',
+        'schedule': 120.0,  # Run every 2 minutes
+    },
+    'process-stripe-events': {
+        'task': 'orders.tasks.process_stripe_events',
+        'schedule': 60.0,  # Run every minute
+    },
+    'reconcile-vendor-revenue': {
+        'task': 'orders.tasks.reconcile_vendor_revenue',
+        'schedule': crontab(hour=3, minute=0),  # Run nightly
+    },
+    'archive-old-notifications': {
+        'task': 'notifications.tasks.archive_old_notifications',
+        'schedule': crontab(hour=4, minute=0),  # Run nightly
+    },
+    'reconcile-vendor-ratings': {
+        'task': 'profiles.tasks.reconcile_vendor_ratings',
+        'schedule': crontab(hour=3, minute=30),  # Run nightly
     },
 }
 
@@ -0,0 +1,22 @@
+class DenormalizedFieldsMixin:
+    """
+    Keeps a model's denormalized columns out of saves of existing rows
+
+    The columns named in DENORMALIZED_FIELDS are maintained elsewhere with
+    F() or bulk updates. A save() of an existing row never writes them,
+    whatever update_fields it is given, so a stale in-memory copy cannot
+    overwrite a concurrent change. Inserts still write every column.
+    """
+    DENORMALIZED_FIELDS = ()
+
+    def save_base(self, *args, update_fields=None, **kwargs):
+        # save_base rather than save, so update_fields filled in by an
+        # overridden save() (such as mptt's) are filtered too
+        if not self._state.adding and not kwargs.get('force_insert'):
+            if update_fields is None:
+                update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+            update_fields = frozenset(update_fields).difference(self.DENORMALIZED_FIELDS)
+            if not update_fields:
+                # Nothing else to write; an empty update_fields would mean every column
+                return
+        super().save_base(*args, update_fields=update_fields, **kwargs)
@@ -0,0 +1,90 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+# Rows fetched from the database per round trip while streaming
+CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Compressed output is sent once this much has accumulated
+GZIP_FLUSH_BYTES = 64 * 1024
+
+
+class _Echo:
+    """File-like object whose write() hands the line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    """
+    Encode rows as CSV, one line at a time
+
+    Args:
+        rows: Iterable of dicts
+        columns: Sequence of (key, header) pairs, in column order
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for _, header in columns])
+    for row in rows:
+        yield writer.writerow([row[key] for key, _ in columns])
+
+
+def ndjson_lines(rows, columns):
+    """Encode rows as newline-delimited JSON objects keyed by the column headers"""
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode({header: row[key] for key, header in columns}) + '\n'
+
+
+def gzip_chunks(lines):
+    """Gzip a stream of text lines as it is produced"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    pending = []
+    size = 0
+    for line in lines:
+        data = compressor.compress(line.encode())
+        if data:
+            pending.append(data)
+            size += len(data)
+        if size >= GZIP_FLUSH_BYTES:
+            yield b''.join(pending)
+            pending, size = [], 0
+    pending.append(compressor.flush())
+    yield b''.join(pending)
+
+
+def stream_export(rows, columns, filename, export_format='csv', compress=False):
+    """
+    Download streamed as it is generated, so memory use does not grow with
+    the number of rows
+
+    Args:
+        rows: Iterable of dicts, typically queryset.values().iterator(chunk_size=CHUNK_SIZE)
+        columns: Sequence of (key, header) pairs, in column order
+        filename: Suggested download name, without extension
+        export_format: One of EXPORT_FORMATS
+        compress: Gzip the file on the fly
+
+    Raises:
+        ValueError: for an unknown format
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    encode = csv_lines if export_format == 'csv' else ndjson_lines
+    lines = encode(rows, columns)
+    filename = f'{filename}.{export_format}'
+    if compress:
+        response = StreamingHttpResponse(gzip_chunks(lines), content_type='application/gzip')
+        filename += '.gz'
+    else:
+        response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
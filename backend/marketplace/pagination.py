@@ -0,0 +1,244 @@
+import json
+from base64 import b64decode, b64encode
+from datetime import date, datetime
+from decimal import Decimal
+from urllib import parse
+from uuid import UUID
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, LimitOffsetPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Keyset (seek) pagination over a composite, unique ordering.
+
+    DRF's CursorPagination only keys on the first ordering field and falls back
+    to OFFSET for ties. This paginator keys on every ordering field and always
+    ends the ordering with the primary key, so each page is a single range scan:
+    WHERE (created_at, id) < (...) ORDER BY created_at DESC, id DESC LIMIT n.
+
+    The ordering is taken from the queryset's order_by() (which includes any
+    OrderingFilter), then the model's Meta.ordering, then ('-created_at', '-id').
+    Views can opt into their own limits by setting `page_size` and/or
+    `max_page_size` attributes.
+
+    NULLs in a nullable ordering field (or an annotation) sort above every
+    value, as Postgres sorts them by default, whatever the database. Cursor
+    values are converted back through the field, or the annotation's
+    output_field, they were read from.
+    """
+    ordering = ('-created_at', '-id')
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = getattr(view, 'page_size', self.page_size)
+        self.max_page_size = getattr(view, 'max_page_size', self.max_page_size)
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.model = queryset.model
+        self.annotations = queryset.query.annotations
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.nullable = {
+            field.lstrip('-') for field in self.ordering
+            if field.lstrip('-') in self.annotations or _is_nullable(self.model, field.lstrip('-'))
+        }
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor is not None and self.cursor.reverse
+
+        queryset = queryset.order_by(*[self._order_by(field, reverse) for field in self.ordering])
+        if self.cursor is not None:
+            queryset = queryset.filter(self._seek_filter(self.cursor.position, reverse))
+
+        # Fetch one extra row to learn whether another page follows
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next = True
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        if not ordering or len(ordering) != len(queryset.query.order_by):
+            ordering = list(queryset.model._meta.ordering) or list(self.ordering)
+        if not all(_resolve_field(queryset.model, field.lstrip('-')) or field.lstrip('-') in queryset.query.annotations
+                   for field in ordering):
+            ordering = ['-pk']
+
+        # Terminate with the primary key so the ordering is total
+        if not any(field.lstrip('-') in ('pk', queryset.model._meta.pk.name) for field in ordering):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[-1], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self._get_position_from_instance(self.page[0], self.ordering)
+        else:
+            position = self.cursor.position
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            querystring = b64decode(encoded.encode('ascii')).decode('ascii')
+            tokens = parse.parse_qs(querystring, keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            values = json.loads(tokens['p'][0])
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError
+            position = [
+                self._to_python(field.lstrip('-'), value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return Cursor(offset=0, reverse=reverse, position=position)
+
+    def encode_cursor(self, cursor):
+        tokens = {'p': json.dumps([_encode_value(value) for value in cursor.position])}
+        if cursor.reverse:
+            tokens['r'] = '1'
+
+        querystring = parse.urlencode(tokens, doseq=True)
+        encoded = b64encode(querystring.encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def _get_position_from_instance(self, instance, ordering):
+        position = []
+        for field in ordering:
+            value = instance
+            for attr in field.lstrip('-').split('__'):
+                if value is None:
+                    break
+                value = value[attr] if isinstance(value, dict) else getattr(value, attr)
+            position.append(value)
+        return position
+
+    def _seek_filter(self, position, reverse):
+        # (a, b, c) < (x, y, z)  ==  a < x OR (a = x AND b < y) OR (a = x AND b = y AND c < z)
+        condition = Q()
+        for index, field in enumerate(self.ordering):
+            clause = self._after(field.lstrip('-'), position[index], field.startswith('-') != reverse)
+            if clause is None:
+                continue
+            for prior, value in zip(self.ordering[:index], position[:index]):
+                clause &= Q(**{prior.lstrip('-'): value})
+            condition |= clause
+        return condition
+
+    def _order_by(self, field, reverse):
+        if reverse:
+            field = _flip(field)
+        name = field.lstrip('-')
+        if name not in self.nullable:
+            return field
+        if field.startswith('-'):
+            return F(name).desc(nulls_first=True)
+        return F(name).asc(nulls_last=True)
+
+    def _after(self, name, value, descending):
+        """Condition for the rows strictly after `value` in one ordering field, or None if there are none"""
+        if value is None:
+            # NULLs sort highest: descending, every value follows; ascending, nothing does
+            return Q(**{f'{name}__isnull': False}) if descending else None
+        clause = Q(**{f'{name}__{"lt" if descending else "gt"}': value})
+        if not descending and name in self.nullable:
+            clause |= Q(**{f'{name}__isnull': True})
+        return clause
+
+    def _to_python(self, name, value):
+        if value is None:
+            return value
+        if name in self.annotations:
+            model_field = self.annotations[name].output_field
+        else:
+            model_field = _resolve_field(self.model, name)
+        if model_field is None:
+            return value
+        return model_field.to_python(value)
+
+
+class RankedResultsPagination(LimitOffsetPagination):
+    """
+    Limit/offset pagination for relevance-ranked results, whose float scores
+    cannot serve as a stable keyset. Deep pages are rarely useful, so the
+    limit is capped.
+    """
+    default_limit = 20
+    max_limit = 100
+
+
+def _flip(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def _resolve_field(model, name):
+    """Resolve a (possibly `__`-spanning) ordering name to a concrete model field"""
+    model_field = None
+    for attr in name.split('__'):
+        if model is None:
+            return None
+        try:
+            model_field = model._meta.pk if attr == 'pk' else model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        model = model_field.related_model
+    return model_field
+
+
+def _is_nullable(model, name):
+    """Whether an ordering name can read NULL, through a nullable column or relation"""
+    for attr in name.split('__'):
+        if model is None:
+            return False
+        try:
+            model_field = model._meta.pk if attr == 'pk' else model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return False
+        if getattr(model_field, 'null', False):
+            return True
+        model = model_field.related_model
+    return False
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime, date)):
+        # Keep full microsecond precision; truncating would skip or repeat rows
+        return value.isoformat()
+    if isinstance(value, (UUID, Decimal)):
+        return str(value)
+    return value
@@ -103,6 +103,10 @@ if os.getenv("REDIS_HOST"):
             "BACKEND": "channels_redis.core.RedisChannelLayer",
             "CONFIG": {
                 "hosts": [(os.getenv("REDIS_HOST", "redis"), int(os.getenv("REDIS_PORT", 6379)))],
+                # Messages a socket may have queued in Redis; pushes beyond that
+                # are dropped and the client catches up over REST
+                "capacity": 100,
+                "expiry": 60,
             },
         },
     }
@@ -113,6 +117,23 @@ else:
         },
     }
 
+# Cache
+# Use Redis when available, otherwise a per-process in-memory cache
+if os.getenv("REDIS_HOST"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": f"redis://{os.getenv('REDIS_HOST', 'redis')}:{int(os.getenv('REDIS_PORT', 6379))}/1",
+            "KEY_PREFIX": "marketplace",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+    }
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -149,6 +170,7 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.IsAuthenticated",
     ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    "DEFAULT_PAGINATION_CLASS": "marketplace.pagination.KeysetCursorPagination",
 }
 
 # JWT config
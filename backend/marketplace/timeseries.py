@@ -0,0 +1,143 @@
+import datetime
+import zoneinfo
+
+from django.db.models import DateField, DateTimeField
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+PERIODS = {
+    'daily': TruncDay,
+    'weekly': TruncWeek,
+    'monthly': TruncMonth,
+    'quarterly': TruncQuarter,
+}
+
+
+def get_timezone(name=None):
+    """
+    The named IANA time zone, or the current one
+
+    Raises:
+        ValueError: for unknown names
+    """
+    if not name:
+        return timezone.get_current_timezone()
+    try:
+        return zoneinfo.ZoneInfo(name)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}")
+
+
+def bucket(period, field, model, tzinfo=None):
+    """
+    Database expression truncating `field` to the start date of its period
+
+    Datetimes are truncated in `tzinfo` (default: the current time zone), so
+    an order placed late on the 31st in New York lands in that month even
+    though it is already the 1st in UTC. Plain date fields need no zone.
+    """
+    trunc = PERIODS[period]
+    if isinstance(_resolve_field(model, field), DateTimeField):
+        return trunc(field, output_field=DateField(), tzinfo=tzinfo or timezone.get_current_timezone())
+    return trunc(field, output_field=DateField())
+
+
+def period_start(day, period):
+    """First day of the period containing `day`, as the database truncates it"""
+    if period == 'daily':
+        return day
+    if period == 'weekly':
+        return day - datetime.timedelta(days=day.weekday())  # ISO weeks start on Monday
+    if period == 'monthly':
+        return day.replace(day=1)
+    if period == 'quarterly':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def shift(start, period, count):
+    """Start of the period `count` periods after (or before) the one starting at `start`"""
+    if period == 'daily':
+        return start + datetime.timedelta(days=count)
+    if period == 'weekly':
+        return start + datetime.timedelta(weeks=count)
+    months = {'monthly': 1, 'quarterly': 3}[period] * count
+    index = start.year * 12 + start.month - 1 + months
+    return start.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def period_label(start, period):
+    """e.g. "2024-01-15", "2024-W03", "2024-01", "2024-Q1" """
+    if period == 'daily':
+        return start.strftime('%Y-%m-%d')
+    if period == 'weekly':
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == 'monthly':
+        return start.strftime('%Y-%m')
+    return f"{start.year}-Q{(start.month - 1) // 3 + 1}"
+
+
+def last_periods(period, count, today=None, tzinfo=None):
+    """
+    Start dates of the current period and the `count` before it
+
+    Returns:
+        Tuple of (first period start, current period start)
+    """
+    today = today or timezone.localdate(timezone=tzinfo)
+    current = period_start(today, period)
+    return shift(current, period, -count), current
+
+
+def time_series(queryset, field, period, start, end, tzinfo=None, **aggregates):
+    """
+    Aggregate a queryset per period, with empty periods filled in
+
+    Args:
+        queryset: Rows to aggregate
+        field: Date or datetime field (or lookup path) to bucket on
+        period: One of PERIODS
+        start: First period start date
+        end: Last period start date, inclusive
+        tzinfo: Time zone datetimes are bucketed in
+        **aggregates: Aggregate expressions, e.g. revenue=Sum('total_amount')
+
+    Returns:
+        List of dicts with `period` (label), `start` and one key per
+        aggregate, zero for periods without rows
+    """
+    expression = bucket(period, field, queryset.model, tzinfo)
+    # Filter on the raw column so the database can use an index on it
+    if expression.tzinfo is not None:
+        upper = shift(end, period, 1)
+        queryset = queryset.filter(**{
+            f'{field}__gte': datetime.datetime.combine(start, datetime.time(), tzinfo=expression.tzinfo),
+            f'{field}__lt': datetime.datetime.combine(upper, datetime.time(), tzinfo=expression.tzinfo),
+        })
+    else:
+        queryset = queryset.filter(**{f'{field}__gte': start, f'{field}__lt': shift(end, period, 1)})
+
+    rows = {
+        row.pop('bucket'): row
+        for row in queryset.annotate(bucket=expression).values('bucket').annotate(**aggregates).order_by('bucket')
+    }
+
+    series = []
+    current = start
+    while current <= end:
+        row = rows.get(current, {})
+        series.append({
+            'period': period_label(current, period),
+            'start': current,
+            **{name: row.get(name) or 0 for name in aggregates},
+        })
+        current = shift(current, period, 1)
+    return series
+
+
+def _resolve_field(model, path):
+    *relations, name = path.split('__')
+    for relation in relations:
+        model = model._meta.get_field(relation).related_model
+    return model._meta.get_field(name)
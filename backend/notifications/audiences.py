@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+
+from products.models import Wishlist
+
+User = get_user_model()
+
+
+def flash_sale_wishlist_holders(flash_sale_id):
+    """Users with a product of the flash sale on one of their wishlists"""
+    holders = Wishlist.objects.filter(products__flash_sales=flash_sale_id).values('user_id')
+    return User.objects.filter(id__in=holders, is_active=True)
+
+
+# Named audiences notify_audience can fan out to; each takes JSON-serializable
+# keyword arguments and returns a User queryset
+AUDIENCES = {
+    'flash_sale_wishlists': flash_sale_wishlist_holders,
+}
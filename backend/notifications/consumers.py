@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .push import user_group
+
+logger = logging.getLogger(__name__)
+
+# Messages a socket may have waiting to be written before it is told to resync
+OUTBOX_SIZE = 100
+
+
+class NotificationConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes a user's new notifications and order updates
+
+    Connect to ws/notifications/?token=<JWT access token>. Server messages:
+        {"type": "notification", "notification": {...}}
+        {"type": "order", "order": {"id": ..., "status": ...}}
+        {"type": "resync"}  messages were dropped; refetch over REST
+    Clients may send {"type": "ping"} and get {"type": "pong"} back.
+
+    Messages go through a bounded outbox written by its own task, so a
+    client that cannot keep up costs OUTBOX_SIZE messages of memory at most;
+    beyond that its backlog is replaced by a single resync.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        await self.accept()
+        self.outbox = asyncio.Queue(maxsize=OUTBOX_SIZE)
+        self.writer = asyncio.ensure_future(self.write_outbox())
+        self.group = user_group(user.pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+
+    async def disconnect(self, code):
+        if hasattr(self, 'writer'):
+            self.writer.cancel()
+            try:
+                await self.writer
+            except asyncio.CancelledError:
+                pass
+            except Exception:
+                logger.exception("Notification socket writer failed")
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def receive_json(self, content, **kwargs):
+        if isinstance(content, dict) and content.get('type') == 'ping':
+            self.enqueue({'type': 'pong'})
+
+    async def notification_created(self, event):
+        self.enqueue({'type': 'notification', 'notification': event['notification']})
+
+    async def order_updated(self, event):
+        self.enqueue({'type': 'order', 'order': event['order']})
+
+    def enqueue(self, message):
+        try:
+            self.outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            # The client is too slow; drop what it has not seen and have it refetch
+            while not self.outbox.empty():
+                self.outbox.get_nowait()
+            self.outbox.put_nowait({'type': 'resync'})
+
+    async def write_outbox(self):
+        try:
+            while True:
+                message = await self.outbox.get()
+                await self.send_json(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # A socket nothing can be written to would silently fill its outbox;
+            # close it so the client reconnects
+            logger.exception("Could not write to notification socket %s", self.channel_name)
+            await self.close(code=1011)
@@ -0,0 +1,199 @@
+import asyncio
+import base64
+import json
+import os
+import resource
+import statistics
+import struct
+import time
+import uuid
+from urllib.parse import urlsplit
+
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from notifications.models import Notification
+from notifications.utils import create_notifications
+
+User = get_user_model()
+
+
+class Socket:
+    """Minimal websocket client: text frames, pings over JSON, no extensions"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, url, token):
+        parts = urlsplit(url)
+        port = parts.port or 80
+        reader, writer = await asyncio.open_connection(parts.hostname, port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        writer.write((
+            f'GET {parts.path}?token={token} HTTP/1.1\r\n'
+            f'Host: {parts.hostname}:{port}\r\n'
+            f'Origin: http://{parts.hostname}:{port}\r\n'
+            'Upgrade: websocket\r\nConnection: Upgrade\r\n'
+            f'Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n'
+        ).encode())
+        response = await reader.readuntil(b'\r\n\r\n')
+        if not response.startswith(b'HTTP/1.1 101'):
+            writer.close()
+            raise ConnectionError(response.split(b'\r\n', 1)[0].decode())
+        return cls(reader, writer)
+
+    def send_json(self, message, opcode=0x1):
+        payload = json.dumps(message).encode()
+        mask = os.urandom(4)
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('!BB', 0x80 | opcode, 0x80 | length)
+        elif length < 65536:
+            header = struct.pack('!BBH', 0x80 | opcode, 0x80 | 126, length)
+        else:
+            header = struct.pack('!BBQ', 0x80 | opcode, 0x80 | 127, length)
+        # Client frames must be masked
+        self.writer.write(header + mask + bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload)))
+
+    async def receive_json(self):
+        """Next text message, or None once the server closes"""
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode, length = first & 0x0F, second & 0x7F
+            if length == 126:
+                length, = struct.unpack('!H', await self.reader.readexactly(2))
+            elif length == 127:
+                length, = struct.unpack('!Q', await self.reader.readexactly(8))
+            payload = await self.reader.readexactly(length)
+            if opcode == 0x8:
+                return None
+            if opcode == 0x1:
+                return json.loads(payload)
+
+    def close(self):
+        self.writer.close()
+
+
+class Command(BaseCommand):
+    help = 'Opens many authenticated notification websockets against a running server and measures what it sustains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='ws://127.0.0.1:8000/ws/notifications/', help='Notification socket URL')
+        parser.add_argument('--connections', type=int, default=1000, help='Sockets to open, one user each')
+        parser.add_argument('--ramp', type=int, default=100, help='Sockets opened concurrently')
+        parser.add_argument('--pings', type=int, default=5, help='Ping rounds across all sockets')
+        parser.add_argument('--pushes', type=int, default=1, help='Notifications created per user')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and notifications')
+
+    def handle(self, *args, **options):
+        # One descriptor per socket
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        if options['connections'] + 100 > hard:
+            raise CommandError(f'Open file limit {hard} is too low for {options["connections"]} sockets')
+
+        run = uuid.uuid4().hex[:8]
+        users = User.objects.bulk_create([
+            User(username=f'bench-ws-{run}-{index}', is_customer=True) for index in range(options['connections'])
+        ])
+        tokens = {user.id: str(AccessToken.for_user(user)) for user in users}
+        try:
+            asyncio.run(self.benchmark(users, tokens, options))
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=f'bench-ws-{run}-').delete()
+
+    async def benchmark(self, users, tokens, options):
+        url = options['url']
+        sockets = {}
+        failures = []
+        gate = asyncio.Semaphore(options['ramp'])
+
+        async def open_one(user):
+            async with gate:
+                try:
+                    sockets[user.id] = await asyncio.wait_for(Socket.connect(url, tokens[user.id]), 30)
+                except (OSError, ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+                    failures.append(repr(exc))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(open_one(user) for user in users))
+        self.stdout.write(
+            f'opened {len(sockets)}/{len(users)} sockets in {time.perf_counter() - started:.1f} s'
+            + (f', first failure: {failures[0]}' if failures else '')
+        )
+        if not sockets:
+            raise CommandError('No socket could be opened; is the ASGI server running at --url?')
+
+        try:
+            round_trips = []
+            for _ in range(options['pings']):
+                round_trips.extend(await asyncio.gather(*(self.ping(socket) for socket in sockets.values())))
+            round_trips = sorted(rtt for rtt in round_trips if rtt is not None)
+            if round_trips:
+                self.stdout.write(
+                    f'ping over {len(sockets)} open sockets: p50 {statistics.median(round_trips):.1f} ms, '
+                    f'p99 {round_trips[int(len(round_trips) * 0.99) - 1]:.1f} ms, '
+                    f'{options["pings"] * len(sockets) - len(round_trips)} lost'
+                )
+
+            if options['pushes']:
+                await self.push(sockets, options['pushes'])
+        finally:
+            for socket in sockets.values():
+                socket.close()
+        self.stdout.write(self.style.SUCCESS(f'{len(sockets)} concurrent sockets sustained'))
+
+    async def ping(self, socket):
+        started = time.perf_counter()
+        socket.send_json({'type': 'ping'})
+        try:
+            while True:
+                message = await asyncio.wait_for(socket.receive_json(), 10)
+                if message is None:
+                    return None
+                if message.get('type') == 'pong':
+                    return (time.perf_counter() - started) * 1000
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            return None
+
+    async def push(self, sockets, pushes):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            self.stdout.write(self.style.WARNING(
+                'Skipping pushes: the in-memory channel layer does not reach the server process; set REDIS_HOST'
+            ))
+            return
+
+        async def collect(socket):
+            latencies = []
+            try:
+                while len(latencies) < pushes:
+                    message = await asyncio.wait_for(socket.receive_json(), 30)
+                    if message is None:
+                        break
+                    if message.get('type') == 'notification':
+                        latencies.append((time.time() - float(message['notification']['message'])) * 1000)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                pass
+            return latencies
+
+        receivers = [asyncio.ensure_future(collect(socket)) for socket in sockets.values()]
+        started = time.perf_counter()
+        for _ in range(pushes):
+            # The message carries its send time, so each socket can measure delivery latency
+            await asyncio.to_thread(create_notifications, [
+                Notification(user_id=user_id, notification_type='system', title='Benchmark', message=str(time.time()))
+                for user_id in sockets
+            ])
+        latencies = sorted(latency for result in await asyncio.gather(*receivers) for latency in result)
+        elapsed = time.perf_counter() - started
+        expected = pushes * len(sockets)
+        self.stdout.write(
+            f'delivered {len(latencies)}/{expected} pushes in {elapsed:.1f} s ({len(latencies) / elapsed:.0f}/s)'
+            + (f', latency p50 {statistics.median(latencies):.1f} ms, '
+               f'p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms' if latencies else '')
+        )
@@ -0,0 +1,34 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticate websockets from a `?token=<JWT access token>` query parameter
+
+    Browsers cannot set an Authorization header on websockets. Without a
+    token the session user from AuthMiddlewareStack is kept.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            scope = dict(scope, user=await user_for_token(token[0]))
+        return await super().__call__(scope, receive, send)
+
+
+@database_sync_to_async
+def user_for_token(raw_token):
+    """The active user a JWT access token belongs to, or AnonymousUser"""
+    from django.contrib.auth.models import AnonymousUser
+
+    authentication = JWTAuthentication()
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return AnonymousUser()
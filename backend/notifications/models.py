@@ -23,6 +23,35 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Unread counts and unread-only inbox pages
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_unread_idx'),
+            # Inbox pages: WHERE user_id = ... ORDER BY created_at DESC, id DESC
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.notification_type}: {self.title}"
+
+
+class ArchivedNotification(models.Model):
+    """
+    A read notification moved out of the inbox table by the retention task
+
+    Keeps the original id, so archiving a notification twice is harmless.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    reference_id = models.CharField(max_length=100, blank=True)
+    is_read = models.BooleanField(default=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.notification_type}: {self.title} (archived)"
@@ -0,0 +1,64 @@
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def user_group(user_id):
+    """Channel layer group of a user's open notification sockets"""
+    return f'notifications.user.{user_id}'
+
+
+def push_notifications(notifications):
+    """Send saved notifications to their users' open sockets once the transaction commits"""
+    messages = [
+        (notification.user_id, {
+            'type': 'notification.created',
+            'notification': {
+                'id': notification.id,
+                'notification_type': notification.notification_type,
+                'title': notification.title,
+                'message': notification.message,
+                'reference_id': notification.reference_id,
+                'is_read': notification.is_read,
+                'created_at': notification.created_at.isoformat() if notification.created_at else None,
+            },
+        })
+        for notification in notifications
+    ]
+    if messages:
+        transaction.on_commit(lambda: _send(messages))
+
+
+def push_order_update(user_id, order_id, **fields):
+    """
+    Tell a customer's open sockets that an order changed
+
+    Args:
+        user_id: Customer; guest orders (None) are skipped
+        order_id: Order that changed
+        **fields: What changed, e.g. status='paid'
+    """
+    if user_id is None:
+        return
+    message = {'type': 'order.updated', 'order': {'id': str(order_id), **fields}}
+    transaction.on_commit(lambda: _send([(user_id, message)]))
+
+
+def _send(messages):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(_group_send_all)(channel_layer, messages)
+    except Exception:
+        # Clients fall back to the REST inbox; a push is never worth failing a write over
+        logger.exception("Could not push %d messages", len(messages))
+
+
+async def _group_send_all(channel_layer, messages):
+    for user_id, message in messages:
+        await channel_layer.group_send(user_group(user_id), message)
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+# Read notifications older than this leave the inbox table
+RETENTION_DAYS = 90
+BATCH_SIZE = 1000
+ARCHIVED_FIELDS = ('id', 'user_id', 'notification_type', 'title', 'message', 'reference_id', 'is_read', 'created_at')
+
+
+def archive_read_notifications(days=RETENTION_DAYS, batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """
+    Move read notifications older than `days` into ArchivedNotification
+
+    Each batch is copied and deleted in one transaction, oldest ids first,
+    so the inbox table only keeps what users still look at.
+
+    Returns:
+        Number of notifications archived
+    """
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    archived = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            rows = list(
+                Notification.objects.select_for_update(skip_locked=True)
+                .filter(is_read=True, created_at__lt=cutoff)
+                .order_by('id')
+                .values(*ARCHIVED_FIELDS)[:batch_size]
+            )
+            if not rows:
+                break
+            ArchivedNotification.objects.bulk_create(
+                [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+            )
+            Notification.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        archived += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return archived
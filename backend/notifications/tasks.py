@@ -0,0 +1,49 @@
+from celery import shared_task
+
+from .audiences import AUDIENCES
+from .models import Notification
+from .retention import archive_read_notifications
+from .utils import BATCH_SIZE, create_notifications
+
+
+@shared_task
+def fan_out_notification(audience, params, notification_type, title, message, reference_id="", batch_size=BATCH_SIZE):
+    """
+    Celery task to send one notification to every user of a named audience.
+    Users are paged by id and written with one bulk INSERT per page, so
+    memory and transaction size stay bounded however large the audience.
+    """
+    users = AUDIENCES[audience](**params).order_by('id').values_list('id', flat=True)
+    sent = 0
+    last_id = None
+    while True:
+        page = users.filter(id__gt=last_id) if last_id is not None else users
+        user_ids = list(page[:batch_size])
+        if not user_ids:
+            break
+        create_notifications(
+            [
+                Notification(
+                    user_id=user_id,
+                    notification_type=notification_type,
+                    title=title,
+                    message=message,
+                    reference_id=reference_id,
+                )
+                for user_id in user_ids
+            ],
+            batch_size=batch_size,
+        )
+        sent += len(user_ids)
+        last_id = user_ids[-1]
+    return f"Sent {sent} notifications to {audience}"
+
+
+@shared_task
+def archive_old_notifications():
+    """
+    Celery task to move old read notifications out of the inbox table.
+    Unread notifications stay however old they are.
+    """
+    count = archive_read_notifications()
+    return f"Archived {count} read notifications"
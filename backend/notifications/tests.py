@@ -1,3 +1,198 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from .consumers import NotificationConsumer
+from .models import ArchivedNotification, Notification
+from .push import user_group
+from .tasks import archive_old_notifications
+from .utils import create_notification
+
+
+class PendingNotificationTests(TestCase):
+    """Notifications created in a transaction are written on commit, in creation order"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', is_customer=True)
+
+    def notify(self, title):
+        create_notification(self.user, 'system', title, 'Test message')
+
+    def written(self):
+        return list(Notification.objects.order_by('id').values_list('title', flat=True))
+
+    def test_written_on_commit_in_creation_order(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.notify('first')
+                with transaction.atomic():
+                    self.notify('second')
+                self.notify('third')
+                self.assertEqual(self.written(), [])
+        self.assertEqual(self.written(), ['first', 'second', 'third'])
+
+    def test_savepoint_rollback_drops_its_notifications(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.notify('kept')
+                try:
+                    with transaction.atomic():
+                        self.notify('rolled back')
+                        raise ValueError
+                except ValueError:
+                    pass
+                self.notify('also kept')
+                with transaction.atomic():
+                    self.notify('inner kept')
+        self.assertEqual(self.written(), ['kept', 'also kept', 'inner kept'])
+
+
+class RolledBackTransactionTests(TransactionTestCase):
+    """Notifications follow real commits and rollbacks of the outermost transaction"""
+
+    def test_only_committed_notifications_are_written(self):
+        user = User.objects.create(username='customer', is_customer=True)
+        try:
+            with transaction.atomic():
+                create_notification(user, 'system', 'rolled back', 'Test message')
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            create_notification(user, 'system', 'kept', 'Test message')
+        self.assertEqual(list(Notification.objects.values_list('title', flat=True)), ['kept'])
+
+
+class NotificationConsumerTests(SimpleTestCase):
+    """The socket delivers a user's pushes, and closes rather than going silent"""
+
+    async def connect(self, user=None):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+        communicator.scope['user'] = user or User(pk=1, username='customer')
+        connected, code = await communicator.connect()
+        return communicator, connected, code
+
+    async def test_anonymous_is_refused(self):
+        _, connected, code = await self.connect(AnonymousUser())
+        self.assertFalse(connected)
+        self.assertEqual(code, 4401)
+
+    async def test_pushes_reach_the_users_socket(self):
+        communicator, connected, _ = await self.connect()
+        self.assertTrue(connected)
+        await get_channel_layer().group_send(user_group(1), {'type': 'order.updated', 'order': {'id': 'o1'}})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'order', 'order': {'id': 'o1'}})
+        await communicator.send_json_to({'type': 'ping'})
+        self.assertEqual(await communicator.receive_json_from(), {'type': 'pong'})
+        await communicator.disconnect()
+
+    async def test_failed_write_closes_the_socket(self):
+        with mock.patch.object(NotificationConsumer, 'send_json', side_effect=RuntimeError('broken pipe')), \
+                self.assertLogs('notifications.consumers', 'ERROR'):
+            communicator, _, _ = await self.connect()
+            await communicator.send_json_to({'type': 'ping'})
+            closed = await communicator.receive_output()
+        self.assertEqual(closed, {'type': 'websocket.close', 'code': 1011})
+        await communicator.disconnect()
+
+    def test_slow_client_gets_one_resync(self):
+        consumer = NotificationConsumer()
+        consumer.outbox = asyncio.Queue(maxsize=2)
+        for index in range(3):
+            consumer.enqueue({'type': 'notification', 'notification': {'id': index}})
+        self.assertEqual(consumer.outbox.qsize(), 1)
+        self.assertEqual(consumer.outbox.get_nowait(), {'type': 'resync'})
+
+
+class InboxTests(TestCase):
+    """The unread badge is served from the cache and follows every change to the inbox"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', is_customer=True)
+        cls.other = User.objects.create(username='other', is_customer=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def notify(self, user=None, title='Test'):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_notification(user or self.user, 'system', title, 'Test message')
+        return Notification.objects.latest('id')
+
+    def badge(self):
+        return self.client.get('/api/notifications/unread_count/').data['unread_count']
+
+    def test_badge_is_cached(self):
+        self.notify()
+        self.assertEqual(self.badge(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.badge(), 1)
+
+    def test_badge_follows_changes(self):
+        first = self.notify()
+        self.assertEqual(self.badge(), 1)
+
+        self.notify()
+        self.notify(self.other)
+        self.assertEqual(self.badge(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{first.pk}/mark_as_read/')
+            self.client.post(f'/api/notifications/{first.pk}/mark_as_read/')
+        self.assertEqual(self.badge(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.badge(), 0)
+
+    def test_unread_filter_pages_through_the_inbox(self):
+        read = self.notify(title='read')
+        Notification.objects.filter(pk=read.pk).update(is_read=True)
+        for index in range(3):
+            self.notify(title=f'unread {index}')
+        self.notify(self.other)
+
+        titles = []
+        url = '/api/notifications/?is_read=false&page_size=2'
+        while url:
+            page = self.client.get(url).data
+            titles += [item['title'] for item in page['results']]
+            url = page['next']
+        self.assertEqual(titles, ['unread 2', 'unread 1', 'unread 0'])
+
+
+class ArchiveTests(TestCase):
+    """Old read notifications move to the archive; unread ones stay however old"""
+
+    def test_archives_only_old_read_notifications(self):
+        user = User.objects.create(username='customer', is_customer=True)
+        old = timezone.now() - timedelta(days=100)
+        for title, is_read, created_at in (
+            ('old read', True, old), ('old unread', False, old), ('new read', True, timezone.now()),
+        ):
+            notification = Notification.objects.create(
+                user=user, notification_type='system', title=title, message='Test message', is_read=is_read,
+            )
+            Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+
+        self.assertEqual(archive_old_notifications(), 'Archived 1 read notifications')
+        self.assertEqual(archive_old_notifications(), 'Archived 0 read notifications')
+
+        self.assertEqual(list(ArchivedNotification.objects.values_list('title', flat=True)), ['old read'])
+        self.assertEqual(
+            sorted(Notification.objects.values_list('title', flat=True)), ['new read', 'old unread'],
+        )
@@ -1,24 +1,138 @@
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
 from .models import Notification
+from .push import push_notifications
+
+# Rows per INSERT when creating notifications in bulk
+BATCH_SIZE = 1000
+
+UNREAD_KEY = 'notifications:unread:{user_id}'
+# Cached counts are recounted at least this often, so any drift heals
+UNREAD_TIMEOUT = 60 * 15
+# Beyond this many users a write drops their counters instead of updating each
+UNREAD_INCR_LIMIT = 100
 
 
 def create_notification(user, notification_type, title, message, reference_id=""):
     """
     Create a notification for a user
-    
+
+    Inside a transaction the notification is written when the transaction
+    commits, in creation order, and never if the transaction or the
+    savepoint it was created in rolls back.
+
     Args:
         user: User object
         notification_type: Type of notification (from Notification.NOTIFICATION_TYPES)
         title: Notification title
         message: Notification message
         reference_id: Optional reference ID (e.g., order ID)
-    
+
     Returns:
-        Notification object
+        Notification object, saved once the transaction commits
     """
-    return Notification.objects.create(
+    notification = Notification(
         user=user,
         notification_type=notification_type,
         title=title,
         message=message,
         reference_id=reference_id
-    )
\ No newline at end of file
+    )
+    if transaction.get_connection().in_atomic_block:
+        # Django drops the hook with a rolled-back savepoint
+        transaction.on_commit(lambda: create_notifications([notification]))
+    else:
+        notification.save()
+        push_notifications([notification])
+        adjust_unread_counts({notification.user_id: 1})
+    return notification
+
+
+def create_notifications(notifications, batch_size=BATCH_SIZE):
+    """
+    Create many notifications with bulk INSERTs and push them to open sockets
+
+    Args:
+        notifications: Iterable of Notification objects, or of dicts of
+            Notification fields (user or user_id, notification_type, title,
+            message and optionally reference_id)
+        batch_size: Rows per INSERT
+
+    Returns:
+        List of the created Notification objects
+    """
+    notifications = [
+        notification if isinstance(notification, Notification) else Notification(**notification)
+        for notification in notifications
+    ]
+    if not notifications:
+        return []
+    created = Notification.objects.bulk_create(notifications, batch_size=batch_size)
+    push_notifications(created)
+    adjust_unread_counts(Counter(notification.user_id for notification in created if not notification.is_read))
+    return created
+
+
+def unread_count(user):
+    """Number of unread notifications of a user, from the cache when possible"""
+    key = UNREAD_KEY.format(user_id=user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user=user, is_read=False).count()
+        # add, not set: a concurrent write may have stored a newer count meanwhile
+        cache.add(key, count, UNREAD_TIMEOUT)
+    return max(count, 0)
+
+
+def adjust_unread_counts(deltas):
+    """
+    Apply changes to cached unread counts once the transaction commits
+
+    Args:
+        deltas: Dict mapping user id to the change in their unread count;
+            users whose count is not cached are left to be counted on read
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if deltas:
+        transaction.on_commit(lambda: _apply_unread_deltas(deltas))
+
+
+def forget_unread_count(user_id):
+    """Drop a user's cached unread count once the transaction commits, so the next read recounts"""
+    transaction.on_commit(lambda: cache.delete(UNREAD_KEY.format(user_id=user_id)))
+
+
+def _apply_unread_deltas(deltas):
+    if len(deltas) > UNREAD_INCR_LIMIT:
+        cache.delete_many([UNREAD_KEY.format(user_id=user_id) for user_id in deltas])
+        return
+    for user_id, delta in deltas.items():
+        try:
+            cache.incr(UNREAD_KEY.format(user_id=user_id), delta)
+        except ValueError:
+            pass  # Not cached; the next read counts it
+
+
+def notify_audience(audience, params, notification_type, title, message, reference_id=""):
+    """
+    Send the same notification to every user of an audience, from a worker
+
+    The audience is resolved and written in batches by a Celery task, so the
+    request announcing a flash sale to 100k wishlists returns immediately.
+
+    Args:
+        audience: Name of an audience in notifications.audiences.AUDIENCES
+        params: JSON-serializable keyword arguments for the audience
+        notification_type, title, message, reference_id: As for create_notification
+    """
+    from .audiences import AUDIENCES
+    from .tasks import fan_out_notification
+
+    if audience not in AUDIENCES:
+        raise ValueError(f"Unknown audience: {audience}")
+    transaction.on_commit(lambda: fan_out_notification.delay(
+        audience, params, notification_type, title, message, reference_id
+    ))
@@ -3,24 +3,42 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from .models import Notification
 from .serializers import NotificationSerializer
+from .utils import adjust_unread_counts, forget_unread_count, unread_count
+from marketplace.pagination import KeysetCursorPagination
 from profiles.permissions import IsCustomer
 
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Notification inbox, newest first, in cursor-paginated pages
+    
+    GET /api/notifications/?is_read=false - Only unread notifications
+    GET /api/notifications/unread_count/ - Badge count
+    """
     serializer_class = NotificationSerializer
     permission_classes = [IsCustomer]
+    pagination_class = KeysetCursorPagination
     
     def get_queryset(self):
-        return Notification.objects.filter(user=self.request.user)
+        queryset = Notification.objects.filter(user=self.request.user)
+        is_read = self.request.query_params.get('is_read')
+        if is_read is not None and self.action == 'list':
+            queryset = queryset.filter(is_read=is_read.lower() in ('1', 'true', 'yes'))
+        return queryset.order_by('-created_at', '-id')
+    
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        return Response({'unread_count': unread_count(request.user)})
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
+        if Notification.objects.filter(pk=notification.pk, is_read=False).update(is_read=True):
+            adjust_unread_counts({request.user.pk: -1})
         return Response({'status': 'notification marked as read'})
     
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
-        self.get_queryset().update(is_read=True)
+        Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        forget_unread_count(request.user.pk)
         return Response({'status': 'all notifications marked as read'})
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, CartItem, Reservation, Order, OrderItem, VendorOrder
+from .models import Cart, CartItem, Reservation, Order, OrderItem, VendorOrder, StripeEvent
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
@@ -15,7 +15,7 @@ class ReservationAdmin(admin.ModelAdmin):
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "user", "status", "total_amount", "created_at")
+    list_display = ("id", "user", "status", "payment_intent_status", "total_amount", "created_at")
 
 @admin.register(VendorOrder)
 class VendorOrderAdmin(admin.ModelAdmin):
@@ -23,4 +23,11 @@ class VendorOrderAdmin(admin.ModelAdmin):
 
 @admin.register(OrderItem)
 class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ("order", "product", "sku", "quantity", "unit_price")
\ No newline at end of file
+    list_display = ("order", "product", "sku", "quantity", "unit_price")
+
+@admin.register(StripeEvent)
+class StripeEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "event_type", "received_at", "processed_at", "attempts")
+    list_filter = ("event_type",)
+    search_fields = ("event_id",)
+    readonly_fields = ("event_id", "event_type", "payload", "received_at", "processed_at", "attempts", "last_error")
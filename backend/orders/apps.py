@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class OrdersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "orders"
\ No newline at end of file
+    name = "orders"
+
+    def ready(self):
+        import orders.signals
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.cache_tags import product_tags
+from products.models import SKU, InventoryTransaction, BulkDiscount
+from marketplace.cache import invalidate
+from . import payments, reservations
+from .rollups import RevenueDeltas
+from .models import Coupon, Order, OrderItem, Reservation, VendorOrder
+
+
+class CheckoutError(Exception):
+    """Raised when an order cannot be placed; the message is safe to show the customer"""
+
+
+def place_order(lines, *, user=None, cart=None, guest=None, payment_method="stripe",
+                coupon_code=None, shipping_address=None):
+    """
+    Place an order atomically with a constant number of queries
+
+    Args:
+        lines: List of (sku_id, quantity, unit_price) tuples; unit_price may be
+            None to use the SKU's current price
+        user: Ordering user, or None for guests
+        cart: Cart whose reservations are converted, if any
+        guest: Dict of guest_email/guest_name/guest_phone for guest orders
+        payment_method: One of Order.PAYMENT_METHOD_CHOICES
+        coupon_code: Optional coupon code
+        shipping_address: Shipping address JSON
+
+    Returns:
+        The created Order
+
+    Raises:
+        CheckoutError: if a SKU is missing or short of stock
+
+    The SKU rows are locked in primary key order and then the cart's
+    reservations, the order every stock path takes them in, so concurrent
+    checkouts, carts and expiry sweeps queue up instead of deadlocking.
+    Everything else is written with bulk_create and a single CASE UPDATE
+    for stock.
+    """
+    quantities = defaultdict(int)
+    prices = {}
+    for sku_id, quantity, unit_price in lines:
+        quantities[sku_id] += quantity
+        if unit_price is not None:
+            prices[sku_id] = unit_price
+    sku_ids = sorted(quantities, key=str)
+
+    with transaction.atomic():
+        skus = {
+            sku.id: sku for sku in SKU.objects.select_for_update(of=("self",))
+            .select_related("product__vendor").filter(id__in=sku_ids).order_by("id")
+        }
+        if len(skus) != len(sku_ids):
+            raise CheckoutError("SKU not found")
+
+        # The cart's own live holds are part of what it may buy; expired ones
+        # are the sweep's to release
+        held = defaultdict(int)
+        held_ids = []
+        if cart is not None:
+            holds = Reservation.objects.select_for_update().filter(
+                cart=cart, status="active", sku_id__in=sku_ids, expires_at__gt=timezone.now()
+            ).values_list("id", "sku_id", "quantity")
+            for reservation_id, sku_id, quantity in holds:
+                held[sku_id] += quantity
+                held_ids.append(reservation_id)
+        for sku_id in sku_ids:
+            sku = skus[sku_id]
+            if quantities[sku_id] > sku.available_quantity + held.get(sku_id, 0):
+                raise CheckoutError(f"Insufficient stock for {sku.sku_code}")
+
+        # Price every line, then apply each vendor's best bulk tier
+        vendor_quantities = defaultdict(int)
+        for sku_id in sku_ids:
+            vendor_quantities[skus[sku_id].product.vendor_id] += quantities[sku_id]
+        discounts = _best_bulk_discounts(vendor_quantities)
+
+        vendor_totals = defaultdict(Decimal)
+        list_total = Decimal("0")
+        priced = []
+        for sku_id in sku_ids:
+            sku = skus[sku_id]
+            unit_price = prices.get(sku_id)
+            if unit_price is None:
+                unit_price = sku.product.price + (sku.price_adjustment or Decimal("0"))
+            list_total += unit_price * quantities[sku_id]
+            discount = discounts.get(sku.product.vendor_id)
+            if discount:
+                multiplier = Decimal(1) - (discount.discount_percentage / Decimal(100))
+                unit_price = (unit_price * multiplier).quantize(Decimal("0.01"))
+            vendor_totals[sku.product.vendor_id] += unit_price * quantities[sku_id]
+            priced.append((sku, unit_price))
+        total = sum(vendor_totals.values(), Decimal("0"))
+
+        # Coupons apply to the cart value before bulk discounts
+        coupon, discount_amount = _redeem_coupon(coupon_code, list_total)
+
+        order = Order.objects.create(
+            user=user,
+            status="pending",
+            currency="usd",
+            payment_method=payment_method,
+            payment_intent_status=payments.initial_status(payment_method),
+            coupon=coupon,
+            discount_amount=discount_amount,
+            subtotal_amount=total,
+            total_amount=max(Decimal("0"), total - discount_amount),
+            shipping_address=shipping_address or {},
+            **({"is_guest": True, **guest} if guest else {}),
+        )
+
+        vendor_orders = {
+            vendor_id: VendorOrder(order=order, vendor_id=vendor_id, status="pending", total_amount=amount)
+            for vendor_id, amount in vendor_totals.items()
+        }
+        VendorOrder.objects.bulk_create(vendor_orders.values())
+        revenue = RevenueDeltas()
+        for vendor_id, vendor_order in vendor_orders.items():
+            revenue.add(vendor_id, order.created_at, vendor_order.status, vendor_order.total_amount, vendor_quantities[vendor_id])
+        revenue.apply()
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order, vendor_order=vendor_orders[sku.product.vendor_id], sku=sku,
+                product=sku.product, quantity=quantities[sku.id], unit_price=unit_price,
+            )
+            for sku, unit_price in priced
+        ])
+
+        reservations.sell(quantities, held=held, reservation_ids=held_ids)
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(
+                sku_id=sku_id,
+                transaction_type="sale",
+                quantity=-quantities[sku_id],
+                reference=str(order.id),
+                notes="Checkout - Guest" if guest else "Checkout",
+                created_by=user,
+            )
+            for sku_id in sku_ids
+        ])
+
+        if cart is not None:
+            cart.items.all().delete()
+
+        # Stock is part of the cached product responses
+        product_ids = {sku.product_id for sku in skus.values()}
+        transaction.on_commit(lambda: invalidate(*product_tags(product_ids)))
+        if order.payment_intent_status == "pending":
+            # Stripe is called by a worker, never on the request path
+            transaction.on_commit(lambda: payments.enqueue_payment_intent(order.id))
+    return order
+
+
+def _best_bulk_discounts(vendor_quantities):
+    """Each vendor's highest active tier reached by the quantity ordered, in one query"""
+    best = {}
+    tiers = BulkDiscount.objects.filter(
+        vendor_id__in=list(vendor_quantities), is_active=True
+    ).order_by("-min_quantity")
+    for tier in tiers:
+        if tier.vendor_id not in best and tier.min_quantity <= vendor_quantities[tier.vendor_id]:
+            best[tier.vendor_id] = tier
+    return best
+
+
+def _redeem_coupon(code, total):
+    if not code:
+        return None, Decimal("0")
+    coupon = Coupon.objects.select_for_update().filter(code=code).first()
+    if coupon is None or not coupon.is_valid() or total < coupon.min_purchase_amount:
+        return None, Decimal("0")
+    Coupon.objects.filter(pk=coupon.pk).update(current_uses=F("current_uses") + 1)
+    return coupon, coupon.calculate_discount(total)
@@ -0,0 +1,70 @@
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from orders import reservations
+from orders.checkout import place_order
+from orders.models import Cart, CartItem
+from products.models import BulkDiscount, Category, Product, SKU
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Checks out carts of growing size and reports the queries and time each checkout takes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 50], help='Cart sizes to check out')
+        parser.add_argument('--vendors', type=int, default=3, help='Vendors the cart lines are spread over')
+
+    def handle(self, *args, **options):
+        counts = {}
+        # Everything, including the generated fixtures, is rolled back afterwards
+        with transaction.atomic():
+            run = uuid.uuid4().hex[:8]
+            skus = self.setup(run, max(options['lines']), options['vendors'])
+            for size in options['lines']:
+                user = User.objects.create(username=f'bench-checkout-{run}-{size}', is_customer=True)
+                cart = Cart.objects.create(user=user)
+                for sku in skus[:size]:
+                    reservations.hold(cart, sku, 2)
+                    CartItem.objects.create(cart=cart, sku=sku, quantity=2, unit_price=Decimal('10.00'))
+                lines = list(cart.items.values_list('sku_id', 'quantity', 'unit_price'))
+
+                started = time.perf_counter()
+                with CaptureQueriesContext(connection) as queries:
+                    order = place_order(lines, user=user, cart=cart, payment_method='cod')
+                elapsed = (time.perf_counter() - started) * 1000
+                counts[size] = len(queries)
+                self.stdout.write(
+                    f'{size} lines: {len(queries)} queries, {elapsed:.1f} ms, '
+                    f'{order.vendor_orders.count()} vendor orders, total {order.total_amount}'
+                )
+            transaction.set_rollback(True)
+
+        if len(set(counts.values())) > 1:
+            raise CommandError('Query count grows with the number of cart lines')
+        self.stdout.write(self.style.SUCCESS('Query count is constant in the cart size'))
+
+    def setup(self, run, count, vendor_count):
+        category, _ = Category.objects.get_or_create(slug='checkout-benchmark', defaults={'name': 'Checkout Benchmark'})
+        vendors = []
+        for index in range(vendor_count):
+            vendor_user = User.objects.create(username=f'bench-checkout-vendor-{run}-{index}', is_vendor=True, is_customer=False)
+            vendor = VendorProfile.objects.get(user=vendor_user)
+            BulkDiscount.objects.create(vendor=vendor, min_quantity=5, discount_percentage=Decimal('10'))
+            vendors.append(vendor)
+        skus = []
+        for index in range(count):
+            product = Product.objects.create(
+                vendor=vendors[index % vendor_count], category=category, name=f'Checkout Benchmark {run} {index}',
+                slug=f'checkout-bench-{run}-{index}', description='Checkout benchmark product', price=Decimal('10.00'),
+            )
+            skus.append(SKU.objects.create(product=product, sku_code=f'CB-{run}-{index}', stock_quantity=100))
+        return skus
@@ -0,0 +1,167 @@
+import json
+import statistics
+import threading
+import time
+import uuid
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIClient
+
+from marketplace.celery import app as celery_app
+from orders import payments
+from orders.models import Cart, CartItem, Order
+from products.models import Category, Product, SKU
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+
+class FakeStripeServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the PaymentIntents API with a fixed response delay
+
+    Repeated Idempotency-Keys get the intent created for the first request,
+    like the real API.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.intents = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        super().__init__(('127.0.0.1', 0), FakeStripeHandler)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class FakeStripeHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        time.sleep(self.server.latency)
+        params = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode())
+        key = self.headers.get('Idempotency-Key') or uuid.uuid4().hex
+        with self.server.lock:
+            self.server.requests += 1
+            if key not in self.server.intents:
+                intent_id = f'pi_{uuid.uuid4().hex[:24]}'
+                self.server.intents[key] = {
+                    'id': intent_id,
+                    'object': 'payment_intent',
+                    'amount': int(params.get('amount', ['0'])[0]),
+                    'currency': params.get('currency', ['usd'])[0],
+                    'client_secret': f'{intent_id}_secret_{uuid.uuid4().hex[:16]}',
+                    'status': 'requires_payment_method',
+                }
+            body = json.dumps(self.server.intents[key]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measures checkout latency against a fake Stripe server and checks PaymentIntents are created off the request path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Number of checkouts')
+        parser.add_argument('--stripe-latency', type=int, default=300, help='Fake Stripe response time in ms')
+        parser.add_argument('--timeout', type=float, default=60, help='Seconds to wait for all client secrets')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, orders and product')
+
+    def handle(self, *args, **options):
+        if not payments.STRIPE_AVAILABLE:
+            raise CommandError('The stripe package is not installed')
+        from celery.contrib.testing.worker import start_worker
+
+        server = FakeStripeServer(options['stripe_latency'] / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        payments.stripe.api_base = server.url
+        payments.stripe.api_key = payments.stripe.api_key or 'sk_test_benchmark'
+        # Tasks queue in memory until the worker below drains them
+        celery_app.conf.broker_url = 'memory://'
+        celery_app.conf.task_always_eager = False
+
+        run = uuid.uuid4().hex[:8]
+        sku, users = self.setup(run, options['requests'])
+        latencies = []
+        polls = {}
+        try:
+            for user in users:
+                client = APIClient()
+                client.force_authenticate(user)
+                started = time.perf_counter()
+                response = client.post('/api/orders/checkout/', {'payment_method': 'stripe'}, format='json')
+                latencies.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 201:
+                    raise CommandError(f'Checkout failed: {response.status_code} {response.data}')
+                polls[response.data['id']] = (client, response.data['payment_status_url'])
+
+            latencies.sort()
+            self.stdout.write(
+                f'{len(latencies)} checkouts, fake Stripe {options["stripe_latency"]} ms: '
+                f'p50 {statistics.median(latencies):.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms'
+            )
+
+            started = time.perf_counter()
+            with start_worker(celery_app, pool='solo', perform_ping_check=False):
+                pending = dict(polls)
+                while pending and time.perf_counter() - started < options['timeout']:
+                    for order_id, (client, url) in list(pending.items()):
+                        if client.get(url).data['status'] != 'pending':
+                            del pending[order_id]
+                    time.sleep(0.1)
+            self.stdout.write(f'all client secrets available after {time.perf_counter() - started:.1f} s')
+
+            # A retried task must reuse the intent instead of creating another
+            order = Order.objects.get(pk=next(iter(polls)))
+            Order.objects.filter(pk=order.pk).update(payment_intent_status='pending')
+            payments.create_payment_intent(order)
+
+            ready = Order.objects.filter(pk__in=list(polls), payment_intent_status='ready').count()
+            self.stdout.write(f'{ready} ready, {len(server.intents)} intents from {server.requests} Stripe requests')
+            if pending or ready != len(polls):
+                raise CommandError(f'{len(polls) - ready} orders have no PaymentIntent')
+            if len(server.intents) != len(polls):
+                raise CommandError('A retried task created a second PaymentIntent')
+            self.stdout.write(self.style.SUCCESS('Checkout never waited on Stripe, one PaymentIntent per order'))
+        finally:
+            server.shutdown()
+            if not options['keep']:
+                self.teardown(run, sku)
+
+    def setup(self, run, count):
+        vendor_user = User.objects.create(username=f'bench-payments-vendor-{run}', is_vendor=True, is_customer=False)
+        vendor = VendorProfile.objects.get(user=vendor_user)
+        category, _ = Category.objects.get_or_create(slug='payment-benchmark', defaults={'name': 'Payment Benchmark'})
+        product = Product.objects.create(
+            vendor=vendor, category=category, name=f'Payment Benchmark {run}', slug=f'payment-bench-{run}',
+            description='Payment benchmark product', price=Decimal('10.00'),
+        )
+        sku = SKU.objects.create(product=product, sku_code=f'PB-{run}', stock_quantity=count)
+        users = User.objects.bulk_create([
+            User(username=f'bench-payments-{run}-{index}', is_customer=True) for index in range(count)
+        ])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([
+            CartItem(cart=cart, sku=sku, quantity=1, unit_price=Decimal('10.00')) for cart in carts
+        ])
+        return sku, users
+
+    def teardown(self, run, sku):
+        Order.objects.filter(user__username__startswith=f'bench-payments-{run}-').delete()
+        User.objects.filter(username__startswith=f'bench-payments-{run}-').delete()
+        product = sku.product
+        vendor_user = product.vendor.user
+        product.delete()
+        vendor_user.delete()
@@ -0,0 +1,101 @@
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from rest_framework.test import APIClient
+
+from orders.models import Cart, Reservation
+from products.models import Category, Product, SKU
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fires concurrent add-to-cart requests at one SKU and checks that it never oversells'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=300, help='Number of add-to-cart requests (one cart each)')
+        parser.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+        parser.add_argument('--stock', type=int, default=100, help='Stock on the contended SKU')
+        parser.add_argument('--quantity', type=int, default=1, help='Units per request')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, product and SKU')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serializes writers; run this benchmark against PostgreSQL')
+
+        run = uuid.uuid4().hex[:8]
+        sku, users = self.setup(run, options['stock'], options['requests'])
+        start = threading.Barrier(min(options['concurrency'], options['requests']))
+
+        def add_to_cart(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                try:
+                    start.wait(timeout=30)
+                except threading.BrokenBarrierError:
+                    pass
+                started = time.perf_counter()
+                response = client.post('/api/orders/cart/add_item/', {'sku': str(sku.id), 'quantity': options['quantity']}, format='json')
+                return response.status_code, (time.perf_counter() - started) * 1000
+            finally:
+                connection.close()
+
+        self.stdout.write(f'{options["requests"]} requests, {options["concurrency"]} concurrent, stock {options["stock"]}')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(add_to_cart, users))
+        elapsed = time.perf_counter() - started
+
+        accepted = sum(1 for code, _ in results if code == 200)
+        rejected = sum(1 for code, _ in results if code == 400)
+        latencies = sorted(ms for _, ms in results)
+        sku.refresh_from_db()
+        held = Reservation.objects.filter(sku=sku, status='active').aggregate(total=Sum('quantity'))['total'] or 0
+
+        self.stdout.write(f'accepted {accepted}, rejected {rejected}, other {len(results) - accepted - rejected}')
+        self.stdout.write(
+            f'latency p50 {statistics.median(latencies):.1f} ms, '
+            f'p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms, '
+            f'throughput {len(results) / elapsed:.0f} req/s'
+        )
+        self.stdout.write(f'reserved_quantity {sku.reserved_quantity}, active reservations hold {held}')
+
+        oversold = accepted * options['quantity'] > options['stock']
+        drifted = sku.reserved_quantity != held
+        if not options['keep']:
+            self.teardown(run, sku)
+        if oversold or drifted:
+            raise CommandError('Reservation counter is inconsistent' if drifted else 'SKU was oversold')
+        self.stdout.write(self.style.SUCCESS('No overselling, counter matches reservations'))
+
+    def setup(self, run, stock, count):
+        vendor_user = User.objects.create(username=f'bench-vendor-{run}', is_vendor=True, is_customer=False)
+        vendor = VendorProfile.objects.get(user=vendor_user)
+        category, _ = Category.objects.get_or_create(slug='reservation-benchmark', defaults={'name': 'Reservation Benchmark'})
+        product = Product.objects.create(
+            vendor=vendor, category=category, name=f'Benchmark {run}', slug=f'reservation-bench-{run}',
+            description='Reservation benchmark product', price=Decimal('10.00'),
+        )
+        sku = SKU.objects.create(product=product, sku_code=f'RB-{run}', stock_quantity=stock)
+        users = User.objects.bulk_create([
+            User(username=f'bench-{run}-{index}', is_customer=True) for index in range(count)
+        ])
+        Cart.objects.bulk_create([Cart(user=user) for user in users])
+        return sku, users
+
+    def teardown(self, run, sku):
+        User.objects.filter(username__startswith=f'bench-{run}-').delete()
+        product = sku.product
+        vendor_user = product.vendor.user
+        product.delete()
+        vendor_user.delete()
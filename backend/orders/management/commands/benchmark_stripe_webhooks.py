@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import json
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from marketplace.celery import app as celery_app
+from notifications.models import Notification
+from orders import payments
+from orders.models import Order, StripeEvent, VendorOrder
+from orders.webhooks import process_pending_events
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+
+def generate_events(intent_ids, deliveries, seed=0):
+    """
+    payment_intent.succeeded events for some intents, each delivered
+    `deliveries` times in shuffled order the way Stripe retries them
+    """
+    events = [
+        {
+            'id': f'evt_{uuid.uuid4().hex[:24]}',
+            'object': 'event',
+            'type': 'payment_intent.succeeded',
+            'created': int(time.time()),
+            'data': {'object': {'id': intent_id, 'object': 'payment_intent', 'status': 'succeeded'}},
+        }
+        for intent_id in intent_ids
+    ]
+    stream = events * deliveries
+    random.Random(seed).shuffle(stream)
+    return stream
+
+
+def sign(body, secret):
+    """Stripe-Signature header for a payload, as Stripe computes it"""
+    timestamp = int(time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{body}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+class Command(BaseCommand):
+    help = 'Posts generated Stripe webhook events (with redeliveries) and measures ingestion and processing throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500, help='Orders that receive a payment event')
+        parser.add_argument('--deliveries', type=int, default=3, help='Times each event is delivered')
+        parser.add_argument('--batch-size', type=int, default=100, help='Events the consumer claims per transaction')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, orders and events')
+
+    def handle(self, *args, **options):
+        if not payments.STRIPE_AVAILABLE:
+            raise CommandError('The stripe package is not installed')
+        # Consumer runs queue in memory; this command drains the events itself
+        celery_app.conf.broker_url = 'memory://'
+
+        run = uuid.uuid4().hex[:8]
+        orders = self.setup(run, options['orders'])
+        stream = generate_events([order.payment_intent_id for order in orders], options['deliveries'])
+        client = Client()
+        try:
+            latencies = []
+            started = time.perf_counter()
+            for event in stream:
+                body = json.dumps(event)
+                headers = {}
+                if payments.STRIPE_WEBHOOK_SECRET:
+                    headers['HTTP_STRIPE_SIGNATURE'] = sign(body, payments.STRIPE_WEBHOOK_SECRET)
+                request_started = time.perf_counter()
+                response = client.post('/api/orders/payments/stripe/webhook/', body, content_type='application/json', **headers)
+                latencies.append((time.perf_counter() - request_started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'Webhook rejected an event: {response.status_code} {response.content[:200]}')
+            ingest_time = time.perf_counter() - started
+            latencies.sort()
+            self.stdout.write(
+                f'ingested {len(stream)} deliveries in {ingest_time:.2f} s ({len(stream) / ingest_time:.0f}/s), '
+                f'ack p50 {statistics.median(latencies):.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms'
+            )
+
+            started = time.perf_counter()
+            processed, failed = process_pending_events(batch_size=options['batch_size'])
+            process_time = time.perf_counter() - started
+            self.stdout.write(
+                f'processed {processed} events in {process_time:.2f} s ({processed / max(process_time, 1e-9):.0f}/s), {failed} failed'
+            )
+
+            # Replaying everything must not change anything
+            StripeEvent.objects.filter(event_id__in={event['id'] for event in stream}).update(processed_at=None)
+            process_pending_events(batch_size=options['batch_size'])
+
+            order_ids = [order.id for order in orders]
+            stored = StripeEvent.objects.filter(event_id__in={event['id'] for event in stream}).count()
+            paid = Order.objects.filter(id__in=order_ids, status='paid').count()
+            notified = Notification.objects.filter(reference_id__in=[str(pk) for pk in order_ids]).count()
+            self.stdout.write(f'{stored} events stored, {paid} orders paid, {notified} notifications')
+            if stored != len(orders) or paid != len(orders) or notified != len(orders):
+                raise CommandError('Redelivered or replayed events took effect more than once')
+            self.stdout.write(self.style.SUCCESS('Every event stored once and applied exactly once'))
+        finally:
+            if not options['keep']:
+                self.teardown(run, stream)
+
+    def setup(self, run, count):
+        vendor_user = User.objects.create(username=f'bench-webhooks-vendor-{run}', is_vendor=True, is_customer=False)
+        vendor = VendorProfile.objects.get(user=vendor_user)
+        users = User.objects.bulk_create([
+            User(username=f'bench-webhooks-{run}-{index}', is_customer=True) for index in range(10)
+        ])
+        orders = Order.objects.bulk_create([
+            Order(user=users[index % len(users)], status='pending', payment_intent_id=f'pi_bench_{run}_{index}')
+            for index in range(count)
+        ])
+        VendorOrder.objects.bulk_create([VendorOrder(order=order, vendor=vendor, status='pending') for order in orders])
+        return orders
+
+    def teardown(self, run, stream):
+        StripeEvent.objects.filter(event_id__in={event['id'] for event in stream}).delete()
+        User.objects.filter(username__startswith=f'bench-webhooks-{run}-').delete()
+        User.objects.filter(username=f'bench-webhooks-vendor-{run}').delete()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from orders.reservations import expiry_backlog, release_expired, reconcile_reserved_quantities
+
+
+class Command(BaseCommand):
+    help = 'Releases expired cart reservations and repairs SKU reserved_quantity counters that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sku', action='append', dest='skus', help='Only reconcile this SKU ID (repeatable)')
+
+    def handle(self, *args, **options):
+        released = release_expired(sku_ids=options['skus'])
+        corrected = reconcile_reserved_quantities(sku_ids=options['skus'])
+        for sku_id, (stored, actual) in corrected.items():
+            self.stdout.write(f'{sku_id}: reserved_quantity {stored} -> {actual}')
+        backlog = expiry_backlog()
+        self.stdout.write(
+            f"Expiry backlog: {backlog['overdue']} overdue (oldest by {backlog['oldest_overdue_seconds']}s), "
+            f"{backlog['due_next_minute']} due within a minute"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Released {released} expired reservations, corrected {len(corrected)} SKUs'
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from orders.rollups import reconcile_revenue_days
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the daily vendor revenue rollups from the orders and repairs rows that drifted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', action='append', dest='vendors', help='Only reconcile this vendor profile ID (repeatable)')
+
+    def handle(self, *args, **options):
+        corrected = reconcile_revenue_days(vendor_ids=options['vendors'])
+        for (vendor_id, date, status), (stored, expected) in sorted(corrected.items(), key=lambda item: str(item[0])):
+            self.stdout.write(f'{vendor_id} {date} {status}: {stored} -> {expected}')
+        self.stdout.write(self.style.SUCCESS(f'Corrected {len(corrected)} rollup rows'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from orders.models import StripeEvent
+from orders.webhooks import process_pending_events
+
+
+class Command(BaseCommand):
+    help = 'Re-applies stored Stripe webhook events; handlers are idempotent, so processed events can be replayed safely'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', action='append', dest='events', help='Stripe event ID to replay (repeatable)')
+        parser.add_argument('--type', dest='event_type', help='Only replay events of this type')
+        parser.add_argument('--since', help='Only replay events received at or after this ISO datetime')
+        parser.add_argument('--failed', action='store_true', help='Only replay events that have not been processed')
+        parser.add_argument('--all', action='store_true', help='Replay every stored event')
+
+    def handle(self, *args, **options):
+        if not (options['events'] or options['event_type'] or options['since'] or options['failed'] or options['all']):
+            raise CommandError('Choose events with --event, --type, --since, --failed or --all')
+
+        events = StripeEvent.objects.all()
+        if options['events']:
+            events = events.filter(event_id__in=options['events'])
+        if options['event_type']:
+            events = events.filter(event_type=options['event_type'])
+        if options['since']:
+            since = parse_datetime(options['since'])
+            if since is None:
+                raise CommandError(f'Invalid datetime: {options["since"]}')
+            events = events.filter(received_at__gte=since)
+        if options['failed']:
+            events = events.filter(processed_at__isnull=True)
+
+        queued = events.update(processed_at=None, attempts=0, last_error='')
+        processed, failed = process_pending_events()
+        self.stdout.write(self.style.SUCCESS(
+            f'Queued {queued} events for replay; processed {processed}, {failed} failed'
+        ))
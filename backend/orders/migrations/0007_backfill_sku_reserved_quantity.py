@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:41
+
+from django.db import migrations, models
+
+
+def backfill_reserved_quantity(apps, schema_editor):
+    Reservation = apps.get_model('orders', 'Reservation')
+    SKU = apps.get_model('products', 'SKU')
+
+    totals = (
+        Reservation.objects.filter(status='active').values('sku_id')
+        .annotate(total=models.Sum('quantity')).order_by()
+    )
+    for row in totals.iterator():
+        SKU.objects.filter(id=row['sku_id']).update(reserved_quantity=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_created_id_index'),
+        ('products', '0012_sku_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_reserved_quantity, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import TruncDate
+import uuid
+
+
+def backfill_vendor_revenue(apps, schema_editor):
+    VendorOrder = apps.get_model('orders', 'VendorOrder')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    VendorRevenueDay = apps.get_model('orders', 'VendorRevenueDay')
+
+    sold = {
+        (vendor_id, date, status): quantity
+        for vendor_id, date, status, quantity in OrderItem.objects
+        .annotate(date=TruncDate('vendor_order__order__created_at'))
+        .values_list('vendor_order__vendor_id', 'date', 'vendor_order__status')
+        .annotate(quantity=models.Sum('quantity')).order_by()
+    }
+    rows = (
+        VendorOrder.objects.annotate(date=TruncDate('order__created_at'))
+        .values_list('vendor_id', 'date', 'status')
+        .annotate(revenue=models.Sum('total_amount'), orders=models.Count('id')).order_by()
+    )
+    VendorRevenueDay.objects.bulk_create(
+        [
+            VendorRevenueDay(
+                vendor_id=vendor_id, date=date, status=status, revenue=revenue or 0, orders=orders,
+                items_sold=sold.get((vendor_id, date, status)) or 0,
+            )
+            for vendor_id, date, status, revenue, orders in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_vendorprofile_average_rating_and_more'),
+        ('orders', '0009_stripe_event'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VendorRevenueDay',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('processing', 'Processing'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('orders', models.IntegerField(default=0)),
+                ('items_sold', models.IntegerField(default=0)),
+                ('vendor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revenue_days', to='profiles.vendorprofile')),
+            ],
+            options={
+                'unique_together': {('vendor', 'date', 'status')},
+            },
+        ),
+        migrations.RunPython(backfill_vendor_revenue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0010_vendor_revenue_day'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vendororder',
+            index=models.Index(fields=['vendor', 'status'], name='vendororder_vendor_status_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-16 19:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_vendororder_vendor_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reservation',
+            index=models.Index(condition=models.Q(('status', 'active')), fields=['expires_at'], name='reservation_active_expiry_idx'),
+        ),
+    ]
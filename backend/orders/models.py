@@ -93,18 +93,19 @@ class Reservation(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Expiry sweeps only look at active reservations, a small slice of the table
+            models.Index(
+                fields=['expires_at'],
+                name='reservation_active_expiry_idx',
+                condition=models.Q(status='active'),
+            ),
+        ]
+
     def __str__(self):
         return f"Reservation({self.sku.sku_code}, {self.quantity})"
 
-    @staticmethod
-    def active_reserved_quantity(sku):
-        now = timezone.now()
-        return (
-            Reservation.objects.filter(sku=sku, status="active", expires_at__gt=now)
-            .aggregate(models.Sum("quantity"))["quantity__sum"]
-            or 0
-        )
-
 
 class Order(models.Model):
     STATUS_CHOICES = (
@@ -119,6 +120,12 @@ class Order(models.Model):
         ("stripe", "Stripe"),
         ("cod", "Cash on Delivery"),
     )
+    PAYMENT_INTENT_STATUS_CHOICES = (
+        ("", "Not required"),
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    )
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="orders", null=True, blank=True)
     guest_email = models.EmailField(blank=True, null=True)
@@ -133,12 +140,27 @@ class Order(models.Model):
     coupon = models.ForeignKey(Coupon, on_delete=models.SET_NULL, null=True, blank=True)
     currency = models.CharField(max_length=10, default="usd")
     payment_intent_id = models.CharField(max_length=100, blank=True)
+    # PaymentIntents are created by a worker after checkout; see orders.payments
+    payment_intent_status = models.CharField(max_length=10, choices=PAYMENT_INTENT_STATUS_CHOICES, blank=True, default="")
+    payment_client_secret = models.CharField(max_length=255, blank=True)
+    payment_error = models.CharField(max_length=255, blank=True)
     tracking_number = models.CharField(max_length=100, blank=True)
     shipping_address = models.JSONField(default=dict, blank=True)
     estimated_delivery = models.DateField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='order_created_id_idx'),
+            # Sweep for orders still waiting on their PaymentIntent
+            models.Index(
+                fields=['updated_at'], name='order_payment_pending_idx',
+                condition=models.Q(payment_intent_status='pending'),
+            ),
+        ]
+
     def __str__(self):
         if self.is_guest:
             return f"Order({self.id}, Guest: {self.guest_email}, {self.status})"
@@ -165,6 +187,12 @@ class VendorOrder(models.Model):
     shipped_at = models.DateTimeField(null=True, blank=True)
     delivered_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Vendor dashboards filter on the vendor and a set of statuses
+            models.Index(fields=['vendor', 'status'], name='vendororder_vendor_status_idx'),
+        ]
+
     def __str__(self):
         return f"VendorOrder({self.vendor.store_name}, {self.order.id})"
 
@@ -182,6 +210,48 @@ class OrderItem(models.Model):
         return f"OrderItem({self.product}, x{self.quantity})"
 
 
+class VendorRevenueDay(models.Model):
+    """
+    A vendor's vendor orders created on one day, totalled per status
+
+    Maintained incrementally by orders.rollups as orders are placed and
+    change status, and reconciled nightly. Dates are order creation dates
+    in the project time zone.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    vendor = models.ForeignKey(VendorProfile, on_delete=models.CASCADE, related_name='revenue_days')
+    date = models.DateField()
+    status = models.CharField(max_length=20, choices=VendorOrder.STATUS_CHOICES)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    orders = models.IntegerField(default=0)
+    items_sold = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('vendor', 'date', 'status')
+
+    def __str__(self):
+        return f"VendorRevenueDay({self.vendor_id}, {self.date}, {self.status})"
+
+
+class PurchasedProduct(models.Model):
+    """
+    A product a registered customer has bought, one row per (user, product)
+
+    Maintained by orders.purchases as orders are paid, delivered, cancelled
+    and refunded, so checking for a verified purchase is one index lookup
+    instead of a scan of the user's order items.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='purchased_products')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='purchasers')
+    purchased_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('user', 'product')
+
+    def __str__(self):
+        return f"PurchasedProduct({self.user_id}, {self.product_id})"
+
+
 class ShippingAddress(models.Model):
     """
     Model for storing multiple shipping addresses per user
@@ -316,4 +386,31 @@ class ReturnRequest(models.Model):
             import random
             import string
             self.rma_number = 'RMA' + ''.join(random.choices(string.digits, k=10))
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class StripeEvent(models.Model):
+    """
+    Append-only log of Stripe webhook events, processed asynchronously
+
+    The Stripe event id is unique, so redelivered events are stored once.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    event_id = models.CharField(max_length=255, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The consumer's queue: unprocessed events, oldest first
+            models.Index(
+                fields=['received_at'], name='stripe_event_pending_idx',
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"StripeEvent({self.event_id}, {self.event_type})"
@@ -0,0 +1,145 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.core import signing
+from django.utils import timezone
+
+from notifications.push import push_order_update
+from .models import Order
+
+try:
+    import stripe
+    STRIPE_AVAILABLE = True
+    STRIPE_SECRET_KEY = os.getenv("STRIPE_SECRET_KEY")
+    STRIPE_PUBLISHABLE_KEY = os.getenv("STRIPE_PUBLISHABLE_KEY")
+    STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+    if STRIPE_SECRET_KEY:
+        stripe.api_key = STRIPE_SECRET_KEY
+    # Network failures and Stripe-side errors; anything else (e.g. an invalid
+    # request) fails the same way on every attempt
+    RETRYABLE_ERRORS = (stripe.APIConnectionError, stripe.RateLimitError, stripe.APIError)
+except ImportError:
+    stripe = None
+    STRIPE_AVAILABLE = False
+    STRIPE_SECRET_KEY = None
+    STRIPE_PUBLISHABLE_KEY = None
+    STRIPE_WEBHOOK_SECRET = None
+    RETRYABLE_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "orders.payment-status"
+TOKEN_MAX_AGE = 60 * 60 * 24
+# Pending orders untouched for this long are handed to the worker again
+STALE_AFTER = timedelta(minutes=2)
+
+
+def stripe_enabled():
+    return STRIPE_AVAILABLE and bool(stripe.api_key)
+
+
+def initial_status(payment_method):
+    """payment_intent_status a new order starts with"""
+    return "pending" if payment_method == "stripe" and stripe_enabled() else ""
+
+
+def idempotency_key(order_id):
+    """Same key on every attempt, so Stripe returns the intent it already created"""
+    return f"order-{order_id}-payment-intent"
+
+
+def enqueue_payment_intent(order_id):
+    """
+    Hand an order to the worker that creates its PaymentIntent
+
+    A broker outage must not fail the checkout: the order stays pending and
+    retry_pending_payment_intents enqueues it again.
+    """
+    from .tasks import create_payment_intent
+
+    try:
+        create_payment_intent.delay(str(order_id))
+    except Exception:
+        logger.exception("Could not enqueue PaymentIntent creation for order %s", order_id)
+
+
+def create_payment_intent(order):
+    """
+    Create the order's Stripe PaymentIntent and store its client secret
+
+    Raises:
+        stripe errors; RETRYABLE_ERRORS are worth another attempt
+    """
+    intent = stripe.PaymentIntent.create(
+        amount=int(order.total_amount * 100),
+        currency=order.currency,
+        metadata={"order_id": str(order.id)},
+        description=f"Order #{order.id}",
+        idempotency_key=idempotency_key(order.id),
+    )
+    if Order.objects.filter(pk=order.pk, payment_intent_status="pending").update(
+        payment_intent_id=intent.id,
+        payment_client_secret=intent.client_secret,
+        payment_intent_status="ready",
+        updated_at=timezone.now(),
+    ):
+        push_order_update(order.user_id, order.id, payment_intent_status="ready")
+    return intent
+
+
+def fail_payment_intent(order, error):
+    logger.warning("PaymentIntent creation failed for order %s: %s", order.id, error)
+    if Order.objects.filter(pk=order.pk, payment_intent_status="pending").update(
+        payment_intent_status="failed",
+        payment_error=str(error)[:255],
+        updated_at=timezone.now(),
+    ):
+        push_order_update(order.user_id, order.id, payment_intent_status="failed")
+
+
+def stale_pending_orders(now=None):
+    """IDs of orders whose PaymentIntent should exist by now but does not"""
+    now = now or timezone.now()
+    return Order.objects.filter(
+        payment_intent_status="pending", updated_at__lte=now - STALE_AFTER
+    ).values_list("id", flat=True)
+
+
+def payment_token(order):
+    """Signed token that lets a guest poll the payment status of their order"""
+    return signing.dumps(str(order.id), salt=TOKEN_SALT)
+
+
+def can_view_payment(request, order):
+    if order.user_id is not None and order.user_id == request.user.id:
+        return True
+    token = request.query_params.get("token")
+    if not token:
+        return False
+    try:
+        return signing.loads(token, salt=TOKEN_SALT, max_age=TOKEN_MAX_AGE) == str(order.id)
+    except signing.BadSignature:
+        return False
+
+
+def payment_status(order):
+    """
+    Status payload for the payment polling endpoint
+
+    Returns:
+        Dict with `order`, `payment_method` and `status` (pending, ready,
+        failed or not_required), plus `client_secret` once ready and
+        a customer-facing `detail` if creation failed
+    """
+    data = {
+        "order": str(order.id),
+        "payment_method": order.payment_method,
+        "status": order.payment_intent_status or "not_required",
+    }
+    if order.payment_intent_status == "ready":
+        data["client_secret"] = order.payment_client_secret
+    elif order.payment_intent_status == "failed":
+        # The stored error is for staff; it may describe our infrastructure
+        data["detail"] = "Payment could not be started. Please try again or choose another payment method."
+    return data
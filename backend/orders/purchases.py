@@ -0,0 +1,125 @@
+from django.db import transaction
+from django.db.models import Min, Q
+
+from .models import Order, OrderItem, PurchasedProduct
+
+# Order statuses under which the order's items count as bought
+PURCHASE_STATUSES = ('paid', 'delivered')
+# Returns whose items no longer count as bought
+REFUNDED_RETURN_STATUSES = ('refunded', 'completed')
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def purchase_items():
+    """
+    Order items that make their buyer a verified purchaser of the product
+
+    An item counts once its order is paid or delivered, or its vendor has
+    delivered it (cash on delivery), unless the vendor cancelled it or it
+    was refunded through a return.
+    """
+    return (
+        OrderItem.objects.filter(order__user__isnull=False, product__isnull=False)
+        .filter(Q(order__status__in=PURCHASE_STATUSES) | Q(vendor_order__status='delivered'))
+        .exclude(vendor_order__status='cancelled')
+        .exclude(return_requests__status__in=REFUNDED_RETURN_STATUSES)
+    )
+
+
+def refresh_purchases(order_ids):
+    """
+    Bring the purchase index in line with some orders after they changed status
+
+    Every (user, product) pair the orders touch is recomputed, so a pair
+    bought again in another order survives a refund of this one.
+
+    Args:
+        order_ids: IDs of the orders that changed
+
+    Returns:
+        Tuple of (pairs added, pairs removed)
+    """
+    pairs = set(
+        OrderItem.objects.filter(order_id__in=list(order_ids), order__user__isnull=False, product__isnull=False)
+        .values_list('order__user_id', 'product_id')
+        .distinct()
+    )
+    if not pairs:
+        return 0, 0
+    user_ids = {user_id for user_id, _ in pairs}
+    product_ids = {product_id for _, product_id in pairs}
+
+    with transaction.atomic():
+        # Users x products is a superset of the pairs; the rest is filtered out here
+        bought = {
+            (user_id, product_id): purchased_at
+            for user_id, product_id, purchased_at in purchase_items()
+            .filter(order__user_id__in=user_ids, product_id__in=product_ids)
+            .values_list('order__user_id', 'product_id')
+            .annotate(purchased_at=Min('order__created_at'))
+            .order_by()
+            if (user_id, product_id) in pairs
+        }
+        indexed = {
+            (user_id, product_id): row_id
+            for row_id, user_id, product_id in PurchasedProduct.objects.filter(
+                user_id__in=user_ids, product_id__in=product_ids
+            ).values_list('id', 'user_id', 'product_id')
+            if (user_id, product_id) in pairs
+        }
+        added = [
+            PurchasedProduct(user_id=user_id, product_id=product_id, purchased_at=purchased_at)
+            for (user_id, product_id), purchased_at in bought.items()
+            if (user_id, product_id) not in indexed
+        ]
+        PurchasedProduct.objects.bulk_create(added, ignore_conflicts=True)
+        removed = [row_id for pair, row_id in indexed.items() if pair not in bought]
+        if removed:
+            PurchasedProduct.objects.filter(id__in=removed).delete()
+    return len(added), len(removed)
+
+
+def has_purchased(user, product_id):
+    """Whether a user has bought a product"""
+    if not user.is_authenticated:
+        return False
+    return PurchasedProduct.objects.filter(user=user, product_id=product_id).exists()
+
+
+def purchased_product_ids(user, product_ids):
+    """The subset of product_ids a user has bought, e.g. for "you bought this" badges"""
+    return set(
+        PurchasedProduct.objects.filter(user=user, product_id__in=list(product_ids))
+        .values_list('product_id', flat=True)
+    )
+
+
+def backfill_purchases(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Build the purchase index from the order history
+
+    Orders of registered users are walked in (created_at, id) order, a
+    batch at a time, so memory use and lock time stay flat however many
+    orders there are. Safe to re-run; existing rows are kept.
+
+    Args:
+        batch_size: Orders per batch
+
+    Yields:
+        Tuple of (orders scanned so far, pairs added in this batch)
+    """
+    orders = Order.objects.filter(user__isnull=False).order_by('created_at', 'id')
+    scanned = 0
+    last = None
+    while True:
+        batch = orders
+        if last is not None:
+            batch = batch.filter(Q(created_at__gt=last[0]) | Q(created_at=last[0], id__gt=last[1]))
+        batch = list(batch.values_list('created_at', 'id')[:batch_size])
+        if not batch:
+            return
+        last = batch[-1]
+        scanned += len(batch)
+        added, _ = refresh_purchases([order_id for _, order_id in batch])
+        yield scanned, added
@@ -0,0 +1,341 @@
+import logging
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Min, Q, Sum, When
+from django.utils import timezone
+
+from products.models import SKU
+from .models import Reservation
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_MINUTES = 15
+# Holds expiring within the same slot of this many seconds share one sweep
+EXPIRY_SLOT_SECONDS = 5
+# Reservations released per transaction by a sweep
+EXPIRY_BATCH_SIZE = 500
+SWEEP_KEY = 'orders:reservation-sweep'
+
+
+class InsufficientStock(Exception):
+    """Raised when a SKU cannot cover a requested reservation"""
+
+    def __init__(self, sku, available):
+        self.sku = sku
+        self.available = available
+        super().__init__(f"Only {available} units available")
+
+
+class CounterUnderflow(Exception):
+    """
+    Raised when a sale or release would take a SKU's stock or reserved
+    counter below zero, i.e. units were sold or given back twice
+    """
+
+    def __init__(self, sku_ids):
+        self.sku_ids = sku_ids
+        super().__init__(f"Stock counters would go below zero on one of SKUs {', '.join(map(str, sku_ids))}")
+
+
+def reserve_units(sku_id, quantity):
+    """
+    Atomically hold `quantity` more units of a SKU
+
+    A single conditional UPDATE (... WHERE stock_quantity >= reserved_quantity + n)
+    both checks and claims the stock, so concurrent carts can never oversell.
+
+    Returns:
+        True if the units were reserved, False if there was not enough stock
+    """
+    return SKU.objects.filter(
+        pk=sku_id, stock_quantity__gte=F('reserved_quantity') + quantity
+    ).update(reserved_quantity=F('reserved_quantity') + quantity) == 1
+
+
+def release_units(sku_id, quantity):
+    """
+    Give back `quantity` held units of a SKU
+
+    Raises:
+        CounterUnderflow: if the SKU holds fewer units than that
+    """
+    _subtract({'reserved_quantity': {sku_id: quantity}})
+
+
+def hold(cart, sku, quantity):
+    """
+    Make the cart's active reservation for a SKU exactly `quantity` units and
+    extend it for another RESERVATION_MINUTES
+
+    Only the difference to what the cart already holds is claimed or released.
+    Expired holds on the SKU are released first if the stock looks short.
+
+    Raises:
+        InsufficientStock: if the extra units are not available
+    """
+    with transaction.atomic():
+        lock_skus([sku.pk])
+        reservation = Reservation.objects.select_for_update().filter(
+            sku=sku, cart=cart, status="active"
+        ).first()
+        held = reservation.quantity if reservation else 0
+        delta = quantity - held
+
+        if delta > 0 and not reserve_units(sku.pk, delta):
+            release_expired(sku_ids=[sku.pk])
+            if not reserve_units(sku.pk, delta):
+                sku.refresh_from_db(fields=['stock_quantity', 'reserved_quantity'])
+                raise InsufficientStock(sku, sku.available_quantity + held)
+        elif delta < 0:
+            release_units(sku.pk, -delta)
+
+        expires_at = timezone.now() + timedelta(minutes=RESERVATION_MINUTES)
+        if reservation:
+            reservation.quantity = quantity
+            reservation.expires_at = expires_at
+            reservation.save(update_fields=['quantity', 'expires_at'])
+        else:
+            reservation = Reservation.objects.create(
+                sku=sku, user=cart.user, cart=cart, quantity=quantity, expires_at=expires_at
+            )
+        transaction.on_commit(lambda: schedule_expiry(expires_at))
+    return reservation
+
+
+def schedule_expiry(expires_at):
+    """
+    Enqueue a sweep for the end of the slot `expires_at` falls in
+
+    One sweep is queued per EXPIRY_SLOT_SECONDS slot however many holds
+    expire in it, so stock comes back within seconds of expiring. Holds
+    that were extended since are simply not expired yet when it runs.
+    """
+    from .tasks import cleanup_expired_reservations
+
+    slot = math.ceil(expires_at.timestamp() / EXPIRY_SLOT_SECONDS) * EXPIRY_SLOT_SECONDS
+    key = f'{SWEEP_KEY}:{slot}'
+    if not cache.add(key, 1, timeout=RESERVATION_MINUTES * 60 + 300):
+        return
+    try:
+        cleanup_expired_reservations.apply_async(eta=datetime.fromtimestamp(slot, tz=dt_timezone.utc))
+    except Exception:
+        # The periodic sweep still releases these holds, only later
+        cache.delete(key)
+        logger.exception("Could not schedule a reservation sweep")
+
+
+def release(cart, sku=None):
+    """Release the cart's active reservations (for one SKU, or all of them)"""
+    _finish(cart, sku, "released")
+
+
+def convert(cart, sku=None):
+    """
+    Mark the cart's active reservations as sold
+
+    The held units stop counting as reserved; the caller deducts them from
+    stock_quantity in the same transaction.
+    """
+    _finish(cart, sku, "converted")
+
+
+def sell(quantities, held=None, reservation_ids=()):
+    """
+    Deduct sold units from stock and convert the holds they were bought from
+
+    Args:
+        quantities: Dict mapping SKU id to units sold
+        held: Dict mapping SKU id to units the cart held; they stop counting
+            as reserved
+        reservation_ids: The cart's active reservations behind `held`, which
+            become converted
+
+    Both counters of every SKU are written by one CASE UPDATE, so the cost
+    does not grow with the number of lines. Callers lock the SKU rows and
+    then the reservations first.
+
+    Raises:
+        CounterUnderflow: if a SKU has fewer units in stock or held than that
+    """
+    if reservation_ids:
+        Reservation.objects.filter(id__in=list(reservation_ids)).update(status="converted")
+    _subtract({'stock_quantity': quantities, 'reserved_quantity': held or {}})
+
+
+def lock_skus(sku_ids, skip_locked=False):
+    """
+    Lock SKU rows in primary key order
+
+    Every path that changes stock counters locks the SKU rows first and only
+    then their reservations, so carts, checkouts and expiry sweeps queue up
+    behind each other instead of deadlocking.
+
+    Returns:
+        Set of the locked SKU ids; with skip_locked, rows locked elsewhere are left out
+    """
+    return set(
+        SKU.objects.select_for_update(skip_locked=skip_locked)
+        .filter(pk__in=list(sku_ids)).order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def release_expired(sku_ids=None, now=None, batch_size=EXPIRY_BATCH_SIZE, max_batches=None):
+    """
+    Release active reservations past their expiry and return their units
+
+    Reservations are released oldest first, `batch_size` per transaction, so
+    a large backlog never holds many locks at once. Holds on SKUs that a
+    cart or checkout has locked right now are left for the next sweep.
+
+    Returns:
+        Number of reservations released
+    """
+    now = now or timezone.now()
+    released = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        try:
+            with transaction.atomic():
+                expired = Reservation.objects.filter(status="active", expires_at__lte=now)
+                if sku_ids is not None:
+                    expired = expired.filter(sku_id__in=list(sku_ids))
+                candidates = list(expired.order_by('expires_at').values_list('id', 'sku_id')[:batch_size])
+                locked = lock_skus({sku_id for _, sku_id in candidates}, skip_locked=True)
+                # Re-read under the locks; a checkout may have converted some meanwhile
+                rows = list(
+                    Reservation.objects.select_for_update().filter(
+                        id__in=[pk for pk, sku_id in candidates if sku_id in locked],
+                        status="active", expires_at__lte=now,
+                    ).values_list('id', 'sku_id', 'quantity')
+                )
+                if rows:
+                    Reservation.objects.filter(id__in=[row[0] for row in rows]).update(status="released")
+                    _release_totals(rows)
+        except CounterUnderflow:
+            # Left active; reconcile_reserved_quantities repairs the counters
+            logger.exception("Expired reservations hold more units than their SKUs have reserved")
+            break
+        released += len(rows)
+        batches += 1
+        if len(rows) < batch_size:
+            break
+    return released
+
+
+def expiry_backlog(now=None):
+    """
+    Size of the expiry backlog, for monitoring
+
+    Returns:
+        Dict with `overdue` (active reservations already expired),
+        `oldest_overdue_seconds` (how late the oldest of them is, 0 if none)
+        and `due_next_minute` (reservations expiring within a minute)
+    """
+    now = now or timezone.now()
+    stats = Reservation.objects.filter(status="active").aggregate(
+        overdue=Count('id', filter=Q(expires_at__lte=now)),
+        oldest=Min('expires_at', filter=Q(expires_at__lte=now)),
+        due_next_minute=Count('id', filter=Q(expires_at__gt=now, expires_at__lte=now + timedelta(minutes=1))),
+    )
+    oldest = stats.pop('oldest')
+    stats['oldest_overdue_seconds'] = int((now - oldest).total_seconds()) if oldest else 0
+    return stats
+
+
+def reconcile_reserved_quantities(sku_ids=None):
+    """
+    Repair reserved_quantity counters that drifted from the active reservations
+
+    Each drifted SKU is re-checked under its row lock, which every counter
+    update also takes, so in-flight carts cannot cause false corrections.
+
+    Returns:
+        Dict mapping each corrected SKU id to (stored, actual)
+    """
+    actual = dict(
+        Reservation.objects.filter(status="active").values_list('sku_id')
+        .annotate(total=Sum('quantity')).order_by()
+    )
+    skus = SKU.objects.filter(reserved_quantity__gt=0) | SKU.objects.filter(id__in=list(actual))
+    if sku_ids is not None:
+        skus = skus.filter(id__in=list(sku_ids))
+
+    corrected = {}
+    for sku_id, stored in skus.values_list('id', 'reserved_quantity'):
+        if stored == actual.get(sku_id, 0):
+            continue
+        with transaction.atomic():
+            stored = SKU.objects.select_for_update().values_list('reserved_quantity', flat=True).get(pk=sku_id)
+            total = Reservation.objects.filter(sku_id=sku_id, status="active").aggregate(
+                total=Sum('quantity')
+            )['total'] or 0
+            if stored != total:
+                SKU.objects.filter(pk=sku_id).update(reserved_quantity=total)
+                corrected[sku_id] = (stored, total)
+    return corrected
+
+
+def _finish(cart, sku, status):
+    with transaction.atomic():
+        reservations = Reservation.objects.filter(cart=cart, status="active")
+        if sku is not None:
+            reservations = reservations.filter(sku=sku)
+            sku_ids = lock_skus([sku.pk])
+        else:
+            sku_ids = lock_skus(reservations.values_list('sku_id', flat=True))
+        rows = list(
+            reservations.filter(sku_id__in=sku_ids).select_for_update().values_list('id', 'sku_id', 'quantity')
+        )
+        if not rows:
+            return
+        Reservation.objects.filter(id__in=[row[0] for row in rows]).update(status=status)
+        _release_totals(rows)
+
+
+def _release_totals(rows):
+    # Callers hold the SKU locks
+    totals = defaultdict(int)
+    for _, sku_id, quantity in rows:
+        totals[sku_id] += quantity
+    _subtract({'reserved_quantity': totals})
+
+
+def _subtract(amounts):
+    """
+    Take units off SKU counters with one CASE UPDATE
+
+    The UPDATE only matches SKUs that can cover every amount, so a counter
+    never goes below zero; if one cannot, nothing is written and the
+    transaction must roll back.
+
+    Args:
+        amounts: Dict mapping a counter field to a dict of SKU id -> units
+
+    Raises:
+        CounterUnderflow: if a SKU cannot cover its amounts
+    """
+    per_sku = defaultdict(dict)
+    for field, sku_amounts in amounts.items():
+        for sku_id, amount in sku_amounts.items():
+            if amount:
+                per_sku[sku_id][field] = amount
+    if not per_sku:
+        return
+
+    covered = Q()
+    for sku_id, fields in per_sku.items():
+        covered |= Q(pk=sku_id, **{f'{field}__gte': amount for field, amount in fields.items()})
+    changes = {
+        field: Case(
+            *[When(pk=sku_id, then=F(field) - amount) for sku_id, amount in sku_amounts.items() if amount],
+            default=F(field),
+            output_field=IntegerField(),
+        )
+        for field, sku_amounts in amounts.items() if any(sku_amounts.values())
+    }
+    if SKU.objects.filter(covered).update(**changes) != len(per_sku):
+        raise CounterUnderflow(sorted(per_sku, key=str))
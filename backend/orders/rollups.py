@@ -0,0 +1,171 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import OrderItem, VendorOrder, VendorRevenueDay
+
+# Vendor order statuses that count as revenue
+PAID_STATUSES = ('paid', 'processing', 'shipped', 'delivered')
+
+
+def rollup_date(created_at):
+    """Day an order created at `created_at` is counted under"""
+    return timezone.localdate(created_at)
+
+
+class RevenueDeltas:
+    """
+    Changes to VendorRevenueDay rows, collected and then written together
+
+    Keys are (vendor_id, date, status); values are [revenue, orders, items_sold].
+    """
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [Decimal('0'), 0, 0])
+
+    def add(self, vendor_id, created_at, status, revenue, items, sign=1):
+        entry = self.deltas[(vendor_id, rollup_date(created_at), status)]
+        entry[0] += sign * (revenue or Decimal('0'))
+        entry[1] += sign
+        entry[2] += sign * (items or 0)
+
+    def add_items(self, vendor_id, created_at, status, items):
+        self.deltas[(vendor_id, rollup_date(created_at), status)][2] += items
+
+    def apply(self):
+        deltas = {key: values for key, values in self.deltas.items() if any(values)}
+        if not deltas:
+            return
+        VendorRevenueDay.objects.bulk_create(
+            [VendorRevenueDay(vendor_id=vendor_id, date=date, status=status) for vendor_id, date, status in deltas],
+            ignore_conflicts=True,
+        )
+        # One UPDATE for every row, so a multi-vendor checkout costs the same
+        # as a single-vendor one
+        condition = Q()
+        changes = {'revenue': [], 'orders': [], 'items_sold': []}
+        for (vendor_id, date, status), values in deltas.items():
+            key = Q(vendor_id=vendor_id, date=date, status=status)
+            condition |= key
+            for field, value in zip(changes, values):
+                changes[field].append(When(key, then=F(field) + value))
+        VendorRevenueDay.objects.filter(condition).update(**{
+            field: Case(*whens, default=F(field), output_field=VendorRevenueDay._meta.get_field(field))
+            for field, whens in changes.items()
+        })
+        self.deltas.clear()
+
+
+def change_status(vendor_orders, status, **fields):
+    """
+    Move vendor orders to a status with one UPDATE, keeping the rollups in step
+
+    Args:
+        vendor_orders: VendorOrder queryset
+        status: New status
+        **fields: Other VendorOrder fields to set in the same UPDATE
+
+    Returns:
+        Number of vendor orders whose status changed
+    """
+    with transaction.atomic():
+        rows = list(
+            vendor_orders.select_for_update(of=('self',)).exclude(status=status)
+            .values_list('id', 'vendor_id', 'status', 'total_amount', 'order__created_at')
+        )
+        if not rows:
+            return 0
+        ids = [row[0] for row in rows]
+        items = items_sold_by_vendor_order(ids)
+        VendorOrder.objects.filter(id__in=ids).update(status=status, **fields)
+
+        deltas = RevenueDeltas()
+        for vendor_order_id, vendor_id, old_status, amount, created_at in rows:
+            deltas.add(vendor_id, created_at, old_status, amount, items.get(vendor_order_id), sign=-1)
+            deltas.add(vendor_id, created_at, status, amount, items.get(vendor_order_id))
+        deltas.apply()
+    return len(rows)
+
+
+def expected_revenue_days(vendor_ids=None):
+    """
+    VendorRevenueDay values recomputed from the orders themselves
+
+    Returns:
+        Dict mapping (vendor_id, date, status) to (revenue, orders, items_sold)
+    """
+    vendor_orders = VendorOrder.objects.all()
+    items = OrderItem.objects.all()
+    if vendor_ids is not None:
+        vendor_orders = vendor_orders.filter(vendor_id__in=list(vendor_ids))
+        items = items.filter(vendor_order__vendor_id__in=list(vendor_ids))
+
+    # Revenue and item counts are grouped separately; joining items into the
+    # revenue query would count each vendor order once per line
+    totals = (
+        vendor_orders.annotate(date=TruncDate('order__created_at'))
+        .values_list('vendor_id', 'date', 'status')
+        .annotate(revenue=Sum('total_amount'), orders=Count('id'))
+        .order_by()
+    )
+    sold = dict(
+        ((vendor_id, date, status), quantity)
+        for vendor_id, date, status, quantity in items.annotate(date=TruncDate('vendor_order__order__created_at'))
+        .values_list('vendor_order__vendor_id', 'date', 'vendor_order__status')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    return {
+        (vendor_id, date, status): (revenue or Decimal('0'), orders, sold.get((vendor_id, date, status)) or 0)
+        for vendor_id, date, status, revenue, orders in totals
+    }
+
+
+def reconcile_revenue_days(vendor_ids=None):
+    """
+    Rewrite the rollup rows that differ from the orders
+
+    Meant for quiet hours: an order changing status while this runs may
+    leave a difference behind, which the next run corrects.
+
+    Returns:
+        Dict mapping each corrected (vendor_id, date, status) to (stored, expected)
+    """
+    expected = expected_revenue_days(vendor_ids)
+    rows = VendorRevenueDay.objects.all()
+    if vendor_ids is not None:
+        rows = rows.filter(vendor_id__in=list(vendor_ids))
+    stored = {
+        (vendor_id, date, status): (revenue, orders, items)
+        for vendor_id, date, status, revenue, orders, items
+        in rows.values_list('vendor_id', 'date', 'status', 'revenue', 'orders', 'items_sold')
+    }
+
+    corrected = {}
+    zero = (Decimal('0'), 0, 0)
+    with transaction.atomic():
+        for key in set(expected) | set(stored):
+            actual = expected.get(key, zero)
+            current = stored.get(key)
+            if current == actual or (current is None and actual == zero):
+                continue
+            vendor_id, date, status = key
+            revenue, orders, items = actual
+            VendorRevenueDay.objects.update_or_create(
+                vendor_id=vendor_id, date=date, status=status,
+                defaults={'revenue': revenue, 'orders': orders, 'items_sold': items},
+            )
+            corrected[key] = (current or zero, actual)
+    return corrected
+
+
+def items_sold_by_vendor_order(vendor_order_ids):
+    """Units sold per vendor order id"""
+    return dict(
+        OrderItem.objects.filter(vendor_order_id__in=vendor_order_ids)
+        .values_list('vendor_order_id').annotate(total=Sum('quantity')).order_by()
+    )
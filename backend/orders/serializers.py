@@ -71,9 +71,9 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = ["id", "user", "status", "payment_method", "total_amount", "subtotal_amount", 
-                 "discount_amount", "coupon", "currency", "payment_intent_id", "tracking_number", 
+                 "discount_amount", "coupon", "currency", "payment_intent_id", "payment_intent_status", "tracking_number", 
                  "shipping_address", "estimated_delivery", "created_at", "updated_at", 
                  "vendor_orders", "coupon_code", "bulk_discount_applied", "guest_email", 
                  "guest_name", "guest_phone", "is_guest"]
         read_only_fields = ["user", "status", "total_amount", "subtotal_amount", "discount_amount", 
-                           "coupon", "payment_intent_id", "bulk_discount_applied"]
\ No newline at end of file
+                           "coupon", "payment_intent_id", "payment_intent_status", "bulk_discount_applied"]
\ No newline at end of file
@@ -7,12 +7,13 @@ from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
 from .models import ShippingAddress, ShippingRate, OrderCancellation, ReturnRequest, Order, VendorOrder, OrderItem
+from .purchases import refresh_purchases
 from .shipping_serializers import (
     ShippingAddressSerializer, ShippingRateSerializer, 
     OrderCancellationSerializer, ReturnRequestSerializer
 )
 from profiles.permissions import IsVendor, IsCustomer
-from notifications.utils import create_notification
+from notifications.utils import create_notification, create_notifications
 
 
 class ShippingAddressViewSet(viewsets.ModelViewSet):
@@ -133,6 +134,7 @@ class OrderCancellationViewSet(viewsets.ModelViewSet):
         # Update order status
         order.status = 'cancelled'
         order.save()
+        refresh_purchases([order.id])
         
         # Send notification
         create_notification(
@@ -190,24 +192,26 @@ class ReturnRequestViewSet(viewsets.ModelViewSet):
         
         return_request = serializer.save()
         
+        notifications = [
+            # Send notification to customer
+            {
+                'user': self.request.user,
+                'notification_type': 'order_status',
+                'title': 'Return Request Submitted',
+                'message': f'Your return request {return_request.rma_number} has been submitted',
+                'reference_id': str(return_request.id),
+            },
+        ]
         # Send notification to vendor
         if hasattr(vendor_order.vendor.user, 'email'):
-            create_notification(
-                user=vendor_order.vendor.user,
-                notification_type='order_status',
-                title='New Return Request',
-                message=f'Return request {return_request.rma_number} received',
-                reference_id=str(return_request.id)
-            )
-        
-        # Send notification to customer
-        create_notification(
-            user=self.request.user,
-            notification_type='order_status',
-            title='Return Request Submitted',
-            message=f'Your return request {return_request.rma_number} has been submitted',
-            reference_id=str(return_request.id)
-        )
+            notifications.append({
+                'user': vendor_order.vendor.user,
+                'notification_type': 'order_status',
+                'title': 'New Return Request',
+                'message': f'Return request {return_request.rma_number} received',
+                'reference_id': str(return_request.id),
+            })
+        create_notifications(notifications)
     
     @action(detail=False, methods=['get'], permission_classes=[IsVendor])
     def vendor_returns(self, request):
@@ -357,6 +361,8 @@ class ReturnRequestViewSet(viewsets.ModelViewSet):
         return_request.refunded_at = timezone.now()
         return_request.refund_transaction_id = f"REFUND-{return_request.rma_number}"
         return_request.save()
+        # Refunded items no longer count as verified purchases
+        refresh_purchases([return_request.order_id])
         
         # TODO: Integrate with actual payment processor to issue refund
         
@@ -0,0 +1,72 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import OrderItem, VendorOrder
+from .rollups import RevenueDeltas, items_sold_by_vendor_order
+
+# Bulk writes (checkout, change_status) record their own rollup deltas; these
+# handlers cover single-row saves and deletes, e.g. from the dashboard or admin
+
+
+@receiver(pre_save, sender=VendorOrder)
+def remember_vendor_order_totals(sender, instance, **kwargs):
+    instance._previous_totals = None
+    if not instance._state.adding:
+        instance._previous_totals = VendorOrder.objects.filter(pk=instance.pk).values_list(
+            'status', 'total_amount'
+        ).first()
+
+
+@receiver(post_save, sender=VendorOrder)
+def update_revenue_rollup(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_totals', None)
+    deltas = RevenueDeltas()
+    created_at = instance.order.created_at
+    if created or previous is None:
+        deltas.add(instance.vendor_id, created_at, instance.status, instance.total_amount, 0)
+    elif previous != (instance.status, instance.total_amount):
+        items = items_sold_by_vendor_order([instance.pk]).get(instance.pk, 0)
+        deltas.add(instance.vendor_id, created_at, previous[0], previous[1], items, sign=-1)
+        deltas.add(instance.vendor_id, created_at, instance.status, instance.total_amount, items)
+    deltas.apply()
+
+
+@receiver(post_delete, sender=VendorOrder)
+def remove_from_revenue_rollup(sender, instance, **kwargs):
+    # Its items were deleted first and have taken their units with them
+    created_at = instance.order.created_at
+    deltas = RevenueDeltas()
+    deltas.add(instance.vendor_id, created_at, instance.status, instance.total_amount, 0, sign=-1)
+    deltas.apply()
+
+
+@receiver(pre_save, sender=OrderItem)
+def remember_item_quantity(sender, instance, **kwargs):
+    instance._previous_quantity = 0
+    if not instance._state.adding:
+        instance._previous_quantity = OrderItem.objects.filter(pk=instance.pk).values_list(
+            'quantity', flat=True
+        ).first() or 0
+
+
+@receiver(post_save, sender=OrderItem)
+def count_item_in_rollup(sender, instance, **kwargs):
+    _add_items(instance.vendor_order_id, instance.quantity - getattr(instance, '_previous_quantity', 0))
+
+
+@receiver(post_delete, sender=OrderItem)
+def uncount_item_in_rollup(sender, instance, **kwargs):
+    _add_items(instance.vendor_order_id, -instance.quantity)
+
+
+def _add_items(vendor_order_id, items):
+    if not items:
+        return
+    vendor_order = VendorOrder.objects.filter(pk=vendor_order_id).values_list(
+        'vendor_id', 'order__created_at', 'status'
+    ).first()
+    if vendor_order is None:
+        return
+    deltas = RevenueDeltas()
+    deltas.add_items(*vendor_order, items)
+    deltas.apply()
@@ -1,25 +1,96 @@
+import logging
+
 from celery import shared_task
-from django.utils import timezone
-from .models import Reservation
+from . import payments, webhooks
+from .rollups import reconcile_revenue_days
+from .models import Order
+from .reservations import expiry_backlog, release_expired, reconcile_reserved_quantities
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def cleanup_expired_reservations():
     """
-    Celery task to clean up expired reservations.
-    This should be run periodically (e.g., every 5 minutes) to release
-    stock from expired cart reservations.
-    """
-    now = timezone.now()
-    expired_reservations = Reservation.objects.filter(
-        status='active',
-        expires_at__lt=now
-    )
-    
-    count = expired_reservations.count()
-    expired_reservations.update(status='released')
-    
-    return f"Released {count} expired reservations"
+    Celery task to release expired cart reservations in batches.
+    Holds schedule it for the moment they expire; the periodic run is a
+    safety net for sweeps that could not be scheduled.
+    """
+    count = release_expired()
+    backlog = expiry_backlog()
+    if backlog['overdue']:
+        logger.warning(
+            "%d reservations still overdue, oldest by %ds",
+            backlog['overdue'], backlog['oldest_overdue_seconds'],
+        )
+    return f"Released {count} expired reservations, {backlog['overdue']} still overdue"
+
+
+@shared_task
+def reconcile_reserved_stock():
+    """
+    Celery task to repair SKU reserved_quantity counters that drifted from
+    the active reservations (e.g. after manual edits in the admin).
+    """
+    corrected = reconcile_reserved_quantities()
+    return f"Corrected reserved stock on {len(corrected)} SKUs"
+
+
+@shared_task(bind=True, max_retries=5)
+def create_payment_intent(self, order_id):
+    """
+    Celery task to create an order's Stripe PaymentIntent after checkout.
+    Connection and Stripe-side errors are retried with exponential backoff;
+    the idempotency key keeps retries from creating a second intent.
+    """
+    order = Order.objects.filter(pk=order_id, payment_intent_status="pending").first()
+    if order is None:
+        return f"Order {order_id} is not waiting for a PaymentIntent"
+    try:
+        intent = payments.create_payment_intent(order)
+    except payments.RETRYABLE_ERRORS as exc:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=2 ** self.request.retries)
+        payments.fail_payment_intent(order, exc)
+        return f"Gave up on PaymentIntent for order {order_id}"
+    except Exception as exc:
+        payments.fail_payment_intent(order, exc)
+        return f"PaymentIntent for order {order_id} failed"
+    return f"Created PaymentIntent {intent.id} for order {order_id}"
+
+
+@shared_task
+def retry_pending_payment_intents():
+    """
+    Celery task to re-enqueue orders whose PaymentIntent was never created,
+    e.g. because the broker was down at checkout.
+    """
+    order_ids = list(payments.stale_pending_orders())
+    for order_id in order_ids:
+        payments.enqueue_payment_intent(order_id)
+    return f"Re-enqueued {len(order_ids)} pending PaymentIntents"
+
+
+@shared_task
+def process_stripe_events():
+    """
+    Celery task to apply stored Stripe webhook events in batches.
+    Enqueued by the webhook view and also run periodically to pick up
+    anything a lost task left behind.
+    """
+    processed, failed = webhooks.process_pending_events()
+    return f"Processed {processed} Stripe events, {failed} failed"
+
+
+@shared_task
+def reconcile_vendor_revenue():
+    """
+    Celery task to repair vendor revenue rollup rows that drifted from the
+    orders (e.g. after bulk edits that bypassed the incremental updates).
+    This should run nightly, outside peak hours.
+    """
+    corrected = reconcile_revenue_days()
+    return f"Corrected {len(corrected)} vendor revenue rollup rows"
 
 
 @shared_task
@@ -0,0 +1,365 @@
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+import stripe
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from notifications.models import Notification
+from products.models import Product, SKU
+from . import payments, reservations, tasks, webhooks
+from .checkout import CheckoutError, place_order
+from .models import (
+    Cart, CartItem, Order, OrderItem, PurchasedProduct, Reservation, ReturnRequest, StripeEvent, VendorOrder,
+    VendorRevenueDay,
+)
+from .purchases import backfill_purchases, has_purchased, purchased_product_ids, refresh_purchases
+from .rollups import change_status, expected_revenue_days, reconcile_revenue_days
+
+
+class StockTestCase(TestCase):
+    """One vendor product with a five-unit SKU and two shoppers with carts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        cls.product = Product.objects.create(
+            vendor=cls.vendor, name='Boot', slug='boot', description='Test product', price=Decimal('10.00'),
+        )
+        cls.sku = SKU.objects.create(product=cls.product, sku_code='BOOT', stock_quantity=5)
+        cls.alice = User.objects.create(username='alice', is_customer=True)
+        cls.bob = User.objects.create(username='bob', is_customer=True)
+        cls.alice_cart = Cart.objects.create(user=cls.alice)
+        cls.bob_cart = Cart.objects.create(user=cls.bob)
+
+    def counters(self):
+        self.sku.refresh_from_db()
+        return self.sku.stock_quantity, self.sku.reserved_quantity
+
+
+class ReservationTests(StockTestCase):
+    """Holds claim stock exactly once and never give it back twice"""
+
+    def test_oversell_is_refused(self):
+        reservations.hold(self.alice_cart, self.sku, 4)
+        with self.assertRaises(reservations.InsufficientStock) as raised:
+            reservations.hold(self.bob_cart, self.sku, 2)
+        self.assertEqual(raised.exception.available, 1)
+        self.assertEqual(self.counters(), (5, 4))
+
+    def test_hold_claims_only_the_difference(self):
+        reservations.hold(self.alice_cart, self.sku, 2)
+        reservations.hold(self.alice_cart, self.sku, 5)
+        self.assertEqual(self.counters(), (5, 5))
+        reservations.hold(self.alice_cart, self.sku, 1)
+        self.assertEqual(self.counters(), (5, 1))
+        self.assertEqual(Reservation.objects.get(cart=self.alice_cart, status='active').quantity, 1)
+
+    def test_release_gives_units_back_once(self):
+        reservations.hold(self.alice_cart, self.sku, 3)
+        reservations.release(self.alice_cart)
+        reservations.release(self.alice_cart)
+        self.assertEqual(self.counters(), (5, 0))
+        self.assertEqual(Reservation.objects.get(cart=self.alice_cart).status, 'released')
+
+    def test_double_release_raises_instead_of_clamping(self):
+        reservations.hold(self.alice_cart, self.sku, 2)
+        with self.assertRaises(reservations.CounterUnderflow):
+            reservations.release_units(self.sku.pk, 3)
+        self.assertEqual(self.counters(), (5, 2))
+
+    def test_expired_hold_does_not_count_at_checkout(self):
+        reservations.hold(self.alice_cart, self.sku, 5)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertRaises(CheckoutError):
+            place_order([(self.sku.pk, 5, None)], user=self.alice, cart=self.alice_cart)
+        self.assertEqual(self.counters(), (5, 5))
+        self.assertEqual(Reservation.objects.get().status, 'active')
+
+
+class CheckoutTests(StockTestCase):
+    """Checkout sells held stock atomically with a constant number of queries"""
+
+    def add_skus(self, count):
+        return [
+            SKU.objects.create(product=self.product, sku_code=f'BOOT-{index}', stock_quantity=5)
+            for index in range(count)
+        ]
+
+    def test_sells_held_units(self):
+        reservations.hold(self.alice_cart, self.sku, 2)
+        CartItem.objects.create(cart=self.alice_cart, sku=self.sku, quantity=2, unit_price=Decimal('10.00'))
+
+        order = place_order([(self.sku.pk, 2, None)], user=self.alice, cart=self.alice_cart, payment_method='cod')
+
+        self.assertEqual(order.total_amount, Decimal('20.00'))
+        self.assertEqual(self.counters(), (3, 0))
+        self.assertEqual(Reservation.objects.get().status, 'converted')
+        self.assertFalse(self.alice_cart.items.exists())
+        self.assertEqual(OrderItem.objects.get(order=order).quantity, 2)
+
+    def test_short_stock_writes_nothing(self):
+        other, = self.add_skus(1)
+        with self.assertRaises(CheckoutError):
+            place_order([(other.pk, 1, None), (self.sku.pk, 6, None)], user=self.alice, payment_method='cod')
+        self.assertFalse(Order.objects.exists())
+        other.refresh_from_db()
+        self.assertEqual((other.stock_quantity, self.counters()), (5, (5, 0)))
+
+    def test_units_held_by_another_cart_are_refused(self):
+        reservations.hold(self.bob_cart, self.sku, 4)
+        with self.assertRaises(CheckoutError):
+            place_order([(self.sku.pk, 2, None)], user=self.alice, cart=self.alice_cart, payment_method='cod')
+
+    def test_query_count_is_constant(self):
+        def queries(lines):
+            with CaptureQueriesContext(connection) as captured:
+                place_order(lines, user=self.alice, payment_method='cod')
+            return len(captured)
+
+        self.assertEqual(
+            queries([(self.sku.pk, 1, None)]),
+            queries([(sku.pk, 1, None) for sku in self.add_skus(10)]),
+        )
+
+
+class PaymentIntentTests(StockTestCase):
+    """Stripe is called by the worker after checkout commits, never on the request path"""
+
+    def place_stripe_order(self):
+        with mock.patch('orders.payments.stripe_enabled', return_value=True):
+            return place_order([(self.sku.pk, 1, None)], user=self.alice, payment_method='stripe')
+
+    def test_checkout_enqueues_after_commit(self):
+        with mock.patch('stripe.PaymentIntent.create') as create, \
+                mock.patch('orders.tasks.create_payment_intent.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                order = self.place_stripe_order()
+                delay.assert_not_called()
+        delay.assert_called_once_with(str(order.id))
+        create.assert_not_called()
+        self.assertEqual(order.payment_intent_status, 'pending')
+
+    def test_worker_stores_client_secret(self):
+        order = self.place_stripe_order()
+        intent = SimpleNamespace(id='pi_1', client_secret='pi_1_secret')
+        with mock.patch('stripe.PaymentIntent.create', return_value=intent) as create:
+            tasks.create_payment_intent(str(order.id))
+            tasks.create_payment_intent(str(order.id))
+        create.assert_called_once()
+        self.assertEqual(create.call_args.kwargs['idempotency_key'], payments.idempotency_key(order.id))
+        order.refresh_from_db()
+        self.assertEqual(payments.payment_status(order)['client_secret'], 'pi_1_secret')
+
+    def test_retryable_error_keeps_order_pending(self):
+        order = self.place_stripe_order()
+        with mock.patch('stripe.PaymentIntent.create', side_effect=stripe.APIConnectionError('down')):
+            with self.assertRaises(stripe.APIConnectionError):
+                tasks.create_payment_intent(str(order.id))
+        order.refresh_from_db()
+        self.assertEqual(order.payment_intent_status, 'pending')
+
+    def test_permanent_error_fails_without_leaking_it(self):
+        order = self.place_stripe_order()
+        with mock.patch('stripe.PaymentIntent.create', side_effect=stripe.InvalidRequestError('bad key', None)), \
+                self.assertLogs('orders.payments', 'WARNING'):
+            tasks.create_payment_intent(str(order.id))
+        order.refresh_from_db()
+        status = payments.payment_status(order)
+        self.assertEqual(status['status'], 'failed')
+        self.assertNotIn('bad key', status['detail'])
+
+
+class StripeWebhookTests(StockTestCase):
+    """Webhook events are stored once and take effect once, however often Stripe delivers them"""
+
+    def setUp(self):
+        cache.clear()
+        self.order = place_order([(self.sku.pk, 1, None)], user=self.alice, payment_method='cod')
+        Order.objects.filter(pk=self.order.pk).update(payment_intent_id='pi_1')
+        self.event = {'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_1'}}}
+
+    def deliver(self, event):
+        return APIClient().post('/api/orders/payments/stripe/webhook/', event, format='json')
+
+    def test_double_delivery_is_a_no_op(self):
+        self.assertEqual(self.deliver(self.event).data, {'received': True, 'event': 'evt_1'})
+        self.assertEqual(self.deliver(self.event).status_code, 200)
+        self.assertEqual(StripeEvent.objects.count(), 1)
+
+        self.assertEqual(webhooks.process_pending_events(), (1, 0))
+        self.deliver(self.event)
+        self.assertEqual(webhooks.process_pending_events(), (0, 0))
+
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, 'paid')
+        self.assertEqual(Notification.objects.filter(user=self.alice, notification_type='payment_status').count(), 1)
+
+    def test_unknown_events_are_acknowledged(self):
+        self.deliver({'id': 'evt_2', 'type': 'customer.created', 'data': {'object': {}}})
+        self.assertEqual(webhooks.process_pending_events(), (1, 0))
+        self.assertIsNotNone(StripeEvent.objects.get().processed_at)
+
+    def test_failing_event_does_not_hold_back_the_batch(self):
+        self.deliver(self.event)
+        self.deliver({'id': 'evt_3', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_2'}}})
+        failing = mock.Mock(side_effect=[RuntimeError('boom'), RuntimeError('boom'), None])
+        with mock.patch.dict(webhooks.HANDLERS, {'payment_intent.succeeded': failing}), \
+                self.assertLogs('orders.webhooks', 'ERROR'):
+            self.assertEqual(webhooks.process_pending_events(), (1, 1))
+        self.assertEqual(
+            dict(StripeEvent.objects.values_list('event_id', 'attempts')), {'evt_1': 1, 'evt_3': 1},
+        )
+        self.assertEqual(StripeEvent.objects.filter(processed_at__isnull=True).count(), 1)
+
+
+class RevenueRollupTests(StockTestCase):
+    """Incrementally kept revenue rollups always equal a recount from the orders"""
+
+    def stored(self):
+        return {
+            (vendor_id, date, status): (revenue, orders, items)
+            for vendor_id, date, status, revenue, orders, items in VendorRevenueDay.objects.values_list(
+                'vendor_id', 'date', 'status', 'revenue', 'orders', 'items_sold'
+            )
+            if (revenue, orders, items) != (0, 0, 0)
+        }
+
+    def test_rollups_equal_recount(self):
+        first = place_order([(self.sku.pk, 1, None)], user=self.alice, payment_method='cod')
+        second = place_order([(self.sku.pk, 2, None)], user=self.bob, payment_method='cod')
+        third = place_order([(self.sku.pk, 1, None)], user=self.bob, payment_method='cod')
+
+        change_status(VendorOrder.objects.filter(order=first), 'paid')
+        vendor_order = VendorOrder.objects.get(order=second)
+        vendor_order.status = 'shipped'
+        vendor_order.save()
+        item = OrderItem.objects.get(order=second)
+        item.quantity = 3
+        item.save()
+        third.delete()
+
+        self.assertEqual(self.stored(), expected_revenue_days())
+        self.assertEqual(reconcile_revenue_days(), {})
+
+    def test_reconcile_repairs_drift(self):
+        place_order([(self.sku.pk, 2, None)], user=self.alice, payment_method='cod')
+        VendorRevenueDay.objects.update(orders=5)
+
+        corrected = reconcile_revenue_days()
+
+        self.assertEqual(len(corrected), 1)
+        self.assertEqual(self.stored(), expected_revenue_days())
+
+
+class ReservationExpiryTests(StockTestCase):
+    """Expired holds are released in batches by sweeps scheduled once per slot"""
+
+    def setUp(self):
+        cache.clear()
+
+    def hold_skus(self, count, expired=True):
+        skus = [
+            SKU.objects.create(product=self.product, sku_code=f'EXP-{expired}-{index}', stock_quantity=5)
+            for index in range(count)
+        ]
+        for sku in skus:
+            reservations.hold(self.alice_cart, sku, 2)
+        if expired:
+            Reservation.objects.filter(sku__in=skus).update(expires_at=timezone.now() - timedelta(minutes=1))
+        return skus
+
+    def test_expired_holds_are_released(self):
+        expired = self.hold_skus(3)
+        live = self.hold_skus(1, expired=False)
+
+        self.assertEqual(reservations.expiry_backlog()['overdue'], 3)
+        self.assertEqual(reservations.release_expired(batch_size=2), 3)
+
+        self.assertEqual(
+            list(SKU.objects.filter(pk__in=[sku.pk for sku in expired]).values_list('reserved_quantity', flat=True)),
+            [0, 0, 0],
+        )
+        self.assertEqual(Reservation.objects.get(sku=live[0]).status, 'active')
+        self.assertEqual(reservations.expiry_backlog()['overdue'], 0)
+
+    def test_max_batches_bounds_a_sweep(self):
+        self.hold_skus(3)
+        self.assertEqual(reservations.release_expired(batch_size=2, max_batches=1), 2)
+        self.assertEqual(reservations.expiry_backlog()['overdue'], 1)
+
+    def test_one_sweep_is_scheduled_per_slot(self):
+        expires_at = timezone.now() + timedelta(minutes=15)
+        with mock.patch('orders.tasks.cleanup_expired_reservations.apply_async') as apply_async:
+            reservations.schedule_expiry(expires_at)
+            reservations.schedule_expiry(expires_at)
+        apply_async.assert_called_once()
+        self.assertGreaterEqual(apply_async.call_args.kwargs['eta'], expires_at)
+
+    def test_failed_scheduling_can_be_retried(self):
+        expires_at = timezone.now() + timedelta(minutes=15)
+        with mock.patch('orders.tasks.cleanup_expired_reservations.apply_async',
+                        side_effect=[ConnectionError('broker down'), None]) as apply_async, \
+                self.assertLogs('orders.reservations', 'ERROR'):
+            reservations.schedule_expiry(expires_at)
+            reservations.schedule_expiry(expires_at)
+        self.assertEqual(apply_async.call_count, 2)
+
+
+class PurchaseIndexTests(StockTestCase):
+    """The purchase index holds exactly the products a customer has paid for and kept"""
+
+    def setUp(self):
+        self.order = place_order([(self.sku.pk, 1, None)], user=self.alice, payment_method='cod')
+
+    def pay(self, order):
+        Order.objects.filter(pk=order.pk).update(status='paid')
+        return refresh_purchases([order.pk])
+
+    def refund(self, order):
+        return_request = ReturnRequest.objects.create(
+            order=order, vendor_order=VendorOrder.objects.get(order=order), reason='defective',
+            description='Broken', status='refunded',
+        )
+        return_request.items.set(OrderItem.objects.filter(order=order))
+        return refresh_purchases([order.pk])
+
+    def test_unpaid_order_is_not_a_purchase(self):
+        self.assertEqual(refresh_purchases([self.order.pk]), (0, 0))
+        self.assertFalse(has_purchased(self.alice, self.product.pk))
+
+    def test_paid_order_adds_the_purchase_once(self):
+        self.assertEqual(self.pay(self.order), (1, 0))
+        self.assertEqual(self.pay(self.order), (0, 0))
+        self.assertTrue(has_purchased(self.alice, self.product.pk))
+        self.assertFalse(has_purchased(self.bob, self.product.pk))
+        self.assertEqual(purchased_product_ids(self.alice, [self.product.pk, 0]), {self.product.pk})
+
+    def test_refund_removes_the_purchase(self):
+        self.pay(self.order)
+        self.assertEqual(self.refund(self.order), (0, 1))
+        self.assertFalse(has_purchased(self.alice, self.product.pk))
+
+    def test_purchase_bought_again_survives_a_refund(self):
+        again = place_order([(self.sku.pk, 1, None)], user=self.alice, payment_method='cod')
+        self.pay(self.order)
+        self.pay(again)
+        self.assertEqual(self.refund(self.order), (0, 0))
+        self.assertTrue(has_purchased(self.alice, self.product.pk))
+
+    def test_backfill_matches_the_order_history(self):
+        Order.objects.filter(pk=self.order.pk).update(status='paid')
+        place_order([(self.sku.pk, 1, None)], user=self.bob, payment_method='cod')
+
+        self.assertEqual(list(backfill_purchases(batch_size=1)), [(1, 1), (2, 0)])
+        self.assertEqual(
+            list(PurchasedProduct.objects.values_list('user_id', 'product_id')), [(self.alice.pk, self.product.pk)],
+        )
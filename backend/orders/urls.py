@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CartViewSet, CheckoutView, StripeWebhookView, StripeConfigView, CouponViewSet, OrderViewSet
+from .views import CartViewSet, CheckoutView, PaymentStatusView, StripeWebhookView, StripeConfigView, CouponViewSet, OrderViewSet
 from .shipping_views import (
     ShippingAddressViewSet, ShippingRateViewSet, 
     OrderCancellationViewSet, ReturnRequestViewSet
@@ -18,6 +18,7 @@ router.register(r'returns', ReturnRequestViewSet, basename='return')
 urlpatterns = [
     path('', include(router.urls)),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
+    path('checkout/<uuid:order_id>/payment/', PaymentStatusView.as_view(), name='checkout-payment'),
     path('payments/stripe/config/', StripeConfigView.as_view(), name='stripe-config'),
     path('payments/stripe/webhook/', StripeWebhookView.as_view(), name='stripe-webhook'),
 ]
\ No newline at end of file
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from notifications.push import push_order_update
+from notifications.utils import create_notifications
+from .models import Order, StripeEvent, VendorOrder
+from .purchases import refresh_purchases
+from .rollups import change_status
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100
+# Events failing this many times are left for replay_stripe_events
+MAX_ATTEMPTS = 5
+SCHEDULED_KEY = 'orders:stripe-events:scheduled'
+# Events arriving within this many seconds share one consumer run
+SCHEDULE_DELAY = 1
+
+
+def record_event(payload):
+    """
+    Store a webhook event unless it was received before
+
+    Args:
+        payload: The event as a dict; its signature must already be verified
+
+    Returns:
+        The Stripe event id
+    """
+    event_id = payload.get("id")
+    if not event_id:
+        # Unsigned test payloads may lack an id; identical bodies are one event
+        event_id = "evt_local_" + hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+    StripeEvent.objects.bulk_create(
+        [StripeEvent(event_id=event_id, event_type=payload.get("type") or "", payload=payload)],
+        ignore_conflicts=True,
+    )
+    transaction.on_commit(schedule_processing)
+    return event_id
+
+
+def schedule_processing():
+    """Enqueue one consumer run for a burst of events"""
+    from .tasks import process_stripe_events
+
+    # The consumer clears the flag before it claims events, so anything
+    # stored after that schedules a new run
+    if not cache.add(SCHEDULED_KEY, 1, timeout=60):
+        return
+    try:
+        process_stripe_events.apply_async(countdown=SCHEDULE_DELAY)
+    except Exception:
+        cache.delete(SCHEDULED_KEY)
+        logger.exception("Could not enqueue Stripe event processing")
+
+
+def process_pending_events(batch_size=BATCH_SIZE, max_batches=None):
+    """
+    Apply unprocessed events, oldest first, in batches
+
+    Each batch is applied and marked processed in one transaction, so a crash
+    redelivers the whole batch. Handlers only move orders out of the state an
+    event applies to, which makes redelivery harmless: events are delivered
+    at least once but take effect exactly once.
+
+    Returns:
+        Tuple of (events processed, events that failed)
+    """
+    cache.delete(SCHEDULED_KEY)
+    processed = 0
+    failed_ids = set()
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        with transaction.atomic():
+            events = list(
+                StripeEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+                .exclude(id__in=failed_ids)
+                .order_by("received_at")[:batch_size]
+            )
+            if not events:
+                break
+            done, failed = _process_batch(events)
+        processed += len(done)
+        failed_ids.update(event.id for event in failed)
+        batches += 1
+    return processed, len(failed_ids)
+
+
+def _process_batch(events):
+    by_type = defaultdict(list)
+    for event in events:
+        by_type[event.event_type].append(event)
+
+    done, failed = [], []
+    for event_type, group in by_type.items():
+        handler = HANDLERS.get(event_type)
+        if handler is None:
+            done.extend(group)  # Acknowledged, nothing to do
+            continue
+        try:
+            with transaction.atomic():
+                handler(group)
+            done.extend(group)
+        except Exception:
+            # Retry one by one so a single bad event does not hold back the rest
+            for event in group:
+                try:
+                    with transaction.atomic():
+                        handler([event])
+                    done.append(event)
+                except Exception as exc:
+                    logger.exception("Stripe event %s failed", event.event_id)
+                    event.last_error = str(exc)
+                    failed.append(event)
+
+    StripeEvent.objects.filter(id__in=[event.id for event in done]).update(
+        processed_at=timezone.now(), attempts=F("attempts") + 1, last_error=""
+    )
+    for event in failed:
+        StripeEvent.objects.filter(id=event.id).update(attempts=F("attempts") + 1, last_error=event.last_error)
+    return done, failed
+
+
+def _intent_ids(events):
+    ids = set()
+    for event in events:
+        intent_id = (event.payload.get("data") or {}).get("object", {}).get("id")
+        if intent_id:
+            ids.add(intent_id)
+    return ids
+
+
+def _payment_succeeded(events):
+    orders = list(
+        Order.objects.select_for_update()
+        .filter(payment_intent_id__in=_intent_ids(events), status="pending")
+        .only("id", "user_id")
+    )
+    if not orders:
+        return
+    order_ids = [order.id for order in orders]
+    Order.objects.filter(id__in=order_ids).update(status="paid", updated_at=timezone.now())
+    change_status(VendorOrder.objects.filter(order_id__in=order_ids), "paid")
+    refresh_purchases(order_ids)
+    for order in orders:
+        push_order_update(order.user_id, order.id, status="paid")
+    # Guest orders have no one to notify in-app
+    create_notifications([
+        {
+            'user_id': order.user_id,
+            'notification_type': 'payment_status',
+            'title': 'Payment Confirmed',
+            'message': f'Your payment for order #{order.id} has been confirmed.',
+            'reference_id': str(order.id),
+        }
+        for order in orders if order.user_id
+    ])
+
+
+HANDLERS = {
+    "payment_intent.succeeded": _payment_succeeded,
+}
@@ -4,7 +4,7 @@ from .models import Category, Product, ProductImage, SKU, InventoryTransaction,
 
 @admin.register(Category)
 class CategoryAdmin(DraggableMPTTAdmin):
-    list_display = ('tree_actions', 'indented_title', 'name', 'slug', 'is_active')
+    list_display = ('tree_actions', 'indented_title', 'name', 'slug', 'subtree_product_count', 'is_active')
     list_display_links = ('indented_title',)
     prepopulated_fields = {'slug': ('name',)}
     search_fields = ('name', 'slug')
@@ -26,12 +26,14 @@ class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     inlines = [ProductImageInline, SKUInline]
     date_hierarchy = 'created_at'
+    readonly_fields = Product.RATING_FIELDS
 
 @admin.register(SKU)
 class SKUAdmin(admin.ModelAdmin):
-    list_display = ('sku_code', 'product', 'price_adjustment', 'stock_quantity', 'is_active')
+    list_display = ('sku_code', 'product', 'price_adjustment', 'stock_quantity', 'reserved_quantity', 'is_active')
     list_filter = ('is_active', 'product')
     search_fields = ('sku_code', 'product__name')
+    readonly_fields = SKU.DENORMALIZED_FIELDS
 
 @admin.register(InventoryTransaction)
 class InventoryTransactionAdmin(admin.ModelAdmin):
@@ -0,0 +1,50 @@
+import uuid
+
+from django.db.models import Q
+
+from .models import Category, Product
+
+# Query parameters that narrow a product list to one category subtree or vendor
+SCOPES = ('category', 'vendor')
+
+
+def scope_tags(params, scopes=SCOPES):
+    """
+    Invalidation tags for a product list narrowed by category and/or vendor
+
+    Args:
+        params: The request's query parameters
+        scopes: The parameters the list is filtered by
+    """
+    tags = []
+    for scope in scopes:
+        for value in params.getlist(scope):
+            try:
+                tags.append(f'{scope}-products:{uuid.UUID(value)}')
+            except ValueError:
+                pass  # The filter rejects it, and errors are not cached
+    return tags
+
+
+def product_tags(product_ids):
+    """
+    Invalidation tags for a change to some products' variants, images or ratings
+
+    Covers each product's own responses and the lists scoped to its vendor,
+    its category or any ancestor of that category. Unscoped lists keep the
+    global `products` tag, which is left to structural changes; they pick up
+    such changes when their entries expire.
+    """
+    tags = {f'product:{pk}' for pk in product_ids}
+    categories = Q()
+    for vendor_id, tree_id, lft, rght in Product.objects.filter(pk__in=list(product_ids)).values_list(
+        'vendor_id', 'category__tree_id', 'category__lft', 'category__rght'
+    ):
+        tags.add(f'vendor-products:{vendor_id}')
+        if tree_id is not None:
+            categories |= Q(tree_id=tree_id, lft__lte=lft, rght__gte=rght)
+    if categories:
+        tags.update(
+            f'category-products:{pk}' for pk in Category.objects.filter(categories).values_list('id', flat=True)
+        )
+    return sorted(tags)
@@ -0,0 +1,53 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+VERSION_KEY = 'products:category-tree:version'
+TREE_KEY = 'products:category-tree:{version}'
+# Old versions are never read again, so they only need to outlive a deploy
+TREE_TIMEOUT = 60 * 60 * 24
+
+
+def get_tree_version():
+    cache.add(VERSION_KEY, 1, timeout=None)
+    return cache.get(VERSION_KEY, 1)
+
+
+def bump_tree_version():
+    """Invalidate the cached tree; the next request rebuilds it under a new key"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 2, timeout=None)
+
+
+def build_category_tree():
+    """
+    Serialize the whole category forest from a single query
+
+    Returns:
+        Tuple of (serialized root categories, ETag for them)
+    """
+    from .models import Category
+    from .serializers import CategoryTreeSerializer
+
+    # One tree_id/lft ordered fetch; get_children() is then served from the
+    # cache mptt attaches to every node
+    roots = [root for root in Category.objects.all().get_cached_trees() if root.is_active]
+    data = json.loads(json.dumps(CategoryTreeSerializer(roots, many=True).data, cls=DjangoJSONEncoder))
+    etag = hashlib.md5(json.dumps(data, sort_keys=True).encode()).hexdigest()
+    return data, etag
+
+
+def get_category_tree():
+    """
+    Cached (data, etag) for the category tree, rebuilt at most once per version
+    """
+    key = TREE_KEY.format(version=get_tree_version())
+    entry = cache.get(key)
+    if entry is None:
+        entry = build_category_tree()
+        cache.set(key, entry, timeout=TREE_TIMEOUT)
+    return entry
@@ -22,8 +22,6 @@ class ReviewVoteSerializer(serializers.ModelSerializer):
 
 
 class ProductRatingWithVotesSerializer(serializers.ModelSerializer):
-    helpful_votes = serializers.SerializerMethodField()
-    not_helpful_votes = serializers.SerializerMethodField()
     user_vote = serializers.SerializerMethodField()
     images = ReviewImageSerializer(many=True, read_only=True)
     is_verified_purchase = serializers.SerializerMethodField()
@@ -35,13 +33,9 @@ class ProductRatingWithVotesSerializer(serializers.ModelSerializer):
                  'is_verified_purchase', 'created_at', 'updated_at']
         read_only_fields = ['user', 'created_at', 'updated_at']
     
-    def get_helpful_votes(self, obj):
-        return obj.votes.filter(vote_type='helpful').count()
-    
-    def get_not_helpful_votes(self, obj):
-        return obj.votes.filter(vote_type='not_helpful').count()
-    
     def get_user_vote(self, obj):
+        if hasattr(obj, 'viewer_votes'):
+            return obj.viewer_votes[0].vote_type if obj.viewer_votes else None
         user = self.context.get('request').user if 'request' in self.context else None
         if user and user.is_authenticated:
             vote = obj.votes.filter(user=user).first()
@@ -49,13 +43,11 @@ class ProductRatingWithVotesSerializer(serializers.ModelSerializer):
         return None
     
     def get_is_verified_purchase(self, obj):
+        if hasattr(obj, 'verified_purchase'):
+            return obj.verified_purchase
         # Check if user purchased this product
-        from orders.models import OrderItem
-        return OrderItem.objects.filter(
-            order__user=obj.user,
-            product=obj.product,
-            order__status__in=['paid', 'delivered']
-        ).exists()
+        from orders.models import PurchasedProduct
+        return PurchasedProduct.objects.filter(user=obj.user_id, product=obj.product_id).exists()
 
 
 class ProductQuestionSerializer(serializers.ModelSerializer):
@@ -68,6 +60,8 @@ class ProductQuestionSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'is_answered', 'created_at']
     
     def get_answers_count(self, obj):
+        if hasattr(obj, 'answers_count'):
+            return obj.answers_count
         return obj.answers.count()
 
 
@@ -110,12 +104,12 @@ class ProductComparisonSerializer(serializers.ModelSerializer):
     
     def get_products_details(self, obj):
         products_data = []
-        for product in obj.products.all():
+        for product in obj.products.select_related('category'):
             products_data.append({
                 'id': str(product.id),
                 'name': product.name,
                 'price': str(product.price),
-                'rating': str(product.ratings.aggregate(avg=serializers.Avg('rating'))['avg'] or 0),
+                'rating': str(product.rating_average or 0),
                 'category': product.category.name if product.category else None
             })
         return products_data
@@ -129,8 +123,8 @@ class FlashSaleSerializer(serializers.ModelSerializer):
         model = FlashSale
         fields = ['id', 'name', 'description', 'discount_percentage', 'start_time', 
                  'end_time', 'products', 'products_count', 'max_quantity_per_user', 
-                 'is_active', 'is_live_now', 'created_at']
-        read_only_fields = ['created_at']
+                 'is_active', 'is_live_now', 'announced_at', 'created_at']
+        read_only_fields = ['announced_at', 'created_at']
     
     def get_is_live_now(self, obj):
         return obj.is_live()
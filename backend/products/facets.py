@@ -0,0 +1,274 @@
+from collections import Counter, defaultdict
+from decimal import Decimal
+from uuid import UUID
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Category, FacetCount, Product, SKU
+
+# (label, lower bound inclusive, upper bound exclusive)
+PRICE_BUCKETS = (
+    ('0-25', Decimal('0'), Decimal('25')),
+    ('25-50', Decimal('25'), Decimal('50')),
+    ('50-100', Decimal('50'), Decimal('100')),
+    ('100-250', Decimal('100'), Decimal('250')),
+    ('250-500', Decimal('250'), Decimal('500')),
+    ('500-1000', Decimal('500'), Decimal('1000')),
+    ('1000+', Decimal('1000'), None),
+)
+
+CATALOG_SCOPE = ''
+
+
+def price_bucket(price):
+    """Label of the price bucket a price falls into"""
+    for label, low, high in PRICE_BUCKETS:
+        if high is None or price < high:
+            return label
+
+
+def price_bucket_filter(labels):
+    """Q matching products whose price falls in any of the given bucket labels"""
+    condition = Q()
+    for label, low, high in PRICE_BUCKETS:
+        if label in labels:
+            clause = Q(price__gte=low)
+            if high is not None:
+                clause &= Q(price__lt=high)
+            condition |= clause
+    return condition
+
+
+def attribute_values(attributes):
+    """(name, value) pairs of a SKU attributes dict that can be faceted on"""
+    if not isinstance(attributes, dict):
+        return []
+    pairs = []
+    for name, value in attributes.items():
+        if value in (None, '') or isinstance(value, (list, dict)):
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'  # Matches the text the JSON key lookup yields
+        pairs.append((str(name)[:100], str(value)[:255]))
+    return pairs
+
+
+def product_facet_keys(product, category_path, attributes):
+    """
+    FacetCount keys a product contributes to
+
+    Args:
+        product: Product instance
+        category_path: IDs of the product's category and all of its ancestors
+        attributes: (name, value) pairs from the product's active SKUs
+
+    Returns:
+        Set of (scope, facet, name, value) tuples; empty for inactive products
+    """
+    if not product.is_active:
+        return set()
+
+    values = {
+        (FacetCount.FACET_VENDOR, '', str(product.vendor_id)),
+        (FacetCount.FACET_PRICE, '', price_bucket(product.price)),
+    }
+    values.update((FacetCount.FACET_ATTRIBUTE, name, value) for name, value in attributes)
+
+    keys = set()
+    for scope in [CATALOG_SCOPE] + category_path:
+        keys.update((scope,) + value for value in values)
+    # A product counts towards its category and every ancestor
+    keys.update((CATALOG_SCOPE, FacetCount.FACET_CATEGORY, '', category_id) for category_id in category_path)
+    return keys
+
+
+def refresh_product_facets(product_ids):
+    """
+    Bring the facet counts in line with the current state of some products
+
+    Each product stores the keys it was last counted under, so only the
+    difference is applied: a price change moves one count per scope from the
+    old bucket to the new one instead of recounting anything.
+    """
+    with transaction.atomic():
+        products = list(
+            Product.objects.select_for_update().filter(id__in=list(product_ids)).order_by('id')
+            .only('id', 'vendor_id', 'category_id', 'price', 'is_active', 'facet_keys')
+        )
+        if not products:
+            return
+
+        deltas = Counter()
+        changed = []
+        for product, keys in _compute_keys(products).items():
+            previous = {tuple(key) for key in product.facet_keys}
+            if keys == previous:
+                continue
+            for key in keys - previous:
+                deltas[key] += 1
+            for key in previous - keys:
+                deltas[key] -= 1
+            product.facet_keys = sorted(keys)
+            changed.append(product)
+
+        apply_facet_deltas(deltas)
+        Product.objects.bulk_update(changed, ['facet_keys'])
+
+
+def remove_product_facets(facet_keys):
+    """Subtract a deleted product's stored keys from the counts"""
+    apply_facet_deltas(Counter({tuple(key): -1 for key in facet_keys}))
+
+
+def apply_facet_deltas(deltas):
+    """Add a {key: delta} mapping to FacetCount with one UPDATE per distinct delta"""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    FacetCount.objects.bulk_create(
+        [
+            FacetCount(scope=scope, facet=facet, name=name, value=value, count=0)
+            for (scope, facet, name, value), delta in deltas.items() if delta > 0
+        ],
+        ignore_conflicts=True,
+    )
+
+    by_delta = defaultdict(list)
+    for key, delta in deltas.items():
+        by_delta[delta].append(key)
+    for delta, keys in by_delta.items():
+        condition = Q()
+        for scope, facet, name, value in keys:
+            condition |= Q(scope=scope, facet=facet, name=name, value=value)
+        FacetCount.objects.filter(condition).update(count=F('count') + delta)
+
+
+def rebuild_facet_counts(batch_size=1000):
+    """
+    Recompute every product's facet keys and all counts from scratch
+
+    Returns:
+        Tuple of (products processed, facet rows written)
+    """
+    totals = Counter()
+    processed = 0
+    with transaction.atomic():
+        products = Product.objects.order_by('id').only(
+            'id', 'vendor_id', 'category_id', 'price', 'is_active', 'facet_keys'
+        )
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                processed += _rebuild_batch(batch, totals)
+                batch = []
+        if batch:
+            processed += _rebuild_batch(batch, totals)
+
+        FacetCount.objects.all().delete()
+        FacetCount.objects.bulk_create(
+            [
+                FacetCount(scope=scope, facet=facet, name=name, value=value, count=count)
+                for (scope, facet, name, value), count in totals.items()
+            ],
+            batch_size=batch_size,
+        )
+    return processed, len(totals)
+
+
+def facet_counts(category=None):
+    """
+    Facet counts for the whole catalog or for one category subtree
+
+    Returns:
+        Dict with `categories` (the next level down, rolled up over their
+        subtrees), `price`, `vendors` and `attributes`, omitting zero counts
+    """
+    from profiles.models import VendorProfile
+
+    scope = str(category.pk) if category else CATALOG_SCOPE
+    children = category.get_children() if category else Category.objects.root_nodes()
+    children = list(children.filter(is_active=True).only('id', 'name', 'slug'))
+
+    rows = FacetCount.objects.filter(
+        (Q(scope=scope) & ~Q(facet=FacetCount.FACET_CATEGORY))
+        | Q(scope=CATALOG_SCOPE, facet=FacetCount.FACET_CATEGORY, value__in=[str(child.pk) for child in children]),
+        count__gt=0,
+    ).values_list('facet', 'name', 'value', 'count')
+
+    grouped = defaultdict(dict)
+    for facet, name, value, count in rows:
+        grouped[facet][(name, value)] = count
+
+    category_counts = grouped[FacetCount.FACET_CATEGORY]
+    price_counts = grouped[FacetCount.FACET_PRICE]
+    vendor_counts = {value: count for (_, value), count in grouped[FacetCount.FACET_VENDOR].items()}
+    store_names = dict(
+        VendorProfile.objects.filter(id__in=list(vendor_counts)).values_list('id', 'store_name')
+    ) if vendor_counts else {}
+
+    attributes = defaultdict(list)
+    for (name, value), count in sorted(grouped[FacetCount.FACET_ATTRIBUTE].items(), key=lambda item: (-item[1], item[0])):
+        attributes[name].append({'value': value, 'count': count})
+
+    return {
+        'categories': [
+            {'id': str(child.pk), 'name': child.name, 'slug': child.slug, 'count': category_counts[('', str(child.pk))]}
+            for child in children if ('', str(child.pk)) in category_counts
+        ],
+        'price': [
+            {'range': label, 'min': str(low), 'max': str(high) if high is not None else None, 'count': price_counts[('', label)]}
+            for label, low, high in PRICE_BUCKETS if ('', label) in price_counts
+        ],
+        'vendors': sorted(
+            (
+                {'id': vendor_id, 'store_name': store_names.get(UUID(vendor_id), ''), 'count': count}
+                for vendor_id, count in vendor_counts.items()
+            ),
+            key=lambda vendor: (-vendor['count'], vendor['store_name']),
+        ),
+        'attributes': dict(attributes),
+    }
+
+
+def _rebuild_batch(products, totals):
+    for product, keys in _compute_keys(products).items():
+        product.facet_keys = sorted(keys)
+        totals.update(keys)
+    Product.objects.bulk_update(products, ['facet_keys'])
+    return len(products)
+
+
+def _compute_keys(products):
+    attributes = defaultdict(set)
+    skus = SKU.objects.filter(product__in=products, is_active=True).values_list('product_id', 'attributes')
+    for product_id, values in skus:
+        attributes[product_id].update(attribute_values(values))
+
+    paths = _category_paths({product.category_id for product in products if product.category_id})
+    return {
+        product: product_facet_keys(product, paths.get(product.category_id, []), attributes[product.id])
+        for product in products
+    }
+
+
+def _category_paths(category_ids):
+    """Map each category id to the ids of itself and its ancestors, in one query"""
+    if not category_ids:
+        return {}
+    categories = Category.objects.filter(id__in=category_ids)
+    nodes = list(
+        Category.objects.get_queryset_ancestors(categories, include_self=True)
+        .values_list('id', 'tree_id', 'lft', 'rght')
+    )
+    paths = {}
+    for category_id, tree_id, lft, rght in nodes:
+        if category_id not in category_ids:
+            continue
+        paths[category_id] = [
+            str(ancestor_id) for ancestor_id, ancestor_tree, ancestor_lft, ancestor_rght in nodes
+            if ancestor_tree == tree_id and ancestor_lft <= lft and ancestor_rght >= rght
+        ]
+    return paths
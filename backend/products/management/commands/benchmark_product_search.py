@@ -0,0 +1,105 @@
+import random
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.contrib.auth import get_user_model
+from marketplace.cache import invalidate
+from profiles.models import VendorProfile
+from products.category_tree import bump_tree_version
+from products.facets import rebuild_facet_counts
+from products.models import Category, Product
+from products.search import search_products, update_search_vectors
+
+User = get_user_model()
+
+WORDS = [
+    'wireless', 'bluetooth', 'headphones', 'speaker', 'portable', 'laptop', 'stand',
+    'ergonomic', 'chair', 'desk', 'lamp', 'organic', 'cotton', 'shirt', 'running',
+    'shoes', 'leather', 'wallet', 'stainless', 'steel', 'bottle', 'kitchen', 'knife',
+    'ceramic', 'mug', 'garden', 'hose', 'camping', 'tent', 'yoga', 'mat', 'gaming',
+    'keyboard', 'mouse', 'monitor', 'charger', 'cable', 'backpack', 'travel', 'watch',
+]
+DEFAULT_QUERIES = ['wireless headphones', 'steel', 'yoga mat', 'key', 'camping tent lamp']
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the full-text product search against the previous icontains SearchFilter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0, help='Create this many synthetic products first (e.g. 500000)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Products per bulk insert while seeding')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+        parser.add_argument('--query', action='append', dest='queries', help='Query to benchmark (repeatable)')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'])
+
+        products = Product.objects.filter(is_active=True)
+        self.stdout.write(f'Benchmarking over {products.count()} active products, {options["repeat"]} runs per query')
+
+        for text in options['queries'] or DEFAULT_QUERIES:
+            legacy_ms, legacy_hits = self.measure(lambda: self.icontains(products, text), options['repeat'])
+            search_ms, search_hits = self.measure(lambda: search_products(products, text), options['repeat'])
+            self.stdout.write(
+                f'{text!r:24} icontains: {legacy_ms:8.1f} ms ({legacy_hits} hits)   '
+                f'full-text: {search_ms:8.1f} ms ({search_hits} hits)'
+            )
+
+    def icontains(self, products, text):
+        # Same predicate DRF's SearchFilter built over name and description
+        for term in text.split():
+            products = products.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return products.order_by('-created_at')
+
+    def measure(self, build_queryset, repeat):
+        """Median wall time of counting the matches and fetching the first page"""
+        timings = []
+        hits = 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            queryset = build_queryset()
+            hits = queryset.count()
+            list(queryset[:20])
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2], hits
+
+    def seed(self, count, batch_size):
+        self.stdout.write(f'Seeding {count} products...')
+        user, _ = User.objects.get_or_create(
+            username='search_benchmark_vendor',
+            defaults={'email': 'search-benchmark@example.com', 'is_vendor': True, 'is_customer': False},
+        )
+        vendor, _ = VendorProfile.objects.get_or_create(user=user, defaults={'store_name': 'Benchmark Outlet'})
+        category, _ = Category.objects.get_or_create(slug='search-benchmark', defaults={'name': 'Benchmark Goods'})
+
+        rng = random.Random(42)
+        created = 0
+        while created < count:
+            batch = []
+            for _ in range(min(batch_size, count - created)):
+                name = ' '.join(rng.sample(WORDS, 3)).title()
+                batch.append(Product(
+                    vendor=vendor,
+                    category=category,
+                    name=name,
+                    slug=f'bench-{uuid.uuid4().hex}',
+                    description=' '.join(rng.choices(WORDS, k=30)),
+                    price=Decimal(rng.randint(100, 100000)) / 100,
+                ))
+            Product.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'  {created}/{count}')
+
+        # bulk_create sends no post_save, so do in one pass what the product
+        # signals would have: index the rows, count them and expire responses
+        update_search_vectors(Product.objects.filter(vendor=vendor))
+        Category.rebuild_product_counts()
+        rebuild_facet_counts(batch_size=batch_size)
+        bump_tree_version()
+        invalidate('products', 'categories')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {count} products'))
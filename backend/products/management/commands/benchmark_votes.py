@@ -0,0 +1,125 @@
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from products.models import (
+    AnswerVote, Category, Product, ProductAnswer, ProductQuestion, ProductRating, ReviewVote
+)
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fires concurrent helpful votes at one review and one answer and checks the counters come out exact'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--voters', type=int, default=2000, help='Users voting, one request sequence each')
+        parser.add_argument('--concurrency', type=int, default=100, help='Voters in flight at once')
+        parser.add_argument('--switch-every', type=int, default=3, help='Every Nth voter changes their review vote to not helpful')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users, product, review and answer')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serializes writers; run this benchmark against PostgreSQL')
+
+        run = uuid.uuid4().hex[:8]
+        review, answer, users = self.setup(run, options['voters'])
+        start = threading.Barrier(min(options['concurrency'], len(users)))
+        switch_every = options['switch_every']
+
+        def vote(index_user):
+            index, user = index_user
+            client = APIClient()
+            client.force_authenticate(user)
+            # Duplicate answer votes and vote changes are where lost updates would show
+            steps = [
+                (f'/api/products/ratings/{review.id}/vote/', {'vote_type': 'helpful'}),
+                (f'/api/products/answers/{answer.id}/vote_helpful/', {}),
+                (f'/api/products/answers/{answer.id}/vote_helpful/', {}),
+            ]
+            if switch_every and index % switch_every == 0:
+                steps.insert(1, (f'/api/products/ratings/{review.id}/vote/', {'vote_type': 'not_helpful'}))
+            rest = steps[1:]
+            random.Random(index).shuffle(rest)
+            steps = steps[:1] + rest
+            timings, failures = [], 0
+            try:
+                try:
+                    start.wait(timeout=30)
+                except threading.BrokenBarrierError:
+                    pass
+                for url, data in steps:
+                    started = time.perf_counter()
+                    response = client.post(url, data, format='json')
+                    timings.append((time.perf_counter() - started) * 1000)
+                    failures += response.status_code != 200
+                return timings, failures
+            finally:
+                connection.close()
+
+        self.stdout.write(f'{len(users)} voters, {options["concurrency"]} concurrent')
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            results = list(pool.map(vote, enumerate(users)))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(ms for timings, _ in results for ms in timings)
+        failures = sum(failed for _, failed in results)
+        self.stdout.write(
+            f'{len(latencies)} votes in {elapsed:.1f} s ({len(latencies) / elapsed:.0f} votes/s), '
+            f'p50 {statistics.median(latencies):.1f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} ms, '
+            f'{failures} failed'
+        )
+
+        switched = len(range(0, len(users), switch_every)) if switch_every else 0
+        expected = (len(users) - switched, switched, len(users))
+        review.refresh_from_db()
+        answer.refresh_from_db()
+        counters = (review.helpful_votes, review.not_helpful_votes, answer.helpful_votes)
+        rows = (
+            ReviewVote.objects.filter(review=review, vote_type='helpful').count(),
+            ReviewVote.objects.filter(review=review, vote_type='not_helpful').count(),
+            AnswerVote.objects.filter(answer=answer).count(),
+        )
+        self.stdout.write(
+            f'review helpful/not helpful {counters[0]}/{counters[1]}, answer helpful {counters[2]}; '
+            f'vote rows {rows[0]}/{rows[1]}, {rows[2]}; expected {expected[0]}/{expected[1]}, {expected[2]}'
+        )
+
+        if not options['keep']:
+            self.teardown(run, review.product)
+        if failures or counters != expected or rows != expected:
+            raise CommandError('Vote counters are not exact')
+        self.stdout.write(self.style.SUCCESS('Vote counters are exact'))
+
+    def setup(self, run, count):
+        vendor_user = User.objects.create(username=f'bench-vendor-{run}', is_vendor=True, is_customer=False)
+        vendor = VendorProfile.objects.get(user=vendor_user)
+        category, _ = Category.objects.get_or_create(slug='vote-benchmark', defaults={'name': 'Vote Benchmark'})
+        product = Product.objects.create(
+            vendor=vendor, category=category, name=f'Benchmark {run}', slug=f'vote-bench-{run}',
+            description='Vote benchmark product', price=Decimal('10.00'),
+        )
+        users = User.objects.bulk_create([
+            User(username=f'bench-votes-{run}-{index}', is_customer=True) for index in range(count)
+        ])
+        review = ProductRating.objects.create(product=product, user=users[0], rating=5, review='Benchmark review')
+        question = ProductQuestion.objects.create(product=product, user=users[0], question='Benchmark question?')
+        answer = ProductAnswer.objects.create(question=question, user=vendor_user, answer='Benchmark answer', is_vendor=True)
+        return review, answer, users
+
+    def teardown(self, run, product):
+        User.objects.filter(username__startswith=f'bench-votes-{run}-').delete()
+        vendor_user = product.vendor.user
+        product.delete()
+        vendor_user.delete()
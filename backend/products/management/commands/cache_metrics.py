@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.urls import get_resolver
+from marketplace import cache
+
+
+class Command(BaseCommand):
+    help = 'Reports hit/miss counts of the anonymous response cache per endpoint namespace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Zero the counters after reporting')
+
+    def handle(self, *args, **options):
+        # Importing the URLconf imports the views, which register their namespaces
+        get_resolver().url_patterns
+
+        for namespace in sorted(cache.namespaces):
+            counts = cache.metrics(namespace)
+            served = sum(counts.values())
+            cached = counts['hit'] + counts['coalesced']
+            ratio = f'{cached / served:.1%}' if served else 'n/a'
+            self.stdout.write(
+                f'{namespace:18} hit {counts["hit"]:>8}  coalesced {counts["coalesced"]:>6}  '
+                f'miss {counts["miss"]:>6}  early {counts["early"]:>6}  hit ratio {ratio}'
+            )
+            if options['reset']:
+                cache.reset_metrics(namespace)
+
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Compares the stored category product counts with the products table and reports any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Rebuild the counts if any category has drifted')
+
+    def handle(self, *args, **options):
+        expected = Category.expected_product_counts()
+        mismatches = []
+        for category in Category.objects.order_by('tree_id', 'lft'):
+            stored = (category.product_count, category.subtree_product_count)
+            if stored != expected.get(category.pk, (0, 0)):
+                mismatches.append((category, stored, expected[category.pk]))
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f'All {len(expected)} category counts are consistent'))
+            return
+
+        for category, stored, wanted in mismatches:
+            self.stdout.write(
+                f'{category.name} ({category.pk}): stored {stored[0]}/{stored[1]}, expected {wanted[0]}/{wanted[1]}'
+            )
+
+        if options['fix']:
+            changed = Category.rebuild_product_counts()
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt product counts, {changed} categories changed'))
+        else:
+            raise CommandError(f'{len(mismatches)} categories have drifted; rerun with --fix to rebuild')
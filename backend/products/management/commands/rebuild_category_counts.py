@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from products.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the direct and subtree active product counts on categories from the products table'
+
+    def handle(self, *args, **options):
+        changed = Category.rebuild_product_counts()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt product counts, {changed} categories changed'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.facets import rebuild_facet_counts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the precomputed facet counts used by /api/products/browse/ from the product catalog'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products recomputed per batch')
+
+    def handle(self, *args, **options):
+        products, rows = rebuild_facet_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} facet counts from {products} products'))
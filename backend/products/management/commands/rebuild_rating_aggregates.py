@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized rating count/sum/histogram columns on products from their ratings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', action='append', dest='products', help='Only rebuild this product ID (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products recomputed per batch')
+
+    def handle(self, *args, **options):
+        rebuilt = Product.rebuild_rating_aggregates(
+            product_ids=options['products'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating aggregates for {rebuilt} products'))
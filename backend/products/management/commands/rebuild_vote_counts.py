@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from products.votes import rebuild_vote_counts
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the helpful-vote counters on reviews and answers from the recorded votes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per batch')
+
+    def handle(self, *args, **options):
+        reviews, answers = rebuild_vote_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Corrected vote counts on {reviews} reviews and {answers} answers'))
@@ -0,0 +1,66 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:26
+
+from django.db import migrations, models
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductRating = apps.get_model('products', 'ProductRating')
+
+    stats = ProductRating.objects.values('product_id').annotate(
+        count=models.Count('id'),
+        total=models.Sum('rating'),
+        **{f'star_{star}': models.Count('id', filter=models.Q(rating=star)) for star in range(1, 6)}
+    )
+    for row in stats.iterator():
+        Product.objects.filter(id=row['product_id']).update(
+            rating_count=row['count'],
+            rating_sum=row['total'] or 0,
+            **{f'rating_{star}_count': row[f'star_{star}'] for star in range(1, 6)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_reviewimage_referralprogram_productquestion_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# Full-text search needs PostgreSQL; on other databases products.search
+# falls back to an in-process inverted index and these steps are skipped.
+BACKFILL_SQL = """
+UPDATE products_product p SET search_vector =
+    setweight(to_tsvector('english', coalesce(p.name, '')), 'A') ||
+    setweight(to_tsvector('english', coalesce(p.description, '')), 'B') ||
+    setweight(to_tsvector('english', coalesce(
+        (SELECT c.name FROM products_category c WHERE c.id = p.category_id), '')), 'C') ||
+    setweight(to_tsvector('english', coalesce(
+        (SELECT v.store_name FROM profiles_vendorprofile v WHERE v.id = p.vendor_id), '')), 'D')
+"""
+
+
+def backfill_search_vectors(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(BACKFILL_SQL)
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex whose index is only created on PostgreSQL; the model state changes everywhere"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_created_id_index'),
+        ('profiles', '0004_vendorprofile_average_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_search_vectors, migrations.RunPython.noop),
+        AddPostgresIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='facet_keys',
+            field=models.JSONField(default=list, editable=False),
+        ),
+        migrations.CreateModel(
+            name='FacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(blank=True, max_length=36)),
+                ('facet', models.CharField(choices=[('category', 'Category'), ('vendor', 'Vendor'), ('price', 'Price range'), ('attribute', 'SKU attribute')], max_length=20)),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('value', models.CharField(max_length=255)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('scope', 'facet', 'name', 'value')},
+            },
+        ),
+    ]
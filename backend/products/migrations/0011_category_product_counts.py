@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:37
+
+from django.db import migrations, models
+
+
+def backfill_category_counts(apps, schema_editor):
+    Category = apps.get_model('products', 'Category')
+    Product = apps.get_model('products', 'Product')
+
+    direct = dict(
+        Product.objects.filter(is_active=True, category__isnull=False)
+        .values_list('category_id').annotate(total=models.Count('id')).order_by()
+    )
+    nodes = list(Category.objects.order_by('tree_id', 'lft'))
+    subtree = {}
+    stack = []
+    for node in nodes:
+        while stack and (stack[-1].tree_id != node.tree_id or stack[-1].rght < node.lft):
+            stack.pop()
+        count = direct.get(node.pk, 0)
+        subtree[node.pk] = count
+        for ancestor in stack:
+            subtree[ancestor.pk] += count
+        stack.append(node)
+
+    for node in nodes:
+        node.product_count = direct.get(node.pk, 0)
+        node.subtree_product_count = subtree[node.pk]
+    Category.objects.bulk_update(nodes, ['product_count', 'subtree_product_count'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_product_facet_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='subtree_product_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_category_counts, migrations.RunPython.noop),
+    ]
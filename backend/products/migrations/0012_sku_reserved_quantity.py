@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-16 18:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_category_product_counts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sku',
+            name='reserved_quantity',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-16 19:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def backfill_review_vote_counts(apps, schema_editor):
+    ProductRating = apps.get_model('products', 'ProductRating')
+    ReviewVote = apps.get_model('products', 'ReviewVote')
+
+    stats = ReviewVote.objects.values('review_id').annotate(
+        helpful=models.Count('id', filter=models.Q(vote_type='helpful')),
+        not_helpful=models.Count('id', filter=models.Q(vote_type='not_helpful')),
+    ).order_by()
+    for row in stats.iterator():
+        ProductRating.objects.filter(id=row['review_id']).update(
+            helpful_votes=row['helpful'],
+            not_helpful_votes=row['not_helpful'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('products', '0012_sku_reserved_quantity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnswerVote',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='productrating',
+            name='helpful_votes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='productrating',
+            name='not_helpful_votes',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='productrating',
+            index=models.Index(fields=['product', '-helpful_votes', '-created_at'], name='rating_product_helpful_idx'),
+        ),
+        migrations.AddField(
+            model_name='answervote',
+            name='answer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='votes', to='products.productanswer'),
+        ),
+        migrations.AddField(
+            model_name='answervote',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='answervote',
+            unique_together={('answer', 'user')},
+        ),
+        migrations.RunPython(backfill_review_vote_counts, migrations.RunPython.noop),
+    ]
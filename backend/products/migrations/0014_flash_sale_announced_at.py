@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-16 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_vote_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashsale',
+            name='announced_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
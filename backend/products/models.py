@@ -1,12 +1,15 @@
 from django.db import models
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from mptt.models import MPTTModel, TreeForeignKey
+from marketplace.denormalized import DenormalizedFieldsMixin
 from profiles.models import VendorProfile
 import uuid
 
 User = get_user_model()
 
-class Category(MPTTModel):
+class Category(DenormalizedFieldsMixin, MPTTModel):
     """
     Hierarchical category model using MPTT for efficient tree operations
     """
@@ -20,6 +23,13 @@ class Category(MPTTModel):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Active product counts, maintained incrementally by products.signals
+    product_count = models.PositiveIntegerField(default=0, editable=False)
+    subtree_product_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    PRODUCT_COUNT_FIELDS = ('product_count', 'subtree_product_count')
+    DENORMALIZED_FIELDS = PRODUCT_COUNT_FIELDS
+    
     class MPTTMeta:
         order_insertion_by = ['name']
     
@@ -28,8 +38,95 @@ class Category(MPTTModel):
     
     def __str__(self):
         return self.name
-
-class Product(models.Model):
+    
+    @staticmethod
+    def add_products(category_id, delta):
+        """Add `delta` active products to a category and to the subtree count of it and its ancestors"""
+        category = Category.objects.filter(pk=category_id).only('tree_id', 'lft', 'rght').first()
+        if category is None:
+            return
+        Category.objects.filter(pk=category_id).update(product_count=models.F('product_count') + delta)
+        Category.objects.filter(
+            tree_id=category.tree_id, lft__lte=category.lft, rght__gte=category.rght
+        ).update(subtree_product_count=models.F('subtree_product_count') + delta)
+    
+    @staticmethod
+    def recompute_subtree_counts():
+        """
+        Re-derive subtree counts from the stored direct counts after the tree
+        shape changed (moves, deletes); reads the category table only
+        
+        Returns:
+            Number of categories whose subtree count changed
+        """
+        nodes = list(Category.objects.order_by('tree_id', 'lft').only(
+            'id', 'tree_id', 'lft', 'rght', 'product_count', 'subtree_product_count'
+        ))
+        direct = {node.pk: node.product_count for node in nodes}
+        return Category._write_product_counts(nodes, direct)
+    
+    @staticmethod
+    def expected_product_counts():
+        """
+        Direct and subtree counts computed from the products table
+        
+        Returns:
+            Dict mapping category ID to (product_count, subtree_product_count)
+        """
+        nodes = list(Category.objects.order_by('tree_id', 'lft').only('id', 'tree_id', 'lft', 'rght'))
+        direct = Category._direct_counts()
+        subtree = Category._subtree_counts(nodes, direct)
+        return {node.pk: (direct.get(node.pk, 0), subtree[node.pk]) for node in nodes}
+    
+    @staticmethod
+    def rebuild_product_counts():
+        """
+        Recompute every category's counts from the products table
+        
+        Returns:
+            Number of categories whose counts changed
+        """
+        nodes = list(Category.objects.order_by('tree_id', 'lft').only(
+            'id', 'tree_id', 'lft', 'rght', 'product_count', 'subtree_product_count'
+        ))
+        return Category._write_product_counts(nodes, Category._direct_counts())
+    
+    @staticmethod
+    def _direct_counts():
+        return dict(
+            Product.objects.filter(is_active=True, category__isnull=False)
+            .values_list('category_id').annotate(total=models.Count('id')).order_by()
+        )
+    
+    @staticmethod
+    def _subtree_counts(nodes, direct):
+        # Nodes arrive in tree_id/lft order, so the open ancestors of each node
+        # are exactly the stack entries whose right edge encloses it
+        subtree = {}
+        stack = []
+        for node in nodes:
+            while stack and (stack[-1].tree_id != node.tree_id or stack[-1].rght < node.lft):
+                stack.pop()
+            count = direct.get(node.pk, 0)
+            subtree[node.pk] = count
+            for ancestor in stack:
+                subtree[ancestor.pk] += count
+            stack.append(node)
+        return subtree
+    
+    @staticmethod
+    def _write_product_counts(nodes, direct):
+        subtree = Category._subtree_counts(nodes, direct)
+        changed = []
+        for node in nodes:
+            counts = (direct.get(node.pk, 0), subtree[node.pk])
+            if counts != (node.product_count, node.subtree_product_count):
+                node.product_count, node.subtree_product_count = counts
+                changed.append(node)
+        Category.objects.bulk_update(changed, Category.PRODUCT_COUNT_FIELDS, batch_size=1000)
+        return len(changed)
+
+class Product(DenormalizedFieldsMixin, models.Model):
     """
     Product model with vendor relationship
     """
@@ -46,8 +143,142 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Rating aggregates, maintained incrementally by products.signals
+    rating_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
+    
+    # Weighted full-text document, maintained by products.search (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    # FacetCount keys this product currently contributes to, maintained by products.facets
+    facet_keys = models.JSONField(default=list, editable=False)
+    
+    RATING_STARS = (1, 2, 3, 4, 5)
+    RATING_FIELDS = (
+        'rating_count', 'rating_sum', 'rating_1_count', 'rating_2_count',
+        'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+    # Columns written only through F() updates
+    DENORMALIZED_FIELDS = RATING_FIELDS + ('search_vector', 'facet_keys')
+    
+    class Meta:
+        indexes = [
+            # Keyset pagination: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            # Full-text search; created on PostgreSQL only, see migration 0009
+            GinIndex(fields=['search_vector'], name='product_search_vector_idx'),
+        ]
+    
     def __str__(self):
         return self.name
+    
+    @property
+    def rating_average(self):
+        """Average star rating, or None if the product has no ratings"""
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
+    
+    @property
+    def rating_histogram(self):
+        """Number of ratings per star, keyed 1-5"""
+        return {star: getattr(self, f'rating_{star}_count') for star in self.RATING_STARS}
+    
+    @staticmethod
+    def rating_delta(rating, delta):
+        """F() update kwargs that add `delta` ratings of `rating` stars to the aggregates"""
+        updates = {
+            'rating_count': models.F('rating_count') + delta,
+            'rating_sum': models.F('rating_sum') + delta * rating,
+        }
+        if rating in Product.RATING_STARS:
+            updates[f'rating_{rating}_count'] = models.F(f'rating_{rating}_count') + delta
+        return updates
+    
+    @staticmethod
+    def rebuild_rating_aggregates(product_ids=None, batch_size=1000):
+        """
+        Recompute rating aggregates from ProductRating rows
+        
+        Args:
+            product_ids: Optional iterable of product IDs to limit the rebuild to
+            batch_size: Number of products recomputed per query batch
+        
+        Returns:
+            Number of products rebuilt
+        """
+        products = Product.objects.only('id').order_by('id')
+        if product_ids is not None:
+            products = products.filter(id__in=list(product_ids))
+        
+        rebuilt = 0
+        batch = []
+        for product in products.iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                rebuilt += Product._write_rating_aggregates(batch)
+                batch = []
+        if batch:
+            rebuilt += Product._write_rating_aggregates(batch)
+        return rebuilt
+    
+    @staticmethod
+    def _write_rating_aggregates(products):
+        stats = ProductRating.objects.filter(product__in=products).values('product_id').annotate(
+            count=models.Count('id'),
+            total=models.Sum('rating'),
+            **{
+                f'star_{star}': models.Count('id', filter=models.Q(rating=star))
+                for star in Product.RATING_STARS
+            }
+        )
+        stats = {row['product_id']: row for row in stats}
+        
+        for product in products:
+            row = stats.get(product.id, {})
+            product.rating_count = row.get('count', 0)
+            product.rating_sum = row.get('total') or 0
+            for star in Product.RATING_STARS:
+                setattr(product, f'rating_{star}_count', row.get(f'star_{star}', 0))
+        Product.objects.bulk_update(products, Product.RATING_FIELDS)
+        return len(products)
+
+class FacetCount(models.Model):
+    """
+    Precomputed number of active products per facet value
+    
+    Counts are kept per scope: the whole catalog (empty scope) and every
+    category subtree (scope = category id), so a sidebar for any category is
+    a single indexed read. Category counts are rolled up through the tree
+    and only stored in the catalog scope.
+    """
+    FACET_CATEGORY = 'category'
+    FACET_VENDOR = 'vendor'
+    FACET_PRICE = 'price'
+    FACET_ATTRIBUTE = 'attribute'
+    FACET_CHOICES = (
+        (FACET_CATEGORY, 'Category'),
+        (FACET_VENDOR, 'Vendor'),
+        (FACET_PRICE, 'Price range'),
+        (FACET_ATTRIBUTE, 'SKU attribute'),
+    )
+    
+    scope = models.CharField(max_length=36, blank=True)
+    facet = models.CharField(max_length=20, choices=FACET_CHOICES)
+    name = models.CharField(max_length=100, blank=True)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('scope', 'facet', 'name', 'value')
+    
+    def __str__(self):
+        return f"{self.facet}:{self.name}={self.value} ({self.count})"
 
 class ProductImage(models.Model):
     """
@@ -63,7 +294,7 @@ class ProductImage(models.Model):
     def __str__(self):
         return f"Image for {self.product.name}"
 
-class SKU(models.Model):
+class SKU(DenormalizedFieldsMixin, models.Model):
     """
     Stock Keeping Unit model for product variants
     """
@@ -73,12 +304,22 @@ class SKU(models.Model):
     attributes = models.JSONField(default=dict, blank=True)
     price_adjustment = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     stock_quantity = models.PositiveIntegerField(default=0)
+    # Units held by active cart reservations, maintained by orders.reservations
+    reserved_quantity = models.PositiveIntegerField(default=0, editable=False)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Written only through conditional F() updates
+    DENORMALIZED_FIELDS = ('reserved_quantity',)
+    
     def __str__(self):
         return self.sku_code
+    
+    @property
+    def available_quantity(self):
+        """Stock not held by any cart reservation"""
+        return max(0, self.stock_quantity - self.reserved_quantity)
 
 class InventoryTransaction(models.Model):
     """
@@ -103,7 +344,7 @@ class InventoryTransaction(models.Model):
     def __str__(self):
         return f"{self.transaction_type} - {self.sku.sku_code} - {self.quantity}"
 
-class ProductRating(models.Model):
+class ProductRating(DenormalizedFieldsMixin, models.Model):
     """
     Product rating model
     """
@@ -112,11 +353,20 @@ class ProductRating(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     rating = models.PositiveSmallIntegerField()  # 1-5 stars
     review = models.TextField(blank=True)
+    # Counts of ReviewVote rows, kept by products.votes with F() updates
+    helpful_votes = models.PositiveIntegerField(default=0, editable=False)
+    not_helpful_votes = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    DENORMALIZED_FIELDS = ('helpful_votes', 'not_helpful_votes')
+    
     class Meta:
         unique_together = ('product', 'user')  # One rating per user per product
+        indexes = [
+            # A product's reviews, most helpful first
+            models.Index(fields=['product', '-helpful_votes', '-created_at'], name='rating_product_helpful_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.product.name} - {self.rating}"
@@ -236,7 +486,7 @@ class ProductQuestion(models.Model):
         return f"Question by {self.user.username} on {self.product.name}"
 
 
-class ProductAnswer(models.Model):
+class ProductAnswer(DenormalizedFieldsMixin, models.Model):
     """
     Model for product Q&A answers
     """
@@ -245,9 +495,12 @@ class ProductAnswer(models.Model):
     user = models.ForeignKey('accounts.User', on_delete=models.CASCADE)
     answer = models.TextField()
     is_vendor = models.BooleanField(default=False)
+    # Count of AnswerVote rows, kept by products.votes with F() updates
     helpful_votes = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    DENORMALIZED_FIELDS = ('helpful_votes',)
+    
     class Meta:
         ordering = ['-helpful_votes', '-created_at']
     
@@ -255,6 +508,22 @@ class ProductAnswer(models.Model):
         return f"Answer by {self.user.username}"
 
 
+class AnswerVote(models.Model):
+    """
+    A user's helpful vote on an answer; at most one per user and answer
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    answer = models.ForeignKey(ProductAnswer, on_delete=models.CASCADE, related_name='votes')
+    user = models.ForeignKey('accounts.User', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = ('answer', 'user')
+    
+    def __str__(self):
+        return f"{self.user.username} - helpful on answer"
+
+
 class RecentlyViewed(models.Model):
     """
     Model for tracking recently viewed products
@@ -299,6 +568,8 @@ class FlashSale(models.Model):
     products = models.ManyToManyField(Product, related_name='flash_sales')
     max_quantity_per_user = models.PositiveIntegerField(default=0)  # 0 means no limit
     is_active = models.BooleanField(default=True)
+    # Set once the sale has been announced to wishlist holders
+    announced_at = models.DateTimeField(null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
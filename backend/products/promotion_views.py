@@ -6,6 +6,7 @@ from rest_framework.exceptions import PermissionDenied
 from django.utils import timezone
 from django.db.models import Q, Sum
 from decimal import Decimal
+import logging
 
 from .models import FlashSale, BundleDeal, LoyaltyPoints, ReferralProgram, ProductBadge, Product
 from .extended_serializers import (
@@ -13,6 +14,13 @@ from .extended_serializers import (
     ReferralProgramSerializer, ProductBadgeSerializer
 )
 from profiles.permissions import IsVendor
+from marketplace.cache import cached_response
+from notifications.utils import notify_audience
+
+logger = logging.getLogger(__name__)
+
+# Sales go live and end on the clock, so cached copies must turn over quickly
+FLASH_SALE_CACHE_TIMEOUT = 30
 
 
 class FlashSaleViewSet(viewsets.ModelViewSet):
@@ -30,6 +38,7 @@ class FlashSaleViewSet(viewsets.ModelViewSet):
     - DELETE /api/products/flash-sales/{id}/ - Delete flash sale
     - POST /api/products/flash-sales/{id}/add_products/ - Add products to sale
     - POST /api/products/flash-sales/{id}/remove_products/ - Remove products
+    - POST /api/products/flash-sales/{id}/announce/ - Notify wishlist holders
     """
     serializer_class = FlashSaleSerializer
     
@@ -57,7 +66,16 @@ class FlashSaleViewSet(viewsets.ModelViewSet):
         # Regular users see active sales
         return FlashSale.objects.filter(is_active=True)
     
+    @cached_response('flash-sales', tags=['flash-sales'], timeout=FLASH_SALE_CACHE_TIMEOUT)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cached_response('flash-sales', tags=['flash-sales'], timeout=FLASH_SALE_CACHE_TIMEOUT)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    @cached_response('flash-sales', tags=['flash-sales'], timeout=FLASH_SALE_CACHE_TIMEOUT)
     def live(self, request):
         """Get all currently live flash sales"""
         now = timezone.now()
@@ -124,6 +142,52 @@ class FlashSaleViewSet(viewsets.ModelViewSet):
             'total_products': flash_sale.products.count()
         })
     
+    @action(detail=True, methods=['post'], permission_classes=[IsVendor])
+    def announce(self, request, pk=None):
+        """Notify every user with a product of the sale on a wishlist"""
+        flash_sale = self.get_object()
+        
+        # Vendors can see every active sale, but only announce their own
+        vendor = getattr(request.user, 'vendor_profile', None)
+        if not request.user.is_staff and not flash_sale.products.filter(vendor=vendor).exists():
+            raise PermissionDenied("You can only announce flash sales of your own products")
+        
+        if not flash_sale.is_active or flash_sale.end_time <= timezone.now():
+            return Response(
+                {'detail': 'Only active, upcoming or live sales can be announced'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Once per sale, however often the button is pressed; the conditional
+        # UPDATE lets exactly one request claim it
+        if not FlashSale.objects.filter(pk=flash_sale.pk, announced_at__isnull=True).update(
+            announced_at=timezone.now()
+        ):
+            return Response(
+                {'detail': 'This flash sale has already been announced'},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        try:
+            notify_audience(
+                'flash_sale_wishlists',
+                {'flash_sale_id': str(flash_sale.id)},
+                notification_type='system',
+                title=f'Flash sale: {flash_sale.name}',
+                message=f'Items on your wishlist are {flash_sale.discount_percentage}% off until '
+                        f'{timezone.localtime(flash_sale.end_time):%b %d, %H:%M}.',
+                reference_id=str(flash_sale.id),
+            )
+        except Exception:
+            # Not queued, so the sale can be announced again
+            FlashSale.objects.filter(pk=flash_sale.pk).update(announced_at=None)
+            logger.exception("Could not queue the announcement of flash sale %s", flash_sale.id)
+            return Response(
+                {'detail': 'The announcement could not be queued. Please try again.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
+            )
+        return Response({'detail': 'Announcement queued'}, status=status.HTTP_202_ACCEPTED)
+    
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
     def get_discounted_price(self, request, pk=None):
         """Calculate discounted price for a product"""
@@ -0,0 +1,88 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Build an eager-loading plan for a queryset from a serializer's declared fields
+
+    Args:
+        queryset: Base queryset for the serializer's model
+        serializer_class: ModelSerializer class that will render the queryset
+
+    Returns:
+        Queryset with select_related/prefetch_related applied so that
+        rendering it costs a constant number of queries regardless of row count
+    """
+    model = queryset.model
+    select_related = set()
+    prefetches = {}
+
+    for field in serializer_class().fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        if isinstance(field, serializers.ListSerializer):
+            if isinstance(field.child, serializers.ModelSerializer):
+                prefetches[field.source] = _plan_prefetch(model, field.source, field.child)
+            continue
+
+        if isinstance(field, serializers.ManyRelatedField):
+            # A bare PK list is served by the same prefetch as a nested serializer
+            prefetches.setdefault(field.source, field.source)
+            continue
+
+        # A plain field only needs the objects it walks through; the last
+        # attribute is read from the final row (or is a bare FK id)
+        attrs = field.source_attrs
+        if not isinstance(field, serializers.ModelSerializer):
+            attrs = attrs[:-1]
+        path = _relation_path(model, attrs)
+        if path:
+            select_related.add(path)
+
+    if select_related:
+        queryset = queryset.select_related(*sorted(select_related))
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches.values())
+    return queryset
+
+
+def _relation_path(model, attrs):
+    """Return the forward FK/one-to-one path walked by a list of source attributes"""
+    path = []
+    for attr in attrs:
+        try:
+            model_field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not model_field.concrete or not (model_field.many_to_one or model_field.one_to_one):
+            break
+        path.append(attr)
+        model = model_field.related_model
+    return '__'.join(path)
+
+
+def _plan_prefetch(model, source, child):
+    """Plan a Prefetch for a nested many=True serializer, loading only the columns it renders"""
+    relation = model._meta.get_field(source)
+    child_model = relation.related_model
+    child_queryset = plan_queryset(child_model.objects.all(), child.__class__)
+
+    # Column pruning is limited to plain reverse FKs: M2M prefetches need the
+    # through table columns, and joined/annotated rows need their full width
+    if relation.one_to_many and not child_queryset.query.select_related and not child_queryset.query.annotations:
+        columns = {child_model._meta.pk.attname, relation.field.attname}
+        for child_field in child.fields.values():
+            if child_field.write_only or not child_field.source_attrs:
+                continue
+            try:
+                model_field = child_model._meta.get_field(child_field.source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                columns.add(model_field.attname)
+        child_queryset = child_queryset.only(*sorted(columns))
+
+    return Prefetch(source, queryset=child_queryset)
@@ -4,7 +4,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.exceptions import PermissionDenied
-from django.db.models import Count, Q
+from django.db.models import Count, Exists, OuterRef, Prefetch
 
 from .models import (
     ProductRating, ReviewImage, ReviewVote, ProductQuestion, 
@@ -15,6 +15,11 @@ from .extended_serializers import (
     ProductQuestionSerializer, ProductAnswerSerializer
 )
 from notifications.utils import create_notification
+from marketplace.cache import cached_response
+from marketplace.pagination import KeysetCursorPagination
+from orders.models import PurchasedProduct
+from orders.purchases import has_purchased
+from .votes import cast_review_vote, vote_answer_helpful
 
 
 class ProductRatingViewSet(viewsets.ModelViewSet):
@@ -32,6 +37,7 @@ class ProductRatingViewSet(viewsets.ModelViewSet):
     """
     serializer_class = ProductRatingWithVotesSerializer
     permission_classes = [IsAuthenticated]
+    max_page_size = 50
     
     def get_queryset(self):
         """Filter ratings by product if specified"""
@@ -46,10 +52,21 @@ class ProductRatingViewSet(viewsets.ModelViewSet):
         if rating_filter:
             queryset = queryset.filter(rating=rating_filter)
         
+        # The viewer's own vote and verified purchases are resolved for the
+        # whole page, not per review
+        queryset = queryset.annotate(
+            verified_purchase=Exists(PurchasedProduct.objects.filter(
+                user=OuterRef('user'), product=OuterRef('product')
+            )),
+        ).prefetch_related('images')
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.prefetch_related(
+                Prefetch('votes', queryset=ReviewVote.objects.filter(user=user), to_attr='viewer_votes')
+            )
+        
         # Sort by helpful votes by default
-        return queryset.annotate(
-            helpful_count=Count('votes', filter=Q(votes__vote_type='helpful'))
-        ).order_by('-helpful_count', '-created_at')
+        return queryset.order_by('-helpful_votes', '-created_at')
     
     def perform_create(self, serializer):
         """Create rating and notify vendor"""
@@ -95,32 +112,11 @@ class ProductRatingViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if user already voted
-        existing_vote = ReviewVote.objects.filter(
-            review=rating,
-            user=request.user
-        ).first()
-        
-        if existing_vote:
-            # Update existing vote
-            existing_vote.vote_type = vote_type
-            existing_vote.save()
-            message = 'Vote updated'
-        else:
-            # Create new vote
-            ReviewVote.objects.create(
-                review=rating,
-                user=request.user,
-                vote_type=vote_type
-            )
-            message = 'Vote recorded'
-        
-        # Return updated counts
-        helpful_votes = rating.votes.filter(vote_type='helpful').count()
-        not_helpful_votes = rating.votes.filter(vote_type='not_helpful').count()
+        # One vote per user; the counters are updated atomically
+        previous, helpful_votes, not_helpful_votes = cast_review_vote(rating.pk, request.user, vote_type)
         
         return Response({
-            'detail': message,
+            'detail': 'Vote recorded' if previous is None else 'Vote updated',
             'helpful_votes': helpful_votes,
             'not_helpful_votes': not_helpful_votes,
             'your_vote': vote_type
@@ -168,7 +164,7 @@ class ProductQuestionViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter questions by product if specified"""
-        queryset = ProductQuestion.objects.all()
+        queryset = ProductQuestion.objects.annotate(answers_count=Count('answers'))
         
         product_id = self.request.query_params.get('product_id')
         if product_id:
@@ -234,6 +230,10 @@ class ProductAnswerViewSet(viewsets.ModelViewSet):
         is_vendor = hasattr(self.request.user, 'vendor_profile') and \
                    question.product.vendor == self.request.user.vendor_profile
         
+        # Other answers come from people who bought the product
+        if not is_vendor and not has_purchased(self.request.user, question.product_id):
+            raise PermissionDenied("Only the vendor and customers who bought this product can answer")
+        
         answer = serializer.save(
             user=self.request.user,
             question=question,
@@ -259,13 +259,12 @@ class ProductAnswerViewSet(viewsets.ModelViewSet):
         """Vote answer as helpful"""
         answer = self.get_object()
         
-        # Increment helpful votes
-        answer.helpful_votes += 1
-        answer.save()
+        # Counted once per user, with an atomic increment
+        created, helpful_votes = vote_answer_helpful(answer.pk, request.user)
         
         return Response({
-            'detail': 'Vote recorded',
-            'helpful_votes': answer.helpful_votes
+            'detail': 'Vote recorded' if created else 'You already voted for this answer',
+            'helpful_votes': helpful_votes
         })
 
 
@@ -274,25 +273,44 @@ class ProductQAListView(generics.ListAPIView):
     Convenient endpoint to get all Q&A for a product
     
     GET /api/products/{product_id}/qa/
+    
+    Questions are paginated newest first (?cursor=, ?page_size=); each comes
+    with all of its answers, most helpful first.
     """
     permission_classes = [AllowAny]
+    page_size = 20
+    max_page_size = 50
     
+    # Cached per product until one of its questions or answers changes
+    @cached_response('product-qa', tags=['product-qa:{product_id}'])
     def get(self, request, product_id):
         """Get all questions and answers for a product"""
         questions = ProductQuestion.objects.filter(product_id=product_id)
+        total_questions = questions.count()
+        
+        # One query for the page with its answer counts, one for all its answers
+        questions = questions.annotate(answers_count=Count('answers')).prefetch_related(
+            Prefetch(
+                'answers',
+                queryset=ProductAnswer.objects.select_related('user').order_by('-helpful_votes', '-created_at', 'id'),
+            )
+        ).order_by('-created_at', '-id')
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(questions, request, view=self)
         
-        qa_data = []
-        for question in questions:
-            answers = ProductAnswer.objects.filter(question=question)
-            
-            qa_data.append({
+        qa_data = [
+            {
                 'question': ProductQuestionSerializer(question).data,
-                'answers': ProductAnswerSerializer(answers, many=True).data
-            })
+                'answers': ProductAnswerSerializer(question.answers.all(), many=True).data
+            }
+            for question in page
+        ]
         
         return Response({
             'product_id': product_id,
-            'total_questions': questions.count(),
+            'total_questions': total_questions,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
             'qa': qa_data
         })
 
@@ -0,0 +1,272 @@
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, OuterRef, Subquery, Value, When
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_CONFIG = 'english'
+
+# Field weights, highest first: name > description > category > vendor store name.
+# The Python fallback scores matches with PostgreSQL's default ts_rank weights.
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+FIELD_WEIGHTS = (
+    ('name', 'A'),
+    ('description', 'B'),
+    ('category__name', 'C'),
+    ('vendor__store_name', 'D'),
+)
+
+# Upper bound on fallback hits so the id__in list stays within SQLite's limits
+MAX_FALLBACK_RESULTS = 1000
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+logger = logging.getLogger(__name__)
+
+
+def tokenize(text):
+    """Lower-cased word tokens of a string"""
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def use_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def search_vector_expression():
+    """
+    Weighted tsvector for a product row, usable in UPDATE statements
+
+    Category and vendor names come from correlated subqueries because joined
+    field references are not allowed in queryset.update().
+    """
+    from .models import Category
+    from profiles.models import VendorProfile
+
+    category_name = Subquery(Category.objects.filter(pk=OuterRef('category_id')).values('name')[:1])
+    store_name = Subquery(VendorProfile.objects.filter(pk=OuterRef('vendor_id')).values('store_name')[:1])
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='B', config=SEARCH_CONFIG)
+        + SearchVector(category_name, weight='C', config=SEARCH_CONFIG)
+        + SearchVector(store_name, weight='D', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(queryset):
+    """Refresh the search index entries for every product in the queryset"""
+    if use_postgres():
+        queryset.update(search_vector=search_vector_expression())
+    else:
+        fallback_index.update(queryset)
+
+
+def reindex_products_later(**filters):
+    """
+    Refresh the index entries of the products matching `filters` off the request path
+
+    On PostgreSQL a worker does it once the transaction commits. The fallback
+    index lives in this process, so it is updated here and now.
+    """
+    from .models import Product
+    from .tasks import reindex_products
+
+    if not use_postgres():
+        update_search_vectors(Product.objects.filter(**filters))
+        return
+
+    def enqueue():
+        try:
+            reindex_products.delay(**filters)
+        except Exception:
+            logger.exception("Could not enqueue reindexing of products matching %s; reindexing now", filters)
+            update_search_vectors(Product.objects.filter(**filters))
+
+    transaction.on_commit(enqueue)
+
+
+def remove_from_index(product_ids):
+    """Drop products from the fallback index (the tsvector column goes with the row)"""
+    if not use_postgres():
+        fallback_index.remove(product_ids)
+
+
+def build_search_query(text):
+    """
+    Prefix-matching tsquery: every term must match, the last one as a prefix
+    so that partially typed words already find results.
+
+    Returns None if the text contains no searchable terms.
+    """
+    terms = tokenize(text)
+    if not terms:
+        return None
+    raw = ' & '.join(terms[:-1] + [f'{terms[-1]}:*'])
+    return SearchQuery(raw, search_type='raw', config=SEARCH_CONFIG)
+
+
+def filter_products(queryset, text):
+    """Restrict a product queryset to search matches without changing its ordering"""
+    if use_postgres():
+        query = build_search_query(text)
+        if query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=query)
+    hits = fallback_index.search(text)[:MAX_FALLBACK_RESULTS]
+    return queryset.filter(id__in=[product_id for product_id, _ in hits])
+
+
+def search_products(queryset, text):
+    """Product queryset matching the text, annotated with `rank` and ordered best first"""
+    if use_postgres():
+        query = build_search_query(text)
+        if query is None:
+            return queryset.none()
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-created_at')
+
+    hits = fallback_index.search(text)[:MAX_FALLBACK_RESULTS]
+    if not hits:
+        return queryset.none()
+    return queryset.filter(id__in=[product_id for product_id, _ in hits]).annotate(
+        rank=Case(
+            *[When(id=product_id, then=Value(score)) for product_id, score in hits],
+            output_field=FloatField(),
+        )
+    ).order_by('-rank', '-created_at')
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Drop-in replacement for SearchFilter on product lists, backed by the
+    full-text index instead of ILIKE '%term%' scans
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        return filter_products(queryset, text)
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over product name, description, category and vendor.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class InvertedIndex:
+    """
+    In-process inverted index used when the database has no full-text search
+    (the SQLite development setup). Built lazily from the products table on the
+    first search and kept current in this process by the product signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None  # term -> {product_id: score}
+        self._terms = []       # sorted terms, for prefix lookups
+        self._documents = {}   # product_id -> set of terms
+
+    def search(self, text):
+        """Return [(product_id, score)] for products matching every term, best first"""
+        terms = tokenize(text)
+        if not terms:
+            return []
+        self._ensure_built()
+
+        with self._lock:
+            scores = None
+            for position, term in enumerate(terms):
+                # Last term matches as a prefix, like the tsquery
+                expanded = self._prefix_terms(term) if position == len(terms) - 1 else [term]
+                term_scores = defaultdict(float)
+                for match in expanded:
+                    for product_id, score in self._postings.get(match, {}).items():
+                        term_scores[product_id] = max(term_scores[product_id], score)
+                if scores is None:
+                    scores = dict(term_scores)
+                else:
+                    scores = {pid: scores[pid] + score for pid, score in term_scores.items() if pid in scores}
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda hit: -hit[1])
+
+    def update(self, queryset):
+        if self._postings is None:
+            return  # Built from the database on first search
+        rows = list(queryset.values_list('id', *[field for field, _ in FIELD_WEIGHTS]))
+        with self._lock:
+            for row in rows:
+                self._remove(row[0])
+                self._add(row)
+            self._terms = sorted(self._postings)
+
+    def remove(self, product_ids):
+        if self._postings is None:
+            return
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+            self._terms = sorted(self._postings)
+
+    def reset(self):
+        with self._lock:
+            self._postings = None
+            self._terms = []
+            self._documents = {}
+
+    def _ensure_built(self):
+        if self._postings is not None:
+            return
+        from .models import Product
+
+        rows = Product.objects.values_list('id', *[field for field, _ in FIELD_WEIGHTS])
+        with self._lock:
+            if self._postings is not None:
+                return
+            self._postings = defaultdict(dict)
+            for row in rows.iterator(chunk_size=2000):
+                self._add(row)
+            self._terms = sorted(self._postings)
+
+    def _add(self, row):
+        product_id, values = row[0], row[1:]
+        terms = set()
+        for (_, weight), value in zip(FIELD_WEIGHTS, values):
+            for term in tokenize(value):
+                postings = self._postings[term]
+                postings[product_id] = postings.get(product_id, 0.0) + WEIGHTS[weight]
+                terms.add(term)
+        self._documents[product_id] = terms
+
+    def _remove(self, product_id):
+        for term in self._documents.pop(product_id, ()):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(product_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _prefix_terms(self, prefix):
+        start = bisect_left(self._terms, prefix)
+        matches = []
+        for term in self._terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+
+
+fallback_index = InvertedIndex()
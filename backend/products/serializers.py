@@ -4,14 +4,14 @@ from .models import Category, Product, ProductImage, SKU, InventoryTransaction,
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description', 'parent', 'image', 'is_active']
+        fields = ['id', 'name', 'slug', 'description', 'parent', 'image', 'is_active', 'product_count', 'subtree_product_count']
 
 class CategoryTreeSerializer(serializers.ModelSerializer):
     children = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
-        fields = ['id', 'name', 'slug', 'description', 'image', 'children']
+        fields = ['id', 'name', 'slug', 'description', 'image', 'product_count', 'subtree_product_count', 'children']
     
     def get_children(self, obj):
         return CategoryTreeSerializer(obj.get_children(), many=True).data
@@ -31,7 +31,8 @@ class ProductSerializer(serializers.ModelSerializer):
     skus = SKUSerializer(many=True, read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     vendor_name = serializers.CharField(source='vendor.business_name', read_only=True)
-    average_rating = serializers.SerializerMethodField()
+    average_rating = serializers.FloatField(source='rating_average', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = Product
@@ -39,14 +40,8 @@ class ProductSerializer(serializers.ModelSerializer):
             'id', 'name', 'slug', 'description', 'price', 'compare_price',
             'is_featured', 'is_active', 'created_at', 'updated_at',
             'vendor', 'vendor_name', 'category', 'category_name',
-            'images', 'skus', 'average_rating'
+            'images', 'skus', 'average_rating', 'rating_count', 'rating_histogram'
         ]
-    
-    def get_average_rating(self, obj):
-        ratings = obj.ratings.all()
-        if not ratings:
-            return None
-        return sum(r.rating for r in ratings) / len(ratings)
 
 class ProductCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,236 @@
+import threading
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from mptt.signals import node_moved
+from marketplace.cache import invalidate
+from profiles.models import VendorProfile
+from .cache_tags import product_tags
+from .category_tree import bump_tree_version
+from .facets import refresh_product_facets, remove_product_facets
+from .models import Category, FlashSale, Product, ProductAnswer, ProductImage, ProductQuestion, ProductRating, SKU
+from .search import reindex_products_later, update_search_vectors, remove_from_index
+
+# Products in the middle of a delete; their cascaded SKU deletes must not
+# re-count them before the product's own post_delete removes them
+_deleting = threading.local()
+
+
+def _deleting_products():
+    if not hasattr(_deleting, 'ids'):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+def _apply_rating(product_id, rating, delta):
+    Product.objects.filter(pk=product_id).update(**Product.rating_delta(rating, delta))
+
+
+@receiver(pre_save, sender=ProductRating)
+def remember_previous_rating(sender, instance, **kwargs):
+    # Keep the stored values so post_save can move the rating between buckets
+    instance._previous_rating = None
+    if not instance._state.adding:
+        instance._previous_rating = ProductRating.objects.filter(pk=instance.pk).values_list(
+            'product_id', 'rating'
+        ).first()
+
+
+@receiver(post_save, sender=ProductRating)
+def add_rating_to_aggregates(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_rating', None)
+    if not created and previous == (instance.product_id, instance.rating):
+        return
+    if previous:
+        _apply_rating(previous[0], previous[1], -1)
+    _apply_rating(instance.product_id, instance.rating, 1)
+
+
+@receiver(post_delete, sender=ProductRating)
+def remove_rating_from_aggregates(sender, instance, **kwargs):
+    _apply_rating(instance.product_id, instance.rating, -1)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    update_search_vectors(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    remove_from_index([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def count_product_facets(sender, instance, **kwargs):
+    refresh_product_facets([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def remember_product_facets(sender, instance, **kwargs):
+    # Read the stored values; the in-memory copy may predate the last refresh
+    stored = Product.objects.filter(pk=instance.pk).values_list('facet_keys', 'category_id', 'is_active').first()
+    instance._facet_keys = stored[0] if stored else []
+    instance._counted_category_id = _counted_category(*stored[1:]) if stored else None
+    _deleting_products().add(instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product_facets(sender, instance, **kwargs):
+    _deleting_products().discard(instance.pk)
+    remove_product_facets(getattr(instance, '_facet_keys', []))
+
+
+def _counted_category(category_id, is_active):
+    """The category a product adds to in the category counts, if any"""
+    return category_id if is_active else None
+
+
+@receiver(pre_save, sender=Product)
+def remember_product_category(sender, instance, **kwargs):
+    instance._previous_counted_category_id = None
+    if not instance._state.adding:
+        stored = Product.objects.filter(pk=instance.pk).values_list('category_id', 'is_active').first()
+        if stored:
+            instance._previous_counted_category_id = _counted_category(*stored)
+
+
+@receiver(post_save, sender=Product)
+def count_product_in_category(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_counted_category_id', None)
+    current = _counted_category(instance.category_id, instance.is_active)
+    if previous == current:
+        return
+    if previous:
+        Category.add_products(previous, -1)
+    if current:
+        Category.add_products(current, 1)
+    bump_tree_version()
+    invalidate('categories')
+
+
+@receiver(post_delete, sender=Product)
+def uncount_product_in_category(sender, instance, **kwargs):
+    category_id = getattr(instance, '_counted_category_id', None)
+    if category_id:
+        Category.add_products(category_id, -1)
+        bump_tree_version()
+        invalidate('categories')
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def count_sku_attributes(sender, instance, **kwargs):
+    if instance.product_id not in _deleting_products():
+        refresh_product_facets([instance.product_id])
+
+
+@receiver(node_moved, sender=Category)
+def recount_moved_category(sender, instance, **kwargs):
+    # Sent for move_to() and for saves with a new parent. A move changes
+    # which ancestors every product in the subtree rolls up to.
+    descendants = instance.get_descendants(include_self=True)
+    refresh_product_facets(Product.objects.filter(category__in=descendants).values_list('id', flat=True))
+    Category.recompute_subtree_counts()
+
+
+@receiver(pre_save, sender=Category)
+def remember_category_name(sender, instance, **kwargs):
+    instance._previous_name = None
+    if not instance._state.adding:
+        instance._previous_name = Category.objects.filter(pk=instance.pk).values_list('name', flat=True).first()
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created, **kwargs):
+    # Category names are part of the product document; most saves keep them
+    previous = getattr(instance, '_previous_name', None)
+    if not created and previous is not None and previous != instance.name:
+        reindex_products_later(category_id=str(instance.pk))
+
+
+@receiver(pre_save, sender=VendorProfile)
+def remember_store_name(sender, instance, **kwargs):
+    instance._previous_store_name = None
+    if not instance._state.adding:
+        instance._previous_store_name = VendorProfile.objects.filter(pk=instance.pk).values_list(
+            'store_name', flat=True
+        ).first()
+
+
+@receiver(post_save, sender=VendorProfile)
+def reindex_vendor_products(sender, instance, created, **kwargs):
+    # Store names are part of the product document; most saves keep them
+    previous = getattr(instance, '_previous_store_name', None)
+    if not created and previous is not None and previous != instance.store_name:
+        reindex_products_later(vendor_id=str(instance.pk))
+
+
+@receiver(pre_delete, sender=Category)
+def remember_category_products(sender, instance, **kwargs):
+    # Products are detached with SET_NULL, which sends no product signals
+    instance._product_ids = list(Product.objects.filter(category=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+def reindex_detached_products(sender, instance, **kwargs):
+    product_ids = getattr(instance, '_product_ids', None)
+    if product_ids:
+        update_search_vectors(Product.objects.filter(id__in=product_ids))
+        refresh_product_facets(product_ids)
+    # The deleted subtree's products no longer count towards its ancestors
+    Category.recompute_subtree_counts()
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    bump_tree_version()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_responses(sender, instance, **kwargs):
+    invalidate('products', f'product:{instance.pk}')
+    if kwargs.get('signal') is post_delete:
+        # Sales list their product ids
+        invalidate('flash-sales')
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+@receiver(post_save, sender=ProductImage)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_save, sender=ProductRating)
+@receiver(post_delete, sender=ProductRating)
+def invalidate_product_detail_responses(sender, instance, **kwargs):
+    # Variants, images and rating aggregates are rendered with the product
+    invalidate(*product_tags([instance.product_id]))
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(node_moved, sender=Category)
+def invalidate_category_responses(sender, **kwargs):
+    # Product responses carry the category name
+    invalidate('categories', 'products', 'product-labels')
+
+
+@receiver(post_save, sender=FlashSale)
+@receiver(post_delete, sender=FlashSale)
+@receiver(m2m_changed, sender=FlashSale.products.through)
+def invalidate_flash_sale_responses(sender, **kwargs):
+    invalidate('flash-sales')
+
+
+@receiver(post_save, sender=ProductQuestion)
+@receiver(post_delete, sender=ProductQuestion)
+def invalidate_question_responses(sender, instance, **kwargs):
+    invalidate(f'product-qa:{instance.product_id}')
+
+
+@receiver(post_save, sender=ProductAnswer)
+@receiver(post_delete, sender=ProductAnswer)
+def invalidate_answer_responses(sender, instance, **kwargs):
+    invalidate(f'product-qa:{instance.question.product_id}')
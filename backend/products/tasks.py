@@ -0,0 +1,14 @@
+from celery import shared_task
+
+from .models import Product
+from .search import update_search_vectors
+
+
+@shared_task
+def reindex_products(**filters):
+    """
+    Celery task to refresh the search index entries of the products matching
+    some filters, e.g. after their category or store was renamed.
+    """
+    update_search_vectors(Product.objects.filter(**filters))
+    return f"Reindexed products matching {filters}"
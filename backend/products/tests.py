@@ -1,3 +1,522 @@
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import DecimalField, ExpressionWrapper, F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from accounts.models import User
+from marketplace import cache as response_cache
+from marketplace.pagination import KeysetCursorPagination
+from orders.models import PurchasedProduct
+from .models import (
+    Category, FlashSale, Product, ProductAnswer, ProductImage, ProductQuestion, ProductRating, SKU
+)
+from .search import fallback_index
+from .votes import cast_review_vote, vote_answer_helpful
+
+
+class ProductQueryCountTests(TestCase):
+    """The catalog endpoints cost a constant number of queries, however many products they render"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+        cls.vendor = vendor_user.vendor_profile
+        cls.category = Category.objects.create(name='Shoes', slug='shoes')
+        cls.customer = User.objects.create(username='customer', is_customer=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def create_products(self, count):
+        products = []
+        start = Product.objects.count()
+        for index in range(start, start + count):
+            product = Product.objects.create(
+                vendor=self.vendor, category=self.category, name=f'Product {index}',
+                slug=f'product-{index}', description='Test product', price=Decimal('10.00'),
+            )
+            SKU.objects.create(product=product, sku_code=f'SKU-{index}', stock_quantity=5)
+            ProductImage.objects.create(product=product, image='products/test.png')
+            ProductRating.objects.create(product=product, user=self.customer, rating=4)
+            products.append(product)
+        return products
+
+    def test_list_query_count_is_constant(self):
+        self.create_products(5)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/products/?page_size=50')
+        self.assertEqual(len(response.data['results']), 5)
+
+        self.create_products(20)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/products/products/?page_size=50')
+        self.assertEqual(len(response.data['results']), 25)
+
+    def test_retrieve_query_count(self):
+        product, = self.create_products(1)
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/products/products/{product.id}/')
+        self.assertEqual(response.data['average_rating'], 4.0)
+        self.assertEqual(len(response.data['skus']), 1)
+
+
+class ResponseCacheTests(TestCase):
+    """Anonymous catalog reads are cached until a change that shows in them"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        cls.shoes = Category.objects.create(name='Shoes', slug='shoes')
+        cls.boots = Category.objects.create(name='Boots', slug='boots', parent=cls.shoes)
+        cls.bags = Category.objects.create(name='Bags', slug='bags')
+        cls.boot = Product.objects.create(
+            vendor=cls.vendor, category=cls.boots, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        cls.customer = User.objects.create(username='customer', is_customer=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def cached(self, url, params=None):
+        return self.client.get(url, params)['X-Cache'] == 'HIT'
+
+    def test_repeated_read_is_served_from_the_cache(self):
+        self.assertFalse(self.cached('/api/products/products/'))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.cached('/api/products/products/'))
+        self.assertEqual(response_cache.metrics('products')['hit'], 1)
+
+    def test_rating_expires_only_the_lists_the_product_is_in(self):
+        reads = {
+            'detail': (f'/api/products/products/{self.boot.pk}/', None),
+            'category': ('/api/products/products/', {'category': self.boots.pk}),
+            'ancestor': ('/api/products/browse/', {'category': self.shoes.pk}),
+            'vendor': ('/api/products/browse/', {'vendor': self.vendor.pk}),
+            'other category': ('/api/products/browse/', {'category': self.bags.pk}),
+        }
+        for url, params in reads.values():
+            self.cached(url, params)
+
+        ProductRating.objects.create(product=self.boot, user=self.customer, rating=5)
+
+        self.assertEqual(
+            {name: self.cached(url, params) for name, (url, params) in reads.items()},
+            {'detail': False, 'category': False, 'ancestor': False, 'vendor': False, 'other category': True},
+        )
+
+    def test_product_change_expires_every_list(self):
+        self.cached('/api/products/products/')
+        self.boot.name = 'Hiking boot'
+        self.boot.save()
+        self.assertFalse(self.cached('/api/products/products/'))
+
+    def test_hot_entry_is_recomputed_before_it_expires(self):
+        self.cached('/api/products/products/')
+        with mock.patch('marketplace.cache.random.random', return_value=0.0):
+            self.assertTrue(self.cached('/api/products/products/'))
+        # A large beta stands in for an entry close to its expiry
+        with mock.patch('marketplace.cache.random.random', return_value=0.5), \
+                mock.patch('marketplace.cache.EARLY_RECOMPUTE_BETA', 1e9):
+            self.assertFalse(self.cached('/api/products/products/'))
+        self.assertEqual(response_cache.metrics('products')['early'], 1)
+
+
+class KeysetPaginationTests(TestCase):
+    """Cursor pages cover every row once, in order, across ties and NULLs, in both directions"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        for index, compare_price in enumerate(['12.50', None, '9.00', '12.50', None, '100.00', '12.50']):
+            Product.objects.create(
+                vendor=vendor, name=f'Product {index}', slug=f'product-{index}', description='Test product',
+                price=Decimal('5.00'), compare_price=compare_price and Decimal(compare_price),
+            )
+
+    def pages(self, queryset, url='/?page_size=2', link='get_next_link'):
+        pages = []
+        while url:
+            paginator = KeysetCursorPagination()
+            pages.append([product.name for product in paginator.paginate_queryset(
+                queryset, Request(APIRequestFactory().get(url))
+            )])
+            url = getattr(paginator, link)()
+        return pages
+
+    def assertPagesCover(self, queryset, *expected_ordering):
+        forward = self.pages(queryset)
+        self.assertEqual(sum(forward, []), [product.name for product in queryset.order_by(*expected_ordering)])
+        self.assertEqual(self.pages(queryset, self.last_page(queryset), 'get_previous_link'), forward[::-1])
+
+    def last_page(self, queryset):
+        url, link = None, '/?page_size=2'
+        while link:
+            url = link
+            paginator = KeysetCursorPagination()
+            paginator.paginate_queryset(queryset, Request(APIRequestFactory().get(url)))
+            link = paginator.get_next_link()
+        return url
+
+    def test_nulls_sort_highest(self):
+        self.assertPagesCover(
+            Product.objects.order_by('-compare_price'), F('compare_price').desc(nulls_first=True), '-pk',
+        )
+        self.assertPagesCover(
+            Product.objects.order_by('compare_price'), F('compare_price').asc(nulls_last=True), 'pk',
+        )
+
+    def test_annotated_decimal(self):
+        self.assertPagesCover(
+            Product.objects.annotate(
+                saving=ExpressionWrapper(F('compare_price') - F('price'), output_field=DecimalField()),
+            ).order_by('saving'),
+            F('saving').asc(nulls_last=True), 'pk',
+        )
+
+
+class CategoryReindexTests(TestCase):
+    """Products are reindexed when their category is renamed, and only then"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        cls.category = Category.objects.create(name='Shoes', slug='shoes')
+        Product.objects.create(
+            vendor=vendor, category=cls.category, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, text):
+        return [product['name'] for product in APIClient().get('/api/products/search/', {'q': text}).data['results']]
+
+    def test_rename_reindexes_products(self):
+        self.category.name = 'Footwear'
+        self.category.save()
+        self.assertEqual(self.search('footwear'), ['Boot'])
+
+    def test_other_changes_do_not_reindex(self):
+        with mock.patch.object(fallback_index, 'update') as reindex:
+            self.category.description = 'Edited in the admin'
+            self.category.save()
+        reindex.assert_not_called()
+
+    def test_worker_reindexes_after_commit(self):
+        with mock.patch('products.search.use_postgres', return_value=True), \
+                mock.patch('products.tasks.reindex_products.delay') as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.category.name = 'Footwear'
+                self.category.save()
+                delay.assert_not_called()
+        delay.assert_called_once_with(category_id=str(self.category.pk))
+
+
+class AttributeFilterTests(TestCase):
+    """Browse attribute filters match SKU attributes stored as JSON strings, numbers and booleans"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        cls.customer = User.objects.create(username='customer', is_customer=True)
+        cls.products = {}
+        for name, attributes in (('text', {'size': 'M'}), ('number', {'size': 42}), ('boolean', {'waterproof': True})):
+            product = Product.objects.create(
+                vendor=vendor, name=name, slug=name, description='Test product', price=Decimal('10.00'),
+            )
+            SKU.objects.create(product=product, sku_code=name, stock_quantity=5, attributes=attributes)
+            cls.products[name] = str(product.id)
+
+    def browse(self, *attributes):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.get('/api/products/browse/', {'attribute': list(attributes)})
+        return {product['id'] for product in response.data['results']}
+
+    def test_string_attribute(self):
+        self.assertEqual(self.browse('size:M'), {self.products['text']})
+
+    def test_number_attribute(self):
+        self.assertEqual(self.browse('size:42'), {self.products['number']})
+
+    def test_boolean_attribute(self):
+        self.assertEqual(self.browse('waterproof:true'), {self.products['boolean']})
+
+    def test_values_of_one_attribute_are_alternatives(self):
+        self.assertEqual(self.browse('size:M', 'size:42'), {self.products['text'], self.products['number']})
+
+
+class CategoryProductCountTests(TestCase):
+    """Saving a category never writes back its product counters"""
+
+    def test_stale_save_keeps_counts(self):
+        category = Category.objects.create(name='Shoes', slug='shoes')
+        stale = Category.objects.get(pk=category.pk)
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        Product.objects.create(
+            vendor=vendor, category=category, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+
+        stale.description = 'Edited in the admin'
+        stale.save()
+
+        category.refresh_from_db()
+        self.assertEqual(category.description, 'Edited in the admin')
+        self.assertEqual((category.product_count, category.subtree_product_count), (1, 1))
+
+    def test_save_of_counters_only_is_skipped(self):
+        category = Category.objects.create(name='Shoes', slug='shoes')
+        category.product_count = 5
+        category.save(update_fields=['product_count'])
+        category.refresh_from_db()
+        self.assertEqual(category.product_count, 0)
+
+
+class CategoryTreeTests(TestCase):
+    """The category tree is built from one query, cached, and revalidated with its ETag"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.shoes = Category.objects.create(name='Shoes', slug='shoes')
+        boots = Category.objects.create(name='Boots', slug='boots', parent=cls.shoes)
+        Category.objects.create(name='Hiking', slug='hiking', parent=boots)
+        Category.objects.create(name='Bags', slug='bags')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def tree(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/products/categories/tree/', **headers)
+
+    def test_tree_is_built_from_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.tree()
+        self.assertEqual([root['name'] for root in response.data], ['Bags', 'Shoes'])
+        self.assertEqual(response.data[1]['children'][0]['children'][0]['name'], 'Hiking')
+
+    def test_current_copy_is_not_modified(self):
+        etag = self.tree()['ETag']
+        with self.assertNumQueries(0):
+            response = self.tree(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_change_invalidates_the_tree(self):
+        etag = self.tree()['ETag']
+        shoes = Category.objects.get(pk=self.shoes.pk)
+        shoes.name = 'Footwear'
+        shoes.save()
+
+        response = self.tree(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual([root['name'] for root in response.data], ['Bags', 'Footwear'])
+
+
+class FlashSaleAnnounceTests(TestCase):
+    """Only vendors with products in a sale, or staff, can announce it"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create(username='owner', is_vendor=True, is_customer=False)
+        cls.other = User.objects.create(username='other', is_vendor=True, is_customer=False)
+        product = Product.objects.create(
+            vendor=cls.owner.vendor_profile, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        cls.sale = FlashSale.objects.create(
+            name='Boot sale', discount_percentage=Decimal('20.00'),
+            start_time=timezone.now(), end_time=timezone.now() + timedelta(days=1),
+        )
+        cls.sale.products.add(product)
+
+    def setUp(self):
+        cache.clear()
+
+    def announce(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post(f'/api/products/flash-sales/{self.sale.id}/announce/')
+
+    def test_other_vendor_cannot_announce(self):
+        self.assertEqual(self.announce(self.other).status_code, 403)
+
+    def test_owner_announces_once(self):
+        self.assertEqual(self.announce(self.owner).status_code, 202)
+        self.assertEqual(self.announce(self.owner).status_code, 409)
+        self.sale.refresh_from_db()
+        self.assertIsNotNone(self.sale.announced_at)
+
+    def test_failed_enqueue_can_be_retried(self):
+        with mock.patch('products.promotion_views.notify_audience', side_effect=ConnectionError('broker down')), \
+                self.assertLogs('products.promotion_views', 'ERROR'):
+            self.assertEqual(self.announce(self.owner).status_code, 503)
+        self.sale.refresh_from_db()
+        self.assertIsNone(self.sale.announced_at)
+        with mock.patch('products.promotion_views.notify_audience') as notify:
+            self.assertEqual(self.announce(self.owner).status_code, 202)
+        notify.assert_called_once()
+
+
+class VoteCounterTests(TestCase):
+    """Saving a review or answer never writes back its vote counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+        cls.customer = User.objects.create(username='customer', is_customer=True)
+        cls.voter = User.objects.create(username='voter', is_customer=True)
+        product = Product.objects.create(
+            vendor=vendor_user.vendor_profile, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        cls.review = ProductRating.objects.create(product=product, user=cls.customer, rating=4)
+        question = ProductQuestion.objects.create(product=product, user=cls.customer, question='Waterproof?')
+        cls.answer = ProductAnswer.objects.create(question=question, user=vendor_user, answer='Yes', is_vendor=True)
+
+    def test_stale_review_save_keeps_votes(self):
+        stale = ProductRating.objects.get(pk=self.review.pk)
+        cast_review_vote(self.review.pk, self.voter, 'helpful')
+
+        stale.review = 'Edited'
+        stale.save()
+
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.review, 'Edited')
+        self.assertEqual((self.review.helpful_votes, self.review.not_helpful_votes), (1, 0))
+
+    def test_stale_answer_save_keeps_votes(self):
+        stale = ProductAnswer.objects.get(pk=self.answer.pk)
+        vote_answer_helpful(self.answer.pk, self.voter)
+
+        stale.answer = 'Yes, fully'
+        stale.save()
+
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.answer, 'Yes, fully')
+        self.assertEqual(self.answer.helpful_votes, 1)
+
+
+class ReviewListTests(TestCase):
+    """A page of reviews resolves votes and verified purchases in a constant number of queries"""
+
+    @classmethod
+    def setUpTestData(cls):
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        cls.product = Product.objects.create(
+            vendor=vendor, name='Boot', slug='boot', description='Test product', price=Decimal('10.00'),
+        )
+        cls.viewer = User.objects.create(username='viewer', is_customer=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def add_reviews(self, count):
+        start = ProductRating.objects.count()
+        reviews = []
+        for index in range(start, start + count):
+            author = User.objects.create(username=f'author-{index}', is_customer=True)
+            reviews.append(ProductRating.objects.create(product=self.product, user=author, rating=4))
+            if index % 2:
+                PurchasedProduct.objects.create(user=author, product=self.product, purchased_at=timezone.now())
+        return reviews
+
+    def reviews(self):
+        response = self.client.get('/api/products/ratings/', {'product_id': self.product.pk, 'page_size': 50})
+        return {review['id']: review for review in response.data['results']}
+
+    def test_query_count_is_constant(self):
+        self.add_reviews(2)
+        with CaptureQueriesContext(connection) as few:
+            self.reviews()
+        self.add_reviews(10)
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(len(self.reviews()), 12)
+        self.assertEqual(len(few), len(many))
+
+    def test_viewer_votes_and_purchases(self):
+        first, second = self.add_reviews(2)
+        cast_review_vote(second.pk, self.viewer, 'helpful')
+
+        reviews = self.reviews()
+
+        self.assertEqual(
+            (reviews[str(first.pk)]['user_vote'], reviews[str(first.pk)]['is_verified_purchase']), (None, False),
+        )
+        self.assertEqual(
+            (reviews[str(second.pk)]['user_vote'], reviews[str(second.pk)]['is_verified_purchase']),
+            ('helpful', True),
+        )
+        self.assertEqual(reviews[str(second.pk)]['helpful_votes'], 1)
+
+
+class ProductQATests(TestCase):
+    """A product's Q&A page costs a constant number of queries and is cached until it changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+        cls.product = Product.objects.create(
+            vendor=cls.vendor_user.vendor_profile, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        cls.customer = User.objects.create(username='customer', is_customer=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def ask(self, count, answers=2):
+        for index in range(count):
+            question = ProductQuestion.objects.create(product=self.product, user=self.customer, question=f'Q{index}')
+            for _ in range(answers):
+                ProductAnswer.objects.create(question=question, user=self.vendor_user, answer='Yes', is_vendor=True)
+
+    def qa(self):
+        return APIClient().get(f'/api/products/products/{self.product.pk}/qa/')
+
+    def test_query_count_is_constant(self):
+        self.ask(1)
+        with CaptureQueriesContext(connection) as few:
+            self.qa()
+        cache.clear()
+        self.ask(10)
+        with CaptureQueriesContext(connection) as many:
+            response = self.qa()
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(response.data['qa']), 11)
+        self.assertEqual({len(item['answers']) for item in response.data['qa']}, {2})
+
+    def test_most_helpful_answer_first(self):
+        self.ask(1, answers=0)
+        question = ProductQuestion.objects.get()
+        ProductAnswer.objects.create(question=question, user=self.customer, answer='Maybe')
+        helpful = ProductAnswer.objects.create(question=question, user=self.vendor_user, answer='Yes', is_vendor=True)
+        vote_answer_helpful(helpful.pk, self.customer)
+
+        answers = self.qa().data['qa'][0]['answers']
+        self.assertEqual([answer['answer'] for answer in answers], ['Yes', 'Maybe'])
 
-# Create your tests here.
+    def test_new_answer_expires_the_cached_page(self):
+        self.ask(1, answers=0)
+        self.qa()
+        with self.assertNumQueries(0):
+            self.qa()
+        ProductAnswer.objects.create(question=ProductQuestion.objects.get(), user=self.vendor_user, answer='Yes')
+        self.assertEqual(len(self.qa().data['qa'][0]['answers']), 1)
@@ -30,6 +30,8 @@ router.register(r'badges', ProductBadgeViewSet, basename='badge')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('search/', views.ProductSearchView.as_view(), name='product-search'),
+    path('browse/', views.FacetedProductView.as_view(), name='product-browse'),
     path('product-images/', views.ProductImageView.as_view(), name='product-images'),
     path('products/<uuid:product_id>/qa/', ProductQAListView.as_view(), name='product-qa'),
 ]
\ No newline at end of file
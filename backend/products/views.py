@@ -1,18 +1,31 @@
-from rest_framework import viewsets, permissions, filters, status, generics
+from rest_framework import viewsets, permissions, filters, status, generics, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Avg
+from django.db.models import Avg, Exists, OuterRef
+from django.db.models.fields.json import KeyTransform
+from django.shortcuts import get_object_or_404
+from django.utils.cache import quote_etag
+from django.utils.http import parse_etags
+import json
+import uuid
 
 from .models import Category, Product, ProductImage, SKU, InventoryTransaction, ProductRating, Wishlist, BulkDiscount, ProductComment
 from .serializers import (
-    CategorySerializer, CategoryTreeSerializer, ProductSerializer, 
+    CategorySerializer, ProductSerializer, 
     ProductCreateUpdateSerializer, ProductImageSerializer, SKUSerializer,
     InventoryTransactionSerializer, ProductRatingSerializer, WishlistSerializer,
     BulkDiscountSerializer, ProductCommentSerializer
 )
 from .permissions import IsVendorAndOwner
+from .query_planner import plan_queryset
+from .search import ProductSearchFilter, search_products
+from .cache_tags import scope_tags
+from .category_tree import get_category_tree
+from .facets import facet_counts, price_bucket_filter, PRICE_BUCKETS
+from marketplace.cache import cached_response
+from marketplace.pagination import RankedResultsPagination
 from profiles.permissions import IsVendor, IsCustomer
 
 class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
@@ -25,30 +38,59 @@ class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['name', 'description']
     permission_classes = [permissions.AllowAny]
     
+    @cached_response('categories', tags=['categories'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cached_response('categories', tags=['categories'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     @action(detail=False, methods=['get'])
     def tree(self, request):
         """
         Return categories in a hierarchical tree structure.
+        
+        The tree is cached until a category changes; clients revalidate with
+        If-None-Match and get a 304 when their copy is current.
         """
-        root_categories = Category.objects.filter(parent=None, is_active=True)
-        serializer = CategoryTreeSerializer(root_categories, many=True)
-        return Response(serializer.data)
+        data, etag = get_category_tree()
+        quoted_etag = quote_etag(etag)
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match and (if_none_match.strip() == '*' or quoted_etag in parse_etags(if_none_match)):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = quoted_etag
+        response['Cache-Control'] = 'no-cache'
+        return response
 
 class ProductViewSet(viewsets.ModelViewSet):
     """
     API endpoint for managing products.
     """
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, ProductSearchFilter, filters.OrderingFilter]
     filterset_fields = ['category', 'is_featured', 'is_active']
-    search_fields = ['name', 'description']
     ordering_fields = ['name', 'price', 'created_at']
     ordering = ['-created_at']
     
+    @cached_response('products', tags=['products'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    def get_cache_tags(self, request):
+        return scope_tags(request.query_params, ['category']) if self.action == 'list' else []
+    
+    # product-labels covers the category and store names rendered on the product
+    @cached_response('products', tags=['product:{pk}', 'product-labels'])
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
     def get_queryset(self):
         # For list and retrieve actions, show all active products to everyone
         if self.action in ['list', 'retrieve']:
             # Everyone (including vendors) see all active products for browsing
-            return Product.objects.filter(is_active=True)
+            return plan_queryset(Product.objects.filter(is_active=True), self.get_serializer_class())
         
         # For other actions (create, update, delete), vendors only see their own products
         if self.request.user.is_authenticated and hasattr(self.request.user, 'vendor_profile'):
@@ -70,6 +112,110 @@ class ProductViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.AllowAny]
         return [permission() for permission in permission_classes]
 
+class ProductSearchView(generics.ListAPIView):
+    """
+    API endpoint for relevance-ranked product search.
+    
+    GET /api/products/search/?q=wireless head
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = RankedResultsPagination
+    
+    @cached_response('product-search', tags=['products'])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    def get_queryset(self):
+        text = self.request.query_params.get('q', '').strip()
+        if not text:
+            return Product.objects.none()
+        queryset = search_products(Product.objects.filter(is_active=True), text)
+        return plan_queryset(queryset, ProductSerializer)
+
+class FacetedProductView(generics.ListAPIView):
+    """
+    API endpoint for faceted catalog browsing.
+    
+    GET /api/products/browse/?category=<id>&vendor=<id>&price=25-50&attribute=color:red&search=...
+    
+    Returns a page of matching products plus the facet counts for the selected
+    category subtree (or the whole catalog) in one response. The counts are
+    read from the precomputed FacetCount table, so they describe the category
+    scope and do not narrow as vendor, price or attribute filters are added.
+    Repeating a parameter ORs its values; different parameters are ANDed.
+    """
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny]
+    filter_backends = [ProductSearchFilter]
+    
+    def get_category(self):
+        if not hasattr(self, '_category'):
+            category_id = self.request.query_params.get('category')
+            self._category = None
+            if category_id:
+                self._category = get_object_or_404(
+                    Category, pk=self._parse_ids([category_id], 'category')[0], is_active=True
+                )
+        return self._category
+    
+    def get_queryset(self):
+        params = self.request.query_params
+        queryset = Product.objects.filter(is_active=True)
+        
+        category = self.get_category()
+        if category:
+            queryset = queryset.filter(category__in=category.get_descendants(include_self=True))
+        
+        vendors = params.getlist('vendor')
+        if vendors:
+            queryset = queryset.filter(vendor_id__in=self._parse_ids(vendors, 'vendor'))
+        
+        bucket_labels = {label for label, _, _ in PRICE_BUCKETS}
+        prices = [label for label in params.getlist('price') if label in bucket_labels]
+        if prices:
+            queryset = queryset.filter(price_bucket_filter(prices))
+        
+        attributes = {}
+        for item in params.getlist('attribute'):
+            name, _, value = item.partition(':')
+            if name and value:
+                attributes.setdefault(name, []).extend(self._attribute_candidates(value))
+        for name, values in attributes.items():
+            queryset = queryset.filter(Exists(
+                SKU.objects.annotate(attribute_value=KeyTransform(name, 'attributes')).filter(
+                    product=OuterRef('pk'), is_active=True, attribute_value__in=values
+                )
+            ))
+        
+        return plan_queryset(queryset, ProductSerializer)
+    
+    @cached_response('product-browse', tags=['products', 'categories'])
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        response.data['facets'] = facet_counts(self.get_category())
+        return response
+    
+    def get_cache_tags(self, request):
+        return scope_tags(request.query_params)
+    
+    def _attribute_candidates(self, value):
+        # Facet values are strings; match numbers and booleans stored as JSON too
+        candidates = [value]
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return candidates
+        if isinstance(parsed, (bool, int, float)):
+            candidates.append(parsed)
+        return candidates
+    
+    def _parse_ids(self, values, param):
+        try:
+            return [uuid.UUID(value) for value in values]
+        except ValueError:
+            raise serializers.ValidationError({param: 'Must be a valid UUID.'})
+
 class ProductImageView(generics.CreateAPIView, generics.DestroyAPIView):
     """
     API endpoint for adding and removing product images.
@@ -183,7 +329,10 @@ class WishlistViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Return wishlists for the current user only"""
-        return Wishlist.objects.filter(user=self.request.user)
+        queryset = Wishlist.objects.filter(user=self.request.user)
+        if self.action in ['list', 'retrieve']:
+            return plan_queryset(queryset, WishlistSerializer)
+        return queryset
     
     @action(detail=True, methods=['post'])
     def add_product(self, request, pk=None):
@@ -0,0 +1,112 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from marketplace.cache import invalidate
+from .models import AnswerVote, ProductAnswer, ProductRating, ReviewVote
+
+# ReviewVote.vote_type -> ProductRating counter column
+REVIEW_VOTE_FIELDS = {
+    'helpful': 'helpful_votes',
+    'not_helpful': 'not_helpful_votes',
+}
+
+
+def cast_review_vote(review_id, user, vote_type):
+    """
+    Record or change a user's vote on a review and adjust its counters
+
+    The vote row is the source of truth and is unique per (review, user);
+    the counters move with F() updates in the same transaction, so
+    concurrent votes never lose an increment and a user is counted once.
+
+    Args:
+        review_id: ProductRating ID
+        user: Voting user
+        vote_type: 'helpful' or 'not_helpful'
+
+    Returns:
+        Tuple of (previous vote type or None, helpful votes, not helpful votes)
+
+    Raises:
+        ValueError: for an unknown vote type
+    """
+    if vote_type not in REVIEW_VOTE_FIELDS:
+        raise ValueError(f"Unknown vote type: {vote_type}")
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                ReviewVote.objects.create(review_id=review_id, user=user, vote_type=vote_type)
+            previous = None
+        except IntegrityError:
+            # Already voted; the row lock orders this user's concurrent changes
+            vote = ReviewVote.objects.select_for_update().get(review_id=review_id, user=user)
+            previous = vote.vote_type
+            if previous != vote_type:
+                ReviewVote.objects.filter(pk=vote.pk).update(vote_type=vote_type)
+
+        if previous != vote_type:
+            changes = {REVIEW_VOTE_FIELDS[vote_type]: F(REVIEW_VOTE_FIELDS[vote_type]) + 1}
+            if previous is not None:
+                changes[REVIEW_VOTE_FIELDS[previous]] = F(REVIEW_VOTE_FIELDS[previous]) - 1
+            ProductRating.objects.filter(pk=review_id).update(**changes)
+        helpful, not_helpful = ProductRating.objects.filter(pk=review_id).values_list(
+            'helpful_votes', 'not_helpful_votes'
+        ).get()
+    return previous, helpful, not_helpful
+
+
+def vote_answer_helpful(answer_id, user):
+    """
+    Count a user's helpful vote on an answer, once per user
+
+    Returns:
+        Tuple of (whether this vote was new, helpful votes)
+    """
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                AnswerVote.objects.create(answer_id=answer_id, user=user)
+            created = True
+        except IntegrityError:
+            created = False
+        if created:
+            ProductAnswer.objects.filter(pk=answer_id).update(helpful_votes=F('helpful_votes') + 1)
+        helpful, product_id = ProductAnswer.objects.filter(pk=answer_id).values_list(
+            'helpful_votes', 'question__product_id'
+        ).get()
+    if created:
+        # update() sends no signals; cached Q&A pages show the counts
+        invalidate(f'product-qa:{product_id}')
+    return created, helpful
+
+
+def rebuild_vote_counts(batch_size=1000):
+    """
+    Recompute review and answer vote counters from the vote rows
+
+    Answers voted on before votes were recorded per user lose those
+    anonymous votes.
+
+    Returns:
+        Tuple of (reviews corrected, answers corrected)
+    """
+    reviews = ProductRating.objects.annotate(
+        helpful=Count('votes', filter=Q(votes__vote_type='helpful')),
+        not_helpful=Count('votes', filter=Q(votes__vote_type='not_helpful')),
+    ).exclude(helpful=F('helpful_votes'), not_helpful=F('not_helpful_votes'))
+    answers = ProductAnswer.objects.annotate(helpful=Count('votes')).exclude(helpful=F('helpful_votes'))
+
+    corrected_reviews = []
+    for review in reviews.only('id').iterator(chunk_size=batch_size):
+        review.helpful_votes, review.not_helpful_votes = review.helpful, review.not_helpful
+        corrected_reviews.append(review)
+    ProductRating.objects.bulk_update(corrected_reviews, ['helpful_votes', 'not_helpful_votes'], batch_size=batch_size)
+
+    corrected_answers = []
+    for answer in answers.only('id', 'question__product_id').select_related('question').iterator(chunk_size=batch_size):
+        answer.helpful_votes = answer.helpful
+        corrected_answers.append(answer)
+    ProductAnswer.objects.bulk_update(corrected_answers, ['helpful_votes'], batch_size=batch_size)
+    if corrected_answers:
+        invalidate(*{f'product-qa:{answer.question.product_id}' for answer in corrected_answers})
+    return len(corrected_reviews), len(corrected_answers)
@@ -2,13 +2,19 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Avg, Q, F, DecimalField, ExpressionWrapper
+from django.db.models import (
+    Sum, Count, Avg, Q, F, Case, When, Value, DecimalField, IntegerField, ExpressionWrapper, OuterRef, Subquery,
+)
+from django.db.models.functions import Cast, Coalesce, Round
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from datetime import timedelta, datetime
 from decimal import Decimal
 
-from orders.models import VendorOrder, OrderItem
-from products.models import Product, SKU
+from orders.models import VendorOrder, OrderItem, VendorRevenueDay
+from orders.purchases import refresh_purchases
+from orders.rollups import PAID_STATUSES
+from products.models import InventoryTransaction, Product, ProductRating, SKU
 from .models import VendorProfile
 from .permissions import IsVendor
 from .dashboard_serializers import (
@@ -21,7 +27,138 @@ from .dashboard_serializers import (
     RevenueReportSerializer,
     VendorOrderItemSerializer
 )
+from notifications.push import push_order_update
 from notifications.utils import create_notification
+from marketplace.exports import CHUNK_SIZE, stream_export
+from marketplace.pagination import KeysetCursorPagination
+from marketplace.timeseries import get_timezone, last_periods, time_series
+
+# Query parameter giving each report period's length, its default and its maximum
+REPORT_LENGTHS = {
+    'daily': ('days', 30, 366),
+    'weekly': ('weeks', 12, 260),
+    'monthly': ('months', 12, 120),
+    'quarterly': ('quarters', 4, 40),
+}
+
+
+PERFORMANCE_FIELDS = (
+    'product_id', 'product_name', 'total_sold', 'total_revenue',
+    'current_stock', 'average_rating', 'total_reviews',
+)
+
+
+def date_window(start=None, end=None, names=('start', 'end')):
+    """
+    Lookups bounding a timestamp to whole days, in the current time zone
+    
+    Args:
+        start: First day (YYYY-MM-DD or date) to include, optional
+        end: Last day (YYYY-MM-DD or date) to include, optional
+        names: Parameter names of start and end, for error messages
+    
+    Returns:
+        Dict of 'gte' and/or 'lt' lookups to timezone-aware datetimes
+    
+    Raises:
+        ValueError: for a malformed date
+    """
+    window = {}
+    for name, value, lookup in ((names[0], start, 'gte'), (names[1], end, 'lt')):
+        if not value:
+            continue
+        day = parse_date(value) if isinstance(value, str) else value
+        if day is None:
+            raise ValueError(f"Invalid {name} date. Use YYYY-MM-DD")
+        if lookup == 'lt':
+            day += timedelta(days=1)
+        window[lookup] = datetime.combine(day, datetime.min.time(), tzinfo=timezone.get_current_timezone())
+    return window
+
+
+def low_stock_skus(vendor, threshold):
+    """
+    Active SKUs of a vendor with fewer than `threshold` units in stock
+    
+    Raises:
+        ValueError: if threshold is not an integer
+    """
+    try:
+        threshold = int(threshold)
+    except (TypeError, ValueError):
+        raise ValueError("threshold must be an integer")
+    return SKU.objects.filter(product__vendor=vendor, stock_quantity__lt=threshold, is_active=True)
+
+
+def _product_total(queryset, aggregate, output_field):
+    """Per-product aggregate of `queryset` as a correlated subquery, 0 when empty"""
+    total = queryset.filter(product=OuterRef('pk')).order_by().values('product').annotate(total=aggregate)
+    return Coalesce(Subquery(total.values('total'), output_field=output_field), Value(0), output_field=output_field)
+
+
+def product_performance_queryset(vendor, start=None, end=None, sort='-total_sold'):
+    """
+    One row per vendor product with its sales, revenue, rating and stock
+    
+    Each metric is its own correlated subquery. Joining order items, SKUs and
+    ratings into one GROUP BY would multiply the rows and inflate the sums.
+    
+    Args:
+        vendor: VendorProfile
+        start: First day (YYYY-MM-DD) of sales and ratings to count, optional
+        end: Last day (YYYY-MM-DD) of sales and ratings to count, optional
+        sort: One of PERFORMANCE_FIELDS, optionally prefixed with '-'
+    
+    Returns:
+        Queryset of dicts keyed by PERFORMANCE_FIELDS
+    
+    Raises:
+        ValueError: for malformed dates or an unknown sort key
+    """
+    window = date_window(start, end)  # created_at lookups bounding sales and ratings
+    
+    sort_field = sort.lstrip('-')
+    if sort_field not in PERFORMANCE_FIELDS:
+        raise ValueError(f"Invalid sort. Use one of: {', '.join(PERFORMANCE_FIELDS)}")
+    
+    money = DecimalField(max_digits=14, decimal_places=2)
+    sold_items = OrderItem.objects.filter(
+        vendor_order__status__in=PAID_STATUSES,
+        **{f'order__created_at__{lookup}': bound for lookup, bound in window.items()},
+    )
+    
+    products = Product.objects.filter(vendor=vendor).annotate(
+        product_id=F('id'),
+        product_name=F('name'),
+        total_sold=_product_total(sold_items, Sum('quantity'), IntegerField()),
+        total_revenue=_product_total(
+            sold_items, Sum(ExpressionWrapper(F('quantity') * F('unit_price'), output_field=money)), money
+        ),
+        current_stock=_product_total(SKU.objects.all(), Sum('stock_quantity'), IntegerField()),
+    )
+    if window:
+        ratings = ProductRating.objects.filter(**{f'created_at__{lookup}': bound for lookup, bound in window.items()})
+        products = products.annotate(
+            total_reviews=_product_total(ratings, Count('id'), IntegerField()),
+            average_rating=Subquery(
+                ratings.filter(product=OuterRef('pk')).order_by().values('product')
+                .annotate(average=Round(Avg('rating', output_field=money), 2)).values('average'),
+                output_field=money,
+            ),
+        )
+    else:
+        # Lifetime ratings are kept on the product itself
+        products = products.annotate(
+            total_reviews=F('rating_count'),
+            average_rating=Case(
+                When(rating_count=0, then=Value(None)),
+                default=Round(Cast('rating_sum', money) / F('rating_count'), 2),
+                output_field=money,
+            ),
+        )
+    
+    ordering = F(sort_field).desc(nulls_last=True) if sort.startswith('-') else F(sort_field).asc(nulls_last=True)
+    return products.values(*PERFORMANCE_FIELDS).order_by(ordering, 'id')
 
 
 class VendorDashboardViewSet(viewsets.ViewSet):
@@ -29,6 +166,7 @@ class VendorDashboardViewSet(viewsets.ViewSet):
     ViewSet for vendor dashboard operations
     """
     permission_classes = [IsAuthenticated, IsVendor]
+    max_page_size = 200
     
     def get_vendor_profile(self, request):
         """Helper method to get vendor profile"""
@@ -36,6 +174,59 @@ class VendorDashboardViewSet(viewsets.ViewSet):
             return None
         return request.user.vendor_profile
     
+    def filter_vendor_orders(self, queryset, params, prefix=''):
+        """
+        Apply the status, search and start_date/end_date filters of the orders list
+        
+        Args:
+            queryset: Queryset of VendorOrder, or of a model related to it
+            params: Query parameters
+            prefix: Lookup path from the queryset's model to VendorOrder, e.g. 'vendor_order__'
+        
+        Raises:
+            ValueError: for a malformed start_date or end_date
+        """
+        # Filter by status
+        status_filter = params.get('status')
+        if status_filter:
+            queryset = queryset.filter(**{f'{prefix}status': status_filter})
+        
+        # Search by customer name/email
+        search = params.get('search')
+        if search:
+            queryset = queryset.filter(
+                Q(**{f'{prefix}order__user__first_name__icontains': search}) |
+                Q(**{f'{prefix}order__user__last_name__icontains': search}) |
+                Q(**{f'{prefix}order__user__email__icontains': search}) |
+                Q(**{f'{prefix}order__guest_name__icontains': search}) |
+                Q(**{f'{prefix}order__guest_email__icontains': search})
+            )
+        
+        # Date range filter, whole days inclusive
+        window = date_window(params.get('start_date'), params.get('end_date'), names=('start_date', 'end_date'))
+        return queryset.filter(**{f'{prefix}order__created_at__{lookup}': bound for lookup, bound in window.items()})
+    
+    def export(self, request, rows, columns, filename):
+        """
+        Stream rows in the requested output format (csv or ndjson), gzipped if gzip=1
+        
+        Args:
+            rows: Queryset of dicts, from values()
+            columns: Sequence of (key, header) pairs
+            filename: Download name, without extension
+        """
+        compress = request.query_params.get('gzip', '').lower() in ('1', 'true', 'yes')
+        try:
+            return stream_export(
+                rows.iterator(chunk_size=CHUNK_SIZE),
+                columns,
+                f'{filename}-{timezone.localdate():%Y%m%d}',
+                export_format=request.query_params.get('output', 'csv'),
+                compress=compress,
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """
@@ -46,31 +237,32 @@ class VendorDashboardViewSet(viewsets.ViewSet):
         if not vendor:
             return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        # Calculate date ranges
-        now = timezone.now()
-        start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        # Calculate date ranges, in the days the revenue rollups are kept in
+        today = timezone.localdate()
+        start_of_month = today.replace(day=1)
         start_of_last_month = (start_of_month - timedelta(days=1)).replace(day=1)
-        end_of_last_month = start_of_month - timedelta(seconds=1)
-        
-        # Get all vendor orders
-        all_orders = VendorOrder.objects.filter(vendor=vendor)
-        
-        # Total revenue (all paid orders)
-        total_revenue = all_orders.filter(
-            status__in=['paid', 'processing', 'shipped', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-        
-        # Total orders
-        total_orders = all_orders.count()
-        
-        # Pending orders
-        pending_orders = all_orders.filter(status='pending').count()
-        
+
+        # Order totals come from the daily rollups: a few rows per day
+        # instead of the vendor's whole order history
+        paid = Q(status__in=PAID_STATUSES)
+        this_month = Q(date__gte=start_of_month)
+        last_month = Q(date__gte=start_of_last_month, date__lt=start_of_month)
+        totals = VendorRevenueDay.objects.filter(vendor=vendor).aggregate(
+            total_revenue=Sum('revenue', filter=paid),
+            total_orders=Sum('orders'),
+            pending_orders=Sum('orders', filter=Q(status='pending')),
+            revenue_this_month=Sum('revenue', filter=paid & this_month),
+            orders_this_month=Sum('orders', filter=this_month),
+            revenue_last_month=Sum('revenue', filter=paid & last_month),
+            orders_last_month=Sum('orders', filter=last_month),
+        )
+
         # Product stats
-        all_products = Product.objects.filter(vendor=vendor)
-        total_products = all_products.count()
-        active_products = all_products.filter(is_active=True).count()
-        
+        products = Product.objects.filter(vendor=vendor).aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True)),
+        )
+
         # Low stock products (less than 10 items)
         low_stock_products = SKU.objects.filter(
             product__vendor=vendor,
@@ -78,36 +270,19 @@ class VendorDashboardViewSet(viewsets.ViewSet):
             is_active=True
         ).count()
         
-        # This month's stats
-        this_month_orders = all_orders.filter(order__created_at__gte=start_of_month)
-        revenue_this_month = this_month_orders.filter(
-            status__in=['paid', 'processing', 'shipped', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-        orders_this_month = this_month_orders.count()
-        
-        # Last month's stats
-        last_month_orders = all_orders.filter(
-            order__created_at__gte=start_of_last_month,
-            order__created_at__lte=end_of_last_month
-        )
-        revenue_last_month = last_month_orders.filter(
-            status__in=['paid', 'processing', 'shipped', 'delivered']
-        ).aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-        orders_last_month = last_month_orders.count()
-        
         stats_data = {
-            'total_revenue': total_revenue,
-            'total_orders': total_orders,
-            'pending_orders': pending_orders,
-            'total_products': total_products,
-            'active_products': active_products,
+            'total_revenue': totals['total_revenue'] or Decimal('0.00'),
+            'total_orders': totals['total_orders'] or 0,
+            'pending_orders': totals['pending_orders'] or 0,
+            'total_products': products['total'],
+            'active_products': products['active'],
             'low_stock_products': low_stock_products,
             'average_rating': vendor.average_rating,
             'total_reviews': vendor.total_reviews,
-            'revenue_this_month': revenue_this_month,
-            'revenue_last_month': revenue_last_month,
-            'orders_this_month': orders_this_month,
-            'orders_last_month': orders_last_month,
+            'revenue_this_month': totals['revenue_this_month'] or Decimal('0.00'),
+            'revenue_last_month': totals['revenue_last_month'] or Decimal('0.00'),
+            'orders_this_month': totals['orders_this_month'] or 0,
+            'orders_last_month': totals['orders_last_month'] or 0,
         }
         
         serializer = VendorDashboardStatsSerializer(stats_data)
@@ -126,50 +301,21 @@ class VendorDashboardViewSet(viewsets.ViewSet):
         # Get all vendor orders
         queryset = VendorOrder.objects.filter(vendor=vendor).select_related(
             'order', 'order__user'
-        ).prefetch_related('items').order_by('-order__created_at')
-        
-        # Filter by status
-        status_filter = request.query_params.get('status')
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
-        
-        # Search by customer name/email
-        search = request.query_params.get('search')
-        if search:
-            queryset = queryset.filter(
-                Q(order__user__first_name__icontains=search) |
-                Q(order__user__last_name__icontains=search) |
-                Q(order__user__email__icontains=search) |
-                Q(order__guest_name__icontains=search) |
-                Q(order__guest_email__icontains=search)
-            )
+        ).order_by('-order__created_at')
         
-        # Date range filter
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        if start_date:
-            queryset = queryset.filter(order__created_at__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(order__created_at__lte=end_date)
+        try:
+            queryset = self.filter_vendor_orders(queryset, request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         # Annotate with items count
         queryset = queryset.annotate(items_count=Count('items'))
         
-        # Build response data
-        orders_data = []
-        for vendor_order in queryset:
-            orders_data.append({
-                'id': vendor_order.id,
-                'order': vendor_order.order,
-                'status': vendor_order.status,
-                'total_amount': vendor_order.total_amount,
-                'tracking_number': vendor_order.tracking_number,
-                'estimated_delivery': vendor_order.estimated_delivery,
-                'items_count': vendor_order.items_count,
-            })
+        paginator = KeysetCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
         
-        serializer = VendorOrderListSerializer(orders_data, many=True)
-        return Response(serializer.data)
+        serializer = VendorOrderListSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def order_detail(self, request):
@@ -275,6 +421,15 @@ class VendorDashboardViewSet(viewsets.ViewSet):
             vendor_order.delivered_at = timezone.now()
         
         vendor_order.save()
+        # Delivery makes the items verified purchases; cancelling takes them back
+        if vendor_order.status != old_status:
+            refresh_purchases([vendor_order.order_id])
+        
+        push_order_update(
+            vendor_order.order.user_id, vendor_order.order_id,
+            vendor_order_id=str(vendor_order.id), status=vendor_order.status,
+            tracking_number=vendor_order.tracking_number,
+        )
         
         # Send notification to customer (only for registered users)
         if vendor_order.order.user:
@@ -303,51 +458,56 @@ class VendorDashboardViewSet(viewsets.ViewSet):
     def product_performance(self, request):
         """
         Get product performance metrics
-        GET /api/profiles/vendor/dashboard/product_performance/?limit=10
+        GET /api/profiles/vendor/dashboard/product_performance/?limit=10&sort=-total_revenue
+        GET /api/profiles/vendor/dashboard/product_performance/?start=2024-01-01&end=2024-03-31
+        
+        Sales, revenue and ratings are counted within the optional start/end
+        dates (inclusive); stock is always current. Sort by any returned
+        metric or product_name, prefixed with '-' for descending.
         """
         vendor = self.get_vendor_profile(request)
         if not vendor:
             return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        limit = int(request.query_params.get('limit', 10))
-        
-        # Get product performance data
-        products = Product.objects.filter(vendor=vendor).annotate(
-            total_sold=Sum('orderitem__quantity', filter=Q(
-                orderitem__vendor_order__status__in=['paid', 'processing', 'shipped', 'delivered']
-            )),
-            total_revenue=Sum(
-                ExpressionWrapper(
-                    F('orderitem__quantity') * F('orderitem__unit_price'),
-                    output_field=DecimalField()
-                ),
-                filter=Q(orderitem__vendor_order__status__in=['paid', 'processing', 'shipped', 'delivered'])
-            ),
-            average_rating=Avg('ratings__rating'),
-            total_reviews=Count('ratings')
-        ).order_by('-total_sold')[:limit]
-        
-        # Build response data
-        performance_data = []
-        for product in products:
-            # Get current stock from all SKUs
-            current_stock = SKU.objects.filter(product=product).aggregate(
-                total=Sum('stock_quantity')
-            )['total'] or 0
-            
-            performance_data.append({
-                'product_id': product.id,
-                'product_name': product.name,
-                'total_sold': product.total_sold or 0,
-                'total_revenue': product.total_revenue or Decimal('0.00'),
-                'current_stock': current_stock,
-                'average_rating': product.average_rating or Decimal('0.00'),
-                'total_reviews': product.total_reviews or 0
-            })
+        try:
+            products = product_performance_queryset(
+                vendor,
+                start=request.query_params.get('start'),
+                end=request.query_params.get('end'),
+                sort=request.query_params.get('sort', '-total_sold'),
+            )
+            limit = min(int(request.query_params.get('limit', 10)), self.max_page_size)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = ProductPerformanceSerializer(performance_data, many=True)
+        serializer = ProductPerformanceSerializer(products[:max(limit, 0)], many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='product_performance/export')
+    def product_performance_export(self, request):
+        """
+        Download product performance for every product
+        GET /api/profiles/vendor/dashboard/product_performance/export/?start=2024-01-01&sort=product_name
+        GET /api/profiles/vendor/dashboard/product_performance/export/?output=ndjson&gzip=1
+        
+        Takes the same start, end and sort parameters as product_performance.
+        """
+        vendor = self.get_vendor_profile(request)
+        if not vendor:
+            return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            products = product_performance_queryset(
+                vendor,
+                start=request.query_params.get('start'),
+                end=request.query_params.get('end'),
+                sort=request.query_params.get('sort', '-total_sold'),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return self.export(request, products, [(field, field) for field in PERFORMANCE_FIELDS], 'product-performance')
+    
     @action(detail=False, methods=['get'])
     def low_stock_alerts(self, request):
         """
@@ -358,17 +518,13 @@ class VendorDashboardViewSet(viewsets.ViewSet):
         if not vendor:
             return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        threshold = int(request.query_params.get('threshold', 10))
-        
-        # Get low stock SKUs
-        low_stock_skus = SKU.objects.filter(
-            product__vendor=vendor,
-            stock_quantity__lt=threshold,
-            is_active=True
-        ).select_related('product').order_by('stock_quantity')
+        try:
+            skus = low_stock_skus(vendor, request.query_params.get('threshold', 10))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
         alerts_data = []
-        for sku in low_stock_skus:
+        for sku in skus.select_related('product').order_by('stock_quantity'):
             status_label = 'critical' if sku.stock_quantity == 0 else 'low' if sku.stock_quantity < 5 else 'warning'
             alerts_data.append({
                 'product_id': sku.product.id,
@@ -382,67 +538,205 @@ class VendorDashboardViewSet(viewsets.ViewSet):
         serializer = LowStockAlertSerializer(alerts_data, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'], url_path='orders/export')
+    def orders_export(self, request):
+        """
+        Download vendor orders, newest first
+        GET /api/profiles/vendor/dashboard/orders/export/?status=shipped&output=csv
+        GET /api/profiles/vendor/dashboard/orders/export/?start_date=2024-01-01&output=ndjson&gzip=1
+        
+        Takes the same filters as orders.
+        """
+        vendor = self.get_vendor_profile(request)
+        if not vendor:
+            return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            queryset = self.filter_vendor_orders(VendorOrder.objects.filter(vendor=vendor), request.query_params)
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = queryset.annotate(
+            customer_email=Coalesce('order__user__email', 'order__guest_email'),
+        ).values(
+            'id', 'order_id', 'order__created_at', 'status', 'total_amount',
+            'customer_email', 'tracking_number', 'carrier', 'estimated_delivery',
+        ).order_by('-order__created_at', '-id')
+        columns = [
+            ('id', 'vendor_order_id'),
+            ('order_id', 'order_id'),
+            ('order__created_at', 'created_at'),
+            ('status', 'status'),
+            ('total_amount', 'total_amount'),
+            ('customer_email', 'customer_email'),
+            ('tracking_number', 'tracking_number'),
+            ('carrier', 'carrier'),
+            ('estimated_delivery', 'estimated_delivery'),
+        ]
+        return self.export(request, rows, columns, 'orders')
+    
+    @action(detail=False, methods=['get'], url_path='order_items/export')
+    def order_items_export(self, request):
+        """
+        Download the items of vendor orders, newest order first
+        GET /api/profiles/vendor/dashboard/order_items/export/?status=paid&output=ndjson
+        
+        Takes the same filters as orders.
+        """
+        vendor = self.get_vendor_profile(request)
+        if not vendor:
+            return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            queryset = self.filter_vendor_orders(
+                OrderItem.objects.filter(vendor_order__vendor=vendor), request.query_params, prefix='vendor_order__'
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = queryset.values(
+            'id', 'order_id', 'vendor_order_id', 'order__created_at', 'vendor_order__status',
+            'product_id', 'product__name', 'sku__sku_code', 'quantity', 'unit_price',
+        ).order_by('-order__created_at', 'vendor_order_id', 'id')
+        columns = [
+            ('id', 'order_item_id'),
+            ('order_id', 'order_id'),
+            ('vendor_order_id', 'vendor_order_id'),
+            ('order__created_at', 'created_at'),
+            ('vendor_order__status', 'status'),
+            ('product_id', 'product_id'),
+            ('product__name', 'product_name'),
+            ('sku__sku_code', 'sku_code'),
+            ('quantity', 'quantity'),
+            ('unit_price', 'unit_price'),
+        ]
+        return self.export(request, rows, columns, 'order-items')
+    
+    @action(detail=False, methods=['get'], url_path='inventory/export')
+    def inventory_export(self, request):
+        """
+        Download inventory transactions of vendor SKUs, newest first
+        GET /api/profiles/vendor/dashboard/inventory/export/?type=sale&start_date=2024-01-01&output=csv
+        """
+        vendor = self.get_vendor_profile(request)
+        if not vendor:
+            return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        queryset = InventoryTransaction.objects.filter(sku__product__vendor=vendor)
+        transaction_type = request.query_params.get('type')
+        if transaction_type:
+            queryset = queryset.filter(transaction_type=transaction_type)
+        try:
+            window = date_window(
+                request.query_params.get('start_date'), request.query_params.get('end_date'),
+                names=('start_date', 'end_date'),
+            )
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = queryset.filter(**{f'created_at__{lookup}': bound for lookup, bound in window.items()})
+        
+        rows = queryset.values(
+            'id', 'created_at', 'sku_id', 'sku__sku_code', 'sku__product__name',
+            'transaction_type', 'quantity', 'reference', 'notes',
+        ).order_by('-created_at', '-id')
+        columns = [
+            ('id', 'transaction_id'),
+            ('created_at', 'created_at'),
+            ('sku_id', 'sku_id'),
+            ('sku__sku_code', 'sku_code'),
+            ('sku__product__name', 'product_name'),
+            ('transaction_type', 'transaction_type'),
+            ('quantity', 'quantity'),
+            ('reference', 'reference'),
+            ('notes', 'notes'),
+        ]
+        return self.export(request, rows, columns, 'inventory-transactions')
+    
+    @action(detail=False, methods=['get'], url_path='low_stock_alerts/export')
+    def low_stock_alerts_export(self, request):
+        """
+        Download every low stock SKU
+        GET /api/profiles/vendor/dashboard/low_stock_alerts/export/?threshold=10&output=csv
+        """
+        vendor = self.get_vendor_profile(request)
+        if not vendor:
+            return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        
+        try:
+            skus = low_stock_skus(vendor, request.query_params.get('threshold', 10))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        rows = skus.annotate(
+            status=Case(
+                When(stock_quantity=0, then=Value('critical')),
+                When(stock_quantity__lt=5, then=Value('low')),
+                default=Value('warning'),
+            ),
+        ).values(
+            'product_id', 'product__name', 'id', 'sku_code', 'stock_quantity', 'status',
+        ).order_by('stock_quantity', 'id')
+        columns = [
+            ('product_id', 'product_id'),
+            ('product__name', 'product_name'),
+            ('id', 'sku_id'),
+            ('sku_code', 'sku_code'),
+            ('stock_quantity', 'current_stock'),
+            ('status', 'status'),
+        ]
+        return self.export(request, rows, columns, 'low-stock')
+    
     @action(detail=False, methods=['get'])
     def revenue_report(self, request):
         """
-        Get revenue report by period
+        Get revenue report by period, with empty periods included as zeros
         GET /api/profiles/vendor/dashboard/revenue_report/?period=daily&days=30
+        GET /api/profiles/vendor/dashboard/revenue_report/?period=weekly&weeks=12
         GET /api/profiles/vendor/dashboard/revenue_report/?period=monthly&months=12
+        GET /api/profiles/vendor/dashboard/revenue_report/?period=quarterly&quarters=4&tz=America/New_York
         """
         vendor = self.get_vendor_profile(request)
         if not vendor:
             return Response({"detail": "Vendor profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
         period = request.query_params.get('period', 'daily')
+        if period not in REPORT_LENGTHS:
+            return Response({"detail": "Invalid period. Use 'daily', 'weekly', 'monthly' or 'quarterly'"}, 
+                          status=status.HTTP_400_BAD_REQUEST)
         
-        if period == 'daily':
-            days = int(request.query_params.get('days', 30))
-            start_date = timezone.now() - timedelta(days=days)
-            
-            # Get daily revenue
-            orders = VendorOrder.objects.filter(
-                vendor=vendor,
-                order__created_at__gte=start_date,
-                status__in=['paid', 'processing', 'shipped', 'delivered']
-            ).extra(select={'date': 'DATE(orders_order.created_at)'}).values('date').annotate(
-                revenue=Sum('total_amount'),
-                orders_count=Count('id'),
-                items_sold=Sum('items__quantity')
-            ).order_by('date')
-            
-            report_data = [{
-                'period': item['date'].strftime('%Y-%m-%d') if hasattr(item['date'], 'strftime') else str(item['date']),
-                'revenue': item['revenue'],
-                'orders_count': item['orders_count'],
-                'items_sold': item['items_sold'] or 0
-            } for item in orders]
-            
-        elif period == 'monthly':
-            months = int(request.query_params.get('months', 12))
-            start_date = timezone.now() - timedelta(days=months * 30)
-            
-            # Get monthly revenue
-            orders = VendorOrder.objects.filter(
-                vendor=vendor,
-                order__created_at__gte=start_date,
-                status__in=['paid', 'processing', 'shipped', 'delivered']
-            ).extra(
-                select={'month': "TO_CHAR(orders_order.created_at, 'YYYY-MM')"}
-            ).values('month').annotate(
-                revenue=Sum('total_amount'),
-                orders_count=Count('id'),
-                items_sold=Sum('items__quantity')
-            ).order_by('month')
-            
-            report_data = [{
-                'period': item['month'],
-                'revenue': item['revenue'],
-                'orders_count': item['orders_count'],
-                'items_sold': item['items_sold'] or 0
-            } for item in orders]
-        else:
-            return Response({"detail": "Invalid period. Use 'daily' or 'monthly'"}, 
+        length_param, default_length, max_length = REPORT_LENGTHS[period]
+        try:
+            length = int(request.query_params.get(length_param, default_length))
+        except ValueError:
+            length = -1
+        if not 0 <= length <= max_length:
+            return Response({"detail": f"{length_param} must be an integer from 0 to {max_length}"},
                           status=status.HTTP_400_BAD_REQUEST)
+        try:
+            tz = get_timezone(request.query_params.get('tz'))
+        except ValueError as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        start, end = last_periods(period, length, tzinfo=tz)
+        
+        if str(tz) == str(timezone.get_current_timezone()):
+            # Paid vendor orders per day, pre-aggregated in the rollups
+            rows = VendorRevenueDay.objects.filter(vendor=vendor, status__in=PAID_STATUSES)
+            report_data = time_series(
+                rows, 'date', period, start, end,
+                revenue=Sum('revenue'), orders_count=Sum('orders'), items_sold=Sum('items_sold'),
+            )
+        else:
+            # The rollups are kept in project days; other zones need the orders
+            paid_orders = VendorOrder.objects.filter(vendor=vendor, status__in=PAID_STATUSES)
+            report_data = time_series(
+                paid_orders, 'order__created_at', period, start, end, tz,
+                revenue=Sum('total_amount'), orders_count=Count('id'),
+            )
+            # Items are counted separately; joining them would repeat each order's total
+            items = time_series(
+                OrderItem.objects.filter(vendor_order__in=paid_orders), 'vendor_order__order__created_at',
+                period, start, end, tz, items_sold=Sum('quantity'),
+            )
+            for row, item_row in zip(report_data, items):
+                row['items_sold'] = item_row['items_sold']
         
         serializer = RevenueReportSerializer(report_data, many=True)
         return Response(serializer.data)
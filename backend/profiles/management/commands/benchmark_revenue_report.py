@@ -0,0 +1,154 @@
+import contextlib
+import datetime
+import random
+import statistics
+import time
+import uuid
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.db.models.signals import post_delete
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders import signals as rollup_signals
+from orders.models import Order, OrderItem, VendorOrder
+from orders.rollups import reconcile_revenue_days
+from profiles.models import VendorProfile
+
+User = get_user_model()
+
+STATUSES = ['paid'] * 5 + ['delivered'] * 3 + ['cancelled', 'pending']
+
+
+@contextlib.contextmanager
+def backdated_orders():
+    """Let Order.created_at be set on create, so history can be seeded"""
+    field = Order._meta.get_field('created_at')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+@contextlib.contextmanager
+def without_rollup_signals():
+    """Let the seeded orders be deleted in bulk instead of row by row"""
+    receivers = (
+        (rollup_signals.remove_from_revenue_rollup, VendorOrder),
+        (rollup_signals.uncount_item_in_rollup, OrderItem),
+    )
+    for receiver, sender in receivers:
+        post_delete.disconnect(receiver, sender=sender)
+    try:
+        yield
+    finally:
+        for receiver, sender in receivers:
+            post_delete.connect(receiver, sender=sender)
+
+
+class Command(BaseCommand):
+    help = 'Seeds vendor order history and times the revenue report from rollups and from raw orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1_000_000, help='Vendor orders to seed')
+        parser.add_argument('--vendors', type=int, default=20, help='Vendors the orders are spread across')
+        parser.add_argument('--days', type=int, default=730, help='Days of history to spread orders over')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk insert')
+        parser.add_argument('--repeat', type=int, default=5, help='Requests per report')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded vendors and orders')
+
+    def handle(self, *args, **options):
+        run = uuid.uuid4().hex[:8]
+        vendors = self.setup(run, options['vendors'])
+        try:
+            started = time.perf_counter()
+            self.seed(vendors, options['orders'], options['days'], options['batch_size'])
+            self.stdout.write(f'seeded {options["orders"]} vendor orders in {time.perf_counter() - started:.1f} s')
+
+            # The seed bypasses the save signals; build the rollups the way the nightly job repairs them
+            started = time.perf_counter()
+            corrected = reconcile_revenue_days([vendor.id for vendor in vendors])
+            self.stdout.write(f'rolled up {len(corrected)} vendor days in {time.perf_counter() - started:.1f} s')
+
+            client = APIClient()
+            client.force_authenticate(vendors[0].user)
+            url = '/api/profiles/vendor/dashboard/revenue_report/'
+            for period, length in (('daily', 'days=90'), ('weekly', 'weeks=52'), ('monthly', 'months=24'), ('quarterly', 'quarters=8')):
+                for source, tz in (('rollups', ''), ('orders', '&tz=America/New_York')):
+                    timings, queries = self.measure(client, f'{url}?period={period}&{length}{tz}', options['repeat'])
+                    self.stdout.write(
+                        f'{period:>9} from {source:<7}: p50 {statistics.median(timings):7.1f} ms, '
+                        f'max {max(timings):7.1f} ms, {queries} queries'
+                    )
+            self.stdout.write(self.style.SUCCESS('Revenue report benchmark complete'))
+        finally:
+            if not options['keep']:
+                self.teardown(run)
+
+    def setup(self, run, count):
+        users = User.objects.bulk_create([
+            User(username=f'bench-revenue-{run}-{index}', is_vendor=True, is_customer=False) for index in range(count)
+        ])
+        return [
+            VendorProfile.objects.create(user=user, store_name=f'Bench revenue {run} {index}')
+            for index, user in enumerate(users)
+        ]
+
+    def seed(self, vendors, count, days, batch_size):
+        rng = random.Random(0)
+        now = timezone.now()
+        with backdated_orders():
+            for offset in range(0, count, batch_size):
+                size = min(batch_size, count - offset)
+                orders = Order.objects.bulk_create([
+                    Order(
+                        status='paid',
+                        is_guest=True,
+                        guest_email='bench@example.com',
+                        created_at=now - datetime.timedelta(seconds=rng.randrange(days * 86400)),
+                    )
+                    for _ in range(size)
+                ])
+                vendor_orders = VendorOrder.objects.bulk_create([
+                    VendorOrder(
+                        order=order,
+                        vendor=rng.choice(vendors),
+                        status=rng.choice(STATUSES),
+                        total_amount=Decimal(rng.randrange(500, 50000)) / 100,
+                    )
+                    for order in orders
+                ])
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=vendor_order.order,
+                        vendor_order=vendor_order,
+                        unit_price=vendor_order.total_amount,
+                        quantity=1,
+                    )
+                    for vendor_order in vendor_orders
+                ])
+
+    def measure(self, client, url, repeat):
+        timings, queries = [], []
+        for _ in range(repeat):
+            reset_queries()  # The log is capped; seeding may have filled it
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url} returned {response.status_code}: {response.content[:200]}')
+            queries.append(len(captured))
+        return timings, max(queries)
+
+    def teardown(self, run):
+        vendors = VendorProfile.objects.filter(user__username__startswith=f'bench-revenue-{run}-')
+        # The rollup rows go with the vendors
+        with without_rollup_signals():
+            Order.objects.filter(vendor_orders__vendor__in=vendors).delete()
+        User.objects.filter(username__startswith=f'bench-revenue-{run}-').delete()
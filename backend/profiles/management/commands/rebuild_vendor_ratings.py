@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from profiles.models import VendorProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized rating count/sum/average/histogram columns on vendors from their approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vendor', action='append', dest='vendors', help='Only rebuild this vendor profile ID (repeatable)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Vendors recomputed per batch')
+
+    def handle(self, *args, **options):
+        corrected = VendorProfile.rebuild_rating_aggregates(
+            vendor_ids=options['vendors'],
+            batch_size=options['batch_size'],
+        )
+        for vendor_id in corrected:
+            self.stdout.write(f'{vendor_id}: corrected')
+        self.stdout.write(self.style.SUCCESS(f'Corrected rating aggregates on {len(corrected)} vendors'))
@@ -0,0 +1,70 @@
+# Generated by Django 4.2.30 on 2026-10-16 19:14
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+
+def backfill_vendor_rating_aggregates(apps, schema_editor):
+    VendorProfile = apps.get_model('profiles', 'VendorProfile')
+    VendorReview = apps.get_model('profiles', 'VendorReview')
+
+    # Deleted reviews were never subtracted, so every vendor is recomputed
+    stats = {
+        row['vendor_id']: row
+        for row in VendorReview.objects.filter(is_approved=True).values('vendor_id').annotate(
+            count=models.Count('id'),
+            total=models.Sum('rating'),
+            **{f'star_{star}': models.Count('id', filter=models.Q(rating=star)) for star in range(1, 6)}
+        ).order_by()
+    }
+    for vendor_id in VendorProfile.objects.values_list('id', flat=True).iterator():
+        row = stats.get(vendor_id, {})
+        count, total = row.get('count', 0), row.get('total') or 0
+        VendorProfile.objects.filter(id=vendor_id).update(
+            total_reviews=count,
+            rating_sum=total,
+            average_rating=(Decimal(total) / count).quantize(Decimal('0.01'), ROUND_HALF_UP) if count else Decimal('0.00'),
+            **{f'rating_{star}_count': row.get(f'star_{star}', 0) for star in range(1, 6)}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0004_vendorprofile_average_rating_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='vendorprofile',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_vendor_rating_aggregates, migrations.RunPython.noop),
+    ]
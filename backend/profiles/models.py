@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Cast, Coalesce, NullIf
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
+from marketplace.cache import invalidate
+from marketplace.denormalized import DenormalizedFieldsMixin
 import uuid
+from decimal import Decimal, ROUND_HALF_UP
 
 User = get_user_model()
 
-class VendorProfile(models.Model):
+class VendorProfile(DenormalizedFieldsMixin, models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='vendor_profile')
     store_name = models.CharField(max_length=100)
@@ -15,22 +19,116 @@ class VendorProfile(models.Model):
     phone = models.CharField(max_length=20, blank=True)
     average_rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
     total_reviews = models.PositiveIntegerField(default=0)
+    # Approved review aggregates, maintained incrementally by profiles.signals
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)
+    rating_1_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_2_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_3_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_4_count = models.PositiveIntegerField(default=0, editable=False)
+    rating_5_count = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    RATING_STARS = (1, 2, 3, 4, 5)
+    RATING_FIELDS = (
+        'average_rating', 'total_reviews', 'rating_sum', 'rating_1_count',
+        'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+    )
+    # The rating columns are written only through F() updates
+    DENORMALIZED_FIELDS = RATING_FIELDS
+
     def __str__(self):
         return self.store_name or self.user.username
-        
-    def update_rating(self):
-        """Update the average rating based on all reviews"""
-        reviews = self.reviews.filter(is_approved=True)
-        if reviews.exists():
-            self.average_rating = reviews.aggregate(models.Avg('rating'))['rating__avg']
-            self.total_reviews = reviews.count()
-        else:
-            self.average_rating = 0.0
-            self.total_reviews = 0
-        self.save(update_fields=['average_rating', 'total_reviews'])
+
+    @property
+    def rating_histogram(self):
+        """Number of approved reviews per star, keyed 1-5"""
+        return {star: getattr(self, f'rating_{star}_count') for star in self.RATING_STARS}
+
+    @staticmethod
+    def rating_delta(deltas):
+        """
+        F() update kwargs that apply review count changes to the aggregates
+
+        Args:
+            deltas: Dict mapping a star rating to the change in its number
+                of approved reviews, e.g. {2: -1, 4: 1} for a 2 edited to a 4
+        """
+        count = sum(deltas.values())
+        total = sum(rating * delta for rating, delta in deltas.items())
+        updates = {
+            'total_reviews': models.F('total_reviews') + count,
+            'rating_sum': models.F('rating_sum') + total,
+            # Every expression sees the row as it was before this UPDATE
+            'average_rating': Coalesce(
+                Cast(models.F('rating_sum') + total, models.FloatField())
+                / NullIf(models.F('total_reviews') + count, 0),
+                0.0,
+                output_field=models.FloatField(),
+            ),
+        }
+        for rating, delta in deltas.items():
+            if rating in VendorProfile.RATING_STARS and delta:
+                updates[f'rating_{rating}_count'] = models.F(f'rating_{rating}_count') + delta
+        return updates
+
+    @staticmethod
+    def rebuild_rating_aggregates(vendor_ids=None, batch_size=1000):
+        """
+        Recompute rating aggregates from approved VendorReview rows
+
+        Args:
+            vendor_ids: Optional iterable of vendor profile IDs to limit the rebuild to
+            batch_size: Number of vendors recomputed per query batch
+
+        Returns:
+            IDs of the vendors whose stored aggregates had drifted
+        """
+        vendors = VendorProfile.objects.only('id', *VendorProfile.RATING_FIELDS).order_by('id')
+        if vendor_ids is not None:
+            vendors = vendors.filter(id__in=list(vendor_ids))
+
+        corrected = []
+        batch = []
+        for vendor in vendors.iterator(chunk_size=batch_size):
+            batch.append(vendor)
+            if len(batch) >= batch_size:
+                corrected += VendorProfile._write_rating_aggregates(batch)
+                batch = []
+        if batch:
+            corrected += VendorProfile._write_rating_aggregates(batch)
+        return corrected
+
+    @staticmethod
+    def _write_rating_aggregates(vendors):
+        stats = VendorReview.objects.filter(vendor__in=vendors, is_approved=True).values('vendor_id').annotate(
+            count=models.Count('id'),
+            total=models.Sum('rating'),
+            **{
+                f'star_{star}': models.Count('id', filter=models.Q(rating=star))
+                for star in VendorProfile.RATING_STARS
+            }
+        )
+        stats = {row['vendor_id']: row for row in stats}
+
+        drifted = []
+        for vendor in vendors:
+            row = stats.get(vendor.id, {})
+            stored = [getattr(vendor, field) for field in VendorProfile.RATING_FIELDS]
+            vendor.total_reviews = row.get('count', 0)
+            vendor.rating_sum = row.get('total') or 0
+            vendor.average_rating = (
+                (Decimal(vendor.rating_sum) / vendor.total_reviews).quantize(Decimal('0.01'), ROUND_HALF_UP)
+                if vendor.total_reviews else Decimal('0.00')
+            )
+            for star in VendorProfile.RATING_STARS:
+                setattr(vendor, f'rating_{star}_count', row.get(f'star_{star}', 0))
+            if stored != [getattr(vendor, field) for field in VendorProfile.RATING_FIELDS]:
+                drifted.append(vendor)
+        VendorProfile.objects.bulk_update(drifted, VendorProfile.RATING_FIELDS)
+        if drifted:
+            invalidate(*[f'vendor:{vendor.id}' for vendor in drifted])
+        return [vendor.id for vendor in drifted]
 
 
 class CustomerProfile(models.Model):
@@ -65,6 +163,6 @@ class VendorReview(models.Model):
         return f"Review for {self.vendor.store_name} by {self.customer.username}"
     
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Update vendor's average rating
-        self.vendor.update_rating()
+        # The vendor's rating aggregates move with the review (profiles.signals)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
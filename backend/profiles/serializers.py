@@ -28,12 +28,13 @@ class VendorProfileSerializer(serializers.ModelSerializer):
     first_name = serializers.CharField(source='user.first_name', read_only=True)
     last_name = serializers.CharField(source='user.last_name', read_only=True)
     reviews = VendorReviewSerializer(many=True, read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = VendorProfile
         fields = ['id', 'user_id', 'username', 'first_name', 'last_name', 'store_name', 
                  'description', 'logo', 'address', 'phone', 'average_rating', 
-                 'total_reviews', 'reviews', 'created_at', 'updated_at']
+                 'total_reviews', 'rating_histogram', 'reviews', 'created_at', 'updated_at']
         read_only_fields = ['id', 'user_id', 'username', 'first_name', 'last_name', 
                            'average_rating', 'total_reviews', 'reviews', 'created_at', 'updated_at']
 
@@ -55,9 +56,10 @@ class PublicVendorProfileSerializer(serializers.ModelSerializer):
     Used for displaying vendor information to customers.
     """
     username = serializers.CharField(source='user.username', read_only=True)
+    rating_histogram = serializers.DictField(child=serializers.IntegerField(), read_only=True)
     
     class Meta:
         model = VendorProfile
         fields = ['id', 'username', 'store_name', 'description', 'logo', 
-                 'average_rating', 'total_reviews', 'created_at']
+                 'average_rating', 'total_reviews', 'rating_histogram', 'created_at']
         read_only_fields = fields
\ No newline at end of file
@@ -1,8 +1,11 @@
-from django.db.models.signals import post_save
+from collections import Counter
+
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.db import IntegrityError
-from .models import VendorProfile, CustomerProfile
+from marketplace.cache import invalidate
+from .models import VendorProfile, CustomerProfile, VendorReview
 
 User = get_user_model()
 
@@ -16,3 +19,59 @@ def create_user_profile(sender, instance, created, **kwargs):
                 CustomerProfile.objects.create(user=instance)
         except IntegrityError:
             pass  # Avoid crashing if profiles already exist
+
+
+@receiver(post_save, sender=VendorProfile)
+@receiver(post_delete, sender=VendorProfile)
+def invalidate_vendor_profile(sender, instance, update_fields=None, **kwargs):
+    invalidate(f'vendor:{instance.pk}')
+    # Store names also appear on product and facet responses
+    if update_fields is None or 'store_name' in update_fields:
+        invalidate('products', 'product-labels')
+
+
+@receiver(post_save, sender=User)
+def invalidate_vendor_username(sender, instance, created, update_fields=None, **kwargs):
+    if created or not instance.is_vendor or (update_fields is not None and 'username' not in update_fields):
+        return
+    vendor_id = VendorProfile.objects.filter(user=instance).values_list('id', flat=True).first()
+    if vendor_id:
+        invalidate(f'vendor:{vendor_id}')
+
+
+def _apply_review_deltas(vendor_id, deltas):
+    deltas = {rating: delta for rating, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    VendorProfile.objects.filter(pk=vendor_id).update(**VendorProfile.rating_delta(deltas))
+    # update() sends no post_save
+    invalidate(f'vendor:{vendor_id}')
+
+
+@receiver(pre_save, sender=VendorReview)
+def remember_previous_review(sender, instance, **kwargs):
+    # Keep the stored values so post_save can move the review between buckets
+    instance._previous_review = None
+    if not instance._state.adding:
+        instance._previous_review = VendorReview.objects.filter(pk=instance.pk).values_list(
+            'vendor_id', 'rating', 'is_approved'
+        ).first()
+
+
+@receiver(post_save, sender=VendorReview)
+def add_review_to_vendor_rating(sender, instance, created, **kwargs):
+    # Only approved reviews count; approving or unapproving adds or removes one
+    deltas = {}
+    previous = getattr(instance, '_previous_review', None)
+    if previous and previous[2]:
+        deltas.setdefault(previous[0], Counter())[previous[1]] -= 1
+    if instance.is_approved:
+        deltas.setdefault(instance.vendor_id, Counter())[instance.rating] += 1
+    for vendor_id, changes in deltas.items():
+        _apply_review_deltas(vendor_id, changes)
+
+
+@receiver(post_delete, sender=VendorReview)
+def remove_review_from_vendor_rating(sender, instance, **kwargs):
+    if instance.is_approved:
+        _apply_review_deltas(instance.vendor_id, {instance.rating: -1})
@@ -0,0 +1,13 @@
+from celery import shared_task
+
+from .models import VendorProfile
+
+
+@shared_task
+def reconcile_vendor_ratings():
+    """
+    Celery task to repair vendor rating aggregates that drifted from the
+    approved reviews (e.g. after bulk edits that bypass the review signals).
+    """
+    corrected = VendorProfile.rebuild_rating_aggregates()
+    return f"Corrected rating aggregates on {len(corrected)} vendors"
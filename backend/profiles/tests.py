@@ -1,3 +1,127 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from orders.checkout import place_order
+from products.models import Product, SKU
+from .models import VendorProfile
+
+
+class RevenueReportLengthTests(TestCase):
+    """Report lengths are bounded per period; anything else is a 400, not a 500"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor_user)
+
+    def report(self, **params):
+        return self.client.get('/api/profiles/vendor/dashboard/revenue_report/', params)
+
+    def test_longest_reports(self):
+        for period, length in (('daily', {'days': 366}), ('monthly', {'months': 120}), ('quarterly', {'quarters': 40})):
+            with self.subTest(period=period):
+                self.assertEqual(self.report(period=period, **length).status_code, 200)
+
+    def test_too_long_reports(self):
+        for period, length in (
+            ('daily', {'days': 1000000}), ('weekly', {'weeks': 261}),
+            ('monthly', {'months': 30000}), ('quarterly', {'quarters': 9000}),
+        ):
+            with self.subTest(period=period):
+                self.assertEqual(self.report(period=period, **length).status_code, 400)
+
+    def test_malformed_length(self):
+        self.assertEqual(self.report(period='daily', days='abc').status_code, 400)
+
+
+class LowStockAlertTests(TestCase):
+    """Low stock alerts and their export share the threshold and reject a malformed one"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+        product = Product.objects.create(
+            vendor=cls.vendor_user.vendor_profile, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        for code, stock in (('EMPTY', 0), ('LOW', 3), ('PLENTY', 50)):
+            SKU.objects.create(product=product, sku_code=code, stock_quantity=stock)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor_user)
+
+    def test_alerts_below_threshold(self):
+        response = self.client.get('/api/profiles/vendor/dashboard/low_stock_alerts/', {'threshold': 5})
+        self.assertEqual(
+            [(alert['sku_code'], alert['status']) for alert in response.data], [('EMPTY', 'critical'), ('LOW', 'low')],
+        )
+
+    def test_malformed_threshold(self):
+        for url in ('low_stock_alerts/', 'low_stock_alerts/export/'):
+            with self.subTest(url=url):
+                response = self.client.get(f'/api/profiles/vendor/dashboard/{url}', {'threshold': 'abc'})
+                self.assertEqual(response.status_code, 400)
+
+
+class OrderDateFilterTests(TestCase):
+    """Order and inventory date filters cover whole days and reject malformed dates"""
+
+    URLS = ('orders/', 'orders/export/', 'order_items/export/', 'inventory/export/')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor_user = User.objects.create(username='vendor', is_vendor=True, is_customer=False)
+        product = Product.objects.create(
+            vendor=cls.vendor_user.vendor_profile, name='Boot', slug='boot',
+            description='Test product', price=Decimal('10.00'),
+        )
+        sku = SKU.objects.create(product=product, sku_code='BOOT', stock_quantity=5)
+        customer = User.objects.create(username='customer', is_customer=True)
+        place_order([(sku.pk, 1, None)], user=customer, payment_method='cod')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor_user)
+
+    def get(self, url, **params):
+        return self.client.get(f'/api/profiles/vendor/dashboard/{url}', params)
+
+    def test_malformed_dates(self):
+        for url in self.URLS:
+            for param in ('start_date', 'end_date'):
+                with self.subTest(url=url, param=param):
+                    self.assertEqual(self.get(url, **{param: 'last tuesday'}).status_code, 400)
+
+    def test_end_date_includes_the_whole_day(self):
+        today = timezone.localdate()
+        orders = self.get('orders/', start_date=today.isoformat(), end_date=today.isoformat())
+        self.assertEqual(len(orders.data['results']), 1)
+        orders = self.get('orders/', end_date=(today - timedelta(days=1)).isoformat())
+        self.assertEqual(len(orders.data['results']), 0)
+
+
+class VendorRatingFieldsTests(TestCase):
+    """Saving a vendor profile never writes back its rating aggregates"""
+
+    def test_stale_save_keeps_aggregates(self):
+        vendor = User.objects.create(username='vendor', is_vendor=True, is_customer=False).vendor_profile
+        stale = VendorProfile.objects.get(pk=vendor.pk)
+        VendorProfile.objects.filter(pk=vendor.pk).update(**VendorProfile.rating_delta({5: 1}))
+
+        stale.store_name = 'Renamed'
+        stale.save()
 
-# Create your tests here.
+        vendor.refresh_from_db()
+        self.assertEqual(vendor.store_name, 'Renamed')
+        self.assertEqual((vendor.total_reviews, vendor.rating_5_count), (1, 1))
@@ -9,6 +9,7 @@ from .serializers import (
     VendorReviewSerializer, PublicVendorProfileSerializer
 )
 from .permissions import IsVendor, IsCustomer
+from marketplace.cache import cached_response
 
 # Create your views here.
 class VendorProfileView(generics.RetrieveUpdateAPIView):
@@ -33,8 +34,12 @@ class PublicVendorProfileView(generics.RetrieveAPIView):
     """
     serializer_class = PublicVendorProfileSerializer
     permission_classes = [AllowAny]
-    queryset = VendorProfile.objects.all()
+    queryset = VendorProfile.objects.select_related('user')
     lookup_field = 'pk'
+    
+    @cached_response('vendor-profiles', tags=['vendor:{pk}'])
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
 
 class VendorReviewViewSet(viewsets.ModelViewSet):